@@ -1,53 +1,96 @@
+"""
+按年份统计 english_background 并画柱状图：一个期刊一张，或把多个期刊合成一张。
+
+统计来自 year_background 的聚合缓存（<输入>.yearbg.json），输入没变时不再读整张表：
+
+    python -m backgroundcheck.SaveInPNG --input result/ERN_ror.csv --output ERN.png
+    python -m backgroundcheck.SaveInPNG --input "result/*_ror.csv" --output all_journals.png     # 合并图
+    python -m backgroundcheck.SaveInPNG --input a_ror.csv b_ror.csv --output all.png --per-input charts
+"""
+import argparse
+import glob
+import os
 import matplotlib
 matplotlib.use('Agg')
-import pandas as pd
 import matplotlib.pyplot as plt
-import re
 
-df = pd.read_csv('E:/SSRNPaperResearch/data/result/ERN_with_English_bg.csv')
+try:
+    from .year_background import load_counts, pivot_counts
+except ImportError:  # 直接作为脚本运行
+    from year_background import load_counts, pivot_counts
+
+# 可以是 .csv 或 .parquet；只读画图需要的两列
+INPUT_PATH = 'E:/SSRNPaperResearch/data/result/ERN_with_English_bg.csv'
+OUTPUT_PNG = 'ERN.png'
+YEAR_RANGE = (2014, 2025)
 
-# ====== 提取年份 ======
-def extract_year(text):
-    if not isinstance(text, str):
-        return None
-    # 匹配 4 位年份数字
-    m = re.search(r'(\d{4})', text)
-    if m:
-        return int(m.group(1))
-    return None
 
-df['posted'] = df['posted'].apply(extract_year)
-df = df.dropna(subset=['posted'])
-df['posted'] = df['posted'].astype(int)
+def expand_inputs(inputs):
+    """展开通配符（Windows 的 shell 不会替我们展开）；按给出的顺序去重。"""
+    paths = []
+    for p in inputs:
+        matched = sorted(glob.glob(p)) if glob.has_magic(p) and not os.path.exists(p) else [p]
+        if not matched:
+            print(f'⚠️ 没有匹配到文件: {p}')
+        paths.extend(matched)
+    return list(dict.fromkeys(paths))
 
-# ====== 筛选年份区间 ======
-df = df[df['posted'].between(2014, 2025)]
 
-# ====== 清理分类 ======
-df['english_background'] = df['english_background'].astype(str).str.strip()
+# ====== 绘图 ======
+def plot_pivot(pivot_df, out: str, year_range=YEAR_RANGE, title_prefix: str = '') -> None:
+    fig, ax = plt.subplots(figsize=(12, 7))
+    pivot_df.plot(kind='bar', width=0.8, ax=ax)
 
-# ====== 分组统计 ======
-count_df = df.groupby(['posted', 'english_background']).size().reset_index(name='count')
+    ax.set_title(f'{title_prefix}English Background Distribution by Year ({year_range[0]}–{year_range[1]})')
+    ax.set_xlabel('Year')
+    ax.set_ylabel('Number of Records')
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+    ax.legend(title='English Background')
+    fig.tight_layout()
 
-pivot_df = count_df.pivot(index='posted', columns='english_background', values='count').fillna(0)
-pivot_df = pivot_df.apply(pd.to_numeric, errors='coerce').fillna(0).astype(int)
-pivot_df = pivot_df.sort_index()
+    if os.path.dirname(out):
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+    fig.savefig(out, dpi=300, bbox_inches='tight')
+    plt.close(fig)
 
-# ====== 绘图 ======
-plt.figure(figsize=(12,7))
-pivot_df.plot(kind='bar', width=0.8)
-
-plt.title('English Background Distribution by Year (2014–2025)')
-plt.xlabel('Year')
-plt.ylabel('Number of Records')
-plt.xticks(rotation=45)
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-plt.legend(title='English Background')
-plt.tight_layout()
-
-out = 'ERN.png'
-plt.savefig(out, dpi=300, bbox_inches='tight')
-plt.close()
-
-print("✅ 图生成成功:", out)
-print(pivot_df.head())
\ No newline at end of file
+
+def main(input_path=INPUT_PATH, out: str = OUTPUT_PNG, per_input_dir: str = None,
+         year_range=YEAR_RANGE, use_cache: bool = True) -> None:
+    """
+    input_path: 一个路径，或多个路径 / 通配符的列表；多个时画合并图。
+    per_input_dir: 另外给每个输入画一张，存成 <目录>/<输入文件名>.png。
+    """
+    paths = expand_inputs([input_path] if isinstance(input_path, str) else list(input_path))
+    if not paths:
+        raise SystemExit('❌ 没有输入文件')
+
+    counts = [load_counts(p, use_cache=use_cache) for p in paths]
+
+    if per_input_dir:
+        os.makedirs(per_input_dir, exist_ok=True)
+        for p, c in zip(paths, counts):
+            name = os.path.splitext(os.path.basename(p))[0]
+            png = os.path.join(per_input_dir, f'{name}.png')
+            plot_pivot(pivot_counts([c], year_range), png, year_range, title_prefix=f'{name}: ')
+            print('✅ 图生成成功:', png)
+
+    pivot_df = pivot_counts(counts, year_range)
+    title_prefix = f'All Journals ({len(paths)}): ' if len(paths) > 1 else ''
+    plot_pivot(pivot_df, out, year_range, title_prefix=title_prefix)
+
+    print("✅ 图生成成功:", out)
+    print(pivot_df.head())
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description="按年份统计 english_background 并画柱状图")
+    ap.add_argument('--input', nargs='+', default=[INPUT_PATH],
+                    help='一个或多个结果表（可用通配符）；多个时画合并图')
+    ap.add_argument('--output', default=OUTPUT_PNG)
+    ap.add_argument('--per-input', default=None, metavar='DIR', help='另外给每个输入各画一张，放到这个目录')
+    ap.add_argument('--years', nargs=2, type=int, default=list(YEAR_RANGE), metavar=('FROM', 'TO'))
+    ap.add_argument('--no-cache', action='store_true', help='不读写聚合缓存，总是重新读表')
+    args = ap.parse_args()
+    main(args.input, args.output, per_input_dir=args.per_input,
+         year_range=tuple(args.years), use_cache=not args.no_cache)
@@ -1,11 +1,28 @@
 from __future__ import annotations
 import re
-from typing import List, Dict
+from typing import List, Dict, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
 from .config import NA_PHRASES
 
+# 每个 N/A 短语的 (and + phrase, phrase + and) 两个模式，按 NA_PHRASES 的顺序依次替换
+_NA_AND_PATTERNS = [
+    (phrase,
+     re.compile(r"\band\s+" + re.escape(phrase) + r"\b"),
+     re.compile(r"\b" + re.escape(phrase) + r"\s+and\b"))
+    for phrase in NA_PHRASES.keys()
+]
+# 上面所有模式合成一个：不匹配的字符串，逐个替换也不会有任何变化
+_NA_AND_ANY = re.compile("|".join(
+    alt for _, before, after in _NA_AND_PATTERNS for alt in (before.pattern, after.pattern)
+))
+_NA_PHRASE_LIST = list(NA_PHRASES.keys())
+
 def normalize_space(s: str) -> str:
-    s = re.sub(r"\s+", " ", s or "")
-    return s.strip()
+    # 与 re.sub(r"\s+", " ", s).strip() 相同（str.split() 与 \s 用的是同一套空白字符），快很多
+    return " ".join((s or "").split())
 
 def remove_and_around_na(text: str) -> str:
     """
@@ -16,17 +33,16 @@ def remove_and_around_na(text: str) -> str:
        - 'phrase and' -> 'phrase'
     """
     s = (text or "").lower()
+    return normalize_space(_drop_and_near_na(s))
 
-    for phrase in NA_PHRASES.keys():
-        # and + phrase
-        pattern_before = r"\band\s+" + re.escape(phrase) + r"\b"
-        s = re.sub(pattern_before, phrase, s)
-
-        # phrase + and
-        pattern_after = r"\b" + re.escape(phrase) + r"\s+and\b"
-        s = re.sub(pattern_after, phrase, s)
-
-    s = normalize_space(s)
+def _drop_and_near_na(s: str) -> str:
+    # 绝大多数字符串里没有 "and + 短语"：先用子串和合成的模式筛掉，原样返回
+    if "and" not in s or not any(p in s for p in _NA_PHRASE_LIST) or not _NA_AND_ANY.search(s):
+        return s
+    # 替换有先后顺序（前一个短语去掉的 and 可能让后一个短语的模式不再匹配），所以逐个做
+    for phrase, pattern_before, pattern_after in _NA_AND_PATTERNS:
+        s = pattern_before.sub(phrase, s)   # and + phrase
+        s = pattern_after.sub(phrase, s)    # phrase + and
     return s
 
 def split_affiliations(raw: str) -> List[Dict[str, str]]:
@@ -48,22 +64,59 @@ def split_affiliations(raw: str) -> List[Dict[str, str]]:
     """
     if not isinstance(raw, str):
         return []
+    return [{"raw": p, "category": cat} for p, cat in _split_one(raw)]
 
+def _split_one(raw: str) -> List[Tuple[str, str]]:
+    """split_affiliations 的核心：[(片段, 类别), ...]。"""
     s = remove_and_around_na(raw)
 
-    # 用逗号和分号拆分
-    parts = re.split(r"\s*[;,]\s*", s)
+    # 用逗号和分号拆分（空白已经规整成单个空格，片段两端的空格和标点一起 strip 掉）
+    results: List[Tuple[str, str]] = []
+    for p in s.replace(";", ",").split(","):
+        p_norm = p.strip(" ,;.")
+        if p_norm:
+            results.append((p_norm, NA_PHRASES.get(p_norm.lower(), "candidate")))
+    return results
 
-    results: List[Dict[str, str]] = []
-    for p in parts:
-        p_norm = normalize_space(p).strip(" ,;.")
-        if not p_norm:
-            continue
+def split_affiliations_batch(values: Union[pd.Series, Sequence]) -> pd.DataFrame:
+    """
+    整列版的 split_affiliations：输入一列 affiliations（pandas Series / list / pyarrow Array），
+    返回扁平的三列表（每个片段一行）：
+      row      : 片段来自输入的第几行（0 起，按位置，不是 Series 的 index）
+      raw      : 片段文本，与 split_affiliations 的 "raw" 相同
+      category : "Independent" / "N/A" / "candidate"，与 split_affiliations 的 "category" 相同
+    同一行的片段保持原来的顺序；非字符串（NaN / None）的行没有片段。
 
-        cat = NA_PHRASES.get(p_norm.lower())
-        if cat is not None:
-            results.append({"raw": p_norm, "category": cat})
-        else:
-            results.append({"raw": p_norm, "category": "candidate"})
+    与逐行调用的区别只在速度：每个不同的字符串只拆一次（再按行展开），
+    N/A 附近的 and 先用子串和一个合成的模式筛一遍，只有命中的才逐个替换。
+    """
+    if hasattr(values, "to_pandas"):          # pyarrow Array / ChunkedArray
+        values = values.to_pandas()
+    # 同一条 affiliations 在表里往往重复很多次：每个不同的字符串只拆一次
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))   # NaN / None -> -1
 
-    return results
+    raws: List[str] = []
+    cats: List[str] = []
+    u_ptr = np.zeros(len(uniques) + 1, dtype=np.int64)
+    for u, value in enumerate(uniques):
+        if isinstance(value, str):
+            for p, cat in _split_one(value):
+                raws.append(p)
+                cats.append(cat)
+        u_ptr[u + 1] = len(raws)
+
+    # 按行展开（CSR）：第 r 行的片段是 u_ptr[codes[r]] : u_ptr[codes[r] + 1]
+    rows = np.flatnonzero(codes >= 0)
+    c = codes[rows]
+    counts = u_ptr[c + 1] - u_ptr[c]
+    row_of_seg = np.repeat(rows, counts)
+    seg_start = np.cumsum(counts) - counts
+    take = np.repeat(u_ptr[c] - seg_start, counts) + np.arange(int(counts.sum()), dtype=np.int64)
+
+    raw_arr = np.array(raws, dtype=object)
+    cat_arr = np.array(cats, dtype=object)
+    return pd.DataFrame({
+        "row": row_of_seg.astype(np.int64),
+        "raw": raw_arr[take] if len(raws) else np.array([], dtype=object),
+        "category": cat_arr[take] if len(cats) else np.array([], dtype=object),
+    })
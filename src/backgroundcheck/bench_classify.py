@@ -0,0 +1,131 @@
+"""
+分类的一致性校验 + 吞吐对比：逐行参照实现 classify_affiliations_for_row
+vs 批量实现 classify_affiliations_batch（整列拆分 + 一次 match_many + classify_batch 列式汇总）。
+
+除了整体耗时，还单独比较"拆分 + 汇总"这部分：两边都用同一份预先算好的匹配结果回放，
+不受 ROR 匹配本身的耗时影响。
+
+Usage（在 src/ 下）:
+    python -m backgroundcheck.bench_classify <input.csv|input.parquet> [--ror-pkl ror.pkl]
+    python -m backgroundcheck.bench_classify --synthetic 50000 --ror-pkl ror.pkl
+
+批量结果与逐行结果（整体、回放两种）有任何一行不一致时退出码为 1，
+改 classify_batch / classify_affiliations_batch 之后可以当一致性检查跑。
+"""
+from __future__ import annotations
+import argparse
+import random
+import time
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .affiliation_cleaner import split_affiliations_batch
+from .classifier import OUTPUT_COLUMNS, classify_affiliations_batch, classify_affiliations_for_row
+from .main import AFFIL_COL, ROR_PKL
+from .ror_index import RorMatcher
+from .ror_store import RorIndex
+from .table_io import read_table
+
+MatchResult = Tuple[str, str, float, str]
+
+_EXTRA = [
+    "Independent", "Independent Researcher", "Affiliation not provided to SSRN",
+    "Department of Economics", "Law School", "Nowhere Institute of Imaginary Studies",
+]
+
+
+def synthetic_frame(index: RorIndex, n: int, seed: int = 0) -> pd.DataFrame:
+    """从索引里随机取机构名拼成 affiliations：大小写、错字、and 连接、N/A 短语、重复、NaN。"""
+    rng = random.Random(seed)
+    names = [index.names[rng.randrange(index.n_names)] for _ in range(max(n // 5, 100))]
+    pool: List = []
+    for _ in range(max(n // 3, 50)):   # 约 1/3 的不同字符串，其余为重复
+        parts = []
+        for _ in range(rng.randint(1, 4)):
+            name = rng.choice(names) if rng.random() < 0.85 else rng.choice(_EXTRA)
+            r = rng.random()
+            if r < 0.5:
+                name = name.title()
+            elif r < 0.6 and len(name) > 6:
+                i = rng.randrange(1, len(name) - 2)
+                name = name[:i] + name[i + 1] + name[i] + name[i + 2:]
+            parts.append(name)
+        if len(parts) > 1 and rng.random() < 0.1:
+            parts[-2:] = [f"{parts[-2]} and {parts[-1]}"]
+        pool.append(rng.choice([", ", "; ", ","]).join(parts))
+    pool.append(np.nan)
+    return pd.DataFrame({AFFIL_COL: [rng.choice(pool) for _ in range(n)]})
+
+
+class _Replay:
+    """按预先算好的结果回答 match / match_many（只为单独测拆分 + 汇总的耗时）。"""
+
+    def __init__(self, results: Dict[str, MatchResult]) -> None:
+        self.results = results
+
+    def match(self, seg: str, threshold: float = 95.0) -> MatchResult:
+        return self.results[seg]
+
+    def match_many(self, segs: Sequence[str], threshold: float = 95.0) -> List[MatchResult]:
+        return [self.results[s] for s in segs]
+
+
+def _mismatches(ref: List[tuple], got: pd.DataFrame) -> List[int]:
+    got_rows = list(got[OUTPUT_COLUMNS].itertuples(index=False, name=None))
+    return [i for i, (a, b) in enumerate(zip(ref, got_rows)) if tuple(a) != b]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="classify 批量实现的一致性校验与吞吐对比")
+    ap.add_argument("input", nargs="?", help="CSV / parquet 输入（需要 affiliations 列）")
+    ap.add_argument("--synthetic", type=int, default=0, help="不给输入时生成多少行合成数据")
+    ap.add_argument("--ror-pkl", default=ROR_PKL)
+    args = ap.parse_args()
+
+    index = RorMatcher(args.ror_pkl, verbose=False).index
+    df = read_table(args.input) if args.input else synthetic_frame(index, args.synthetic or 50_000)
+    col = df[AFFIL_COL]
+    uniques = list(pd.unique(col.where(col.notna(), "").astype(str)))
+    n = len(uniques)
+    print(f"行数: {len(df)}，不同的 affiliations: {n}")
+
+    # 1. 整体（每边用一个新的匹配器，不共享进程内缓存）
+    matcher = RorMatcher(args.ror_pkl, verbose=False)
+    t0 = time.perf_counter()
+    ref = [classify_affiliations_for_row(a, matcher) for a in uniques]
+    t_row = time.perf_counter() - t0
+
+    matcher = RorMatcher(args.ror_pkl, verbose=False)
+    t0 = time.perf_counter()
+    got = classify_affiliations_batch(uniques, matcher)
+    t_batch = time.perf_counter() - t0
+
+    # 2. 只比拆分 + 汇总：匹配结果预先算好、两边回放
+    parts = split_affiliations_batch(uniques)
+    segs = sorted(set(parts["raw"]))
+    replay = _Replay(dict(zip(segs, matcher.match_many(segs))))
+    t0 = time.perf_counter()
+    ref_agg = [classify_affiliations_for_row(a, replay) for a in uniques]
+    t_row_agg = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    got_agg = classify_affiliations_batch(uniques, replay)
+    t_batch_agg = time.perf_counter() - t0
+
+    print(f"  整体：逐行 {t_row:.2f}s（{n / t_row:,.0f} 个/秒） / "
+          f"批量 {t_batch:.2f}s（{n / t_batch:,.0f} 个/秒），{t_row / t_batch:.1f}x")
+    print(f"  拆分 + 汇总：逐行 {t_row_agg:.3f}s / 批量 {t_batch_agg:.3f}s，{t_row_agg / t_batch_agg:.1f}x")
+
+    bad = _mismatches(ref, got)
+    bad_agg = _mismatches(ref_agg, got_agg)
+    if bad or bad_agg:
+        for label, idx, r, g in (("整体", bad, ref, got), ("回放", bad_agg, ref_agg, got_agg)):
+            for i in idx[:10]:
+                print(f"  !! [{label}] {uniques[i]!r}: {tuple(r[i])!r} vs {tuple(g[OUTPUT_COLUMNS].iloc[i])!r}")
+        raise SystemExit(f"❌ 不一致：整体 {len(bad)} 个 / 回放 {len(bad_agg)} 个")
+    print("✅ affil_detail / match_conf / english_background / affil_ror_ids 完全一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,19 @@
 from __future__ import annotations
-from typing import Tuple
-from .affiliation_cleaner import split_affiliations
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import profiling
+from .affiliation_cleaner import split_affiliations, split_affiliations_batch
 from .config import ENGLISH_ISO2
 from .ror_index import RorMatcher, match_ror_segment
 
+OUTPUT_COLUMNS = ["affil_detail", "match_conf", "english_background", "affil_ror_ids"]
+
+# 不对应国家的 token（english_background 判 unknown 用）
+_NON_COUNTRY_TOKENS = {"N/A", "Independent", "unknown"}
+
 
 def classify_affiliations_for_row(
     affil_str: str,
@@ -20,7 +30,8 @@ def classify_affiliations_for_row(
          - english_background: "strong"/"weak"/"unknown"/"Independent"
          - ror_ids_str: 本行匹配到的所有 ROR URL（去重后，用 '; ' 连接）
     """
-    segments = split_affiliations(affil_str)
+    with profiling.stage("classify.split"):
+        segments = split_affiliations(affil_str)
 
     detail_tokens = []        # 每个片段的分类 token：Independent / NA / ISO2 / unknown
     match_statuses = []       # exact / fuzzy / unknown / independent / na
@@ -85,3 +96,133 @@ def classify_affiliations_for_row(
     ror_ids_str = "; ".join(unique_ror_ids)
 
     return affil_detail_str, match_conf, english_bg, ror_ids_str
+
+
+def classify_batch(
+    rows: Sequence[int],
+    tokens: Sequence[str],
+    statuses: Sequence[str],
+    ror_ids: Sequence[str],
+    n_rows: int,
+) -> pd.DataFrame:
+    """
+    classify_affiliations_for_row 后半段（汇总）的列式版本。
+
+    输入是拆开后每个片段一条的匹配结果（四个等长的列）：
+      rows     : 片段属于第几行（0 .. n_rows-1）；同一行的片段按原来的顺序排列
+      tokens   : Independent / N/A / ISO2 / unknown
+      statuses : exact / fuzzy / unknown / independent / na
+      ror_ids  : 匹配到的 ROR URL，没有则为 ""
+    返回 n_rows 行、OUTPUT_COLUMNS 四列的表，每行与 classify_affiliations_for_row 的结果相同；
+    没有片段的行为 ("", 0, "unknown", "")。
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    tokens = np.asarray(tokens, dtype=object)
+    statuses = np.asarray(statuses, dtype=object)
+    ror_ids = np.asarray(ror_ids, dtype=object)
+    if len(rows) and np.any(rows[1:] < rows[:-1]):
+        order = np.argsort(rows, kind="stable")   # 同一行内保持原顺序
+        rows, tokens, statuses, ror_ids = rows[order], tokens[order], statuses[order], ror_ids[order]
+
+    # token / status / ror_id 的取值很少：先编码成整数，比较只在不同的取值上做一次
+    tok_codes, tok_values = pd.factorize(tokens)
+    st_codes, st_values = pd.factorize(statuses)
+
+    def per_row(values: np.ndarray, codes: np.ndarray, wanted) -> np.ndarray:
+        hit = np.array([v in wanted for v in values], dtype=bool)[codes]
+        return np.bincount(rows[hit], minlength=n_rows)
+
+    n_seg = np.bincount(rows, minlength=n_rows)
+    empty = n_seg == 0
+
+    # match_conf：有 unknown -> -1；否则有 fuzzy -> 1；否则 0
+    match_conf = np.where(
+        per_row(st_values, st_codes, {"unknown"}) > 0, -1,
+        np.where(per_row(st_values, st_codes, {"fuzzy"}) > 0, 1, 0),
+    ).astype(np.int64)
+
+    # english_background：有英语国家 -> strong；全是 Independent -> Independent；
+    # 全是 N/A / Independent / unknown -> unknown；否则 weak
+    english_bg = np.select(
+        [
+            per_row(tok_values, tok_codes, ENGLISH_ISO2) > 0,
+            per_row(tok_values, tok_codes, {"Independent"}) == n_seg,
+            per_row(tok_values, tok_codes, _NON_COUNTRY_TOKENS) == n_seg,
+        ],
+        ["strong", "Independent", "unknown"],
+        "weak",
+    ).astype(object)
+    english_bg[empty] = "unknown"
+
+    # affil_ror_ids：每行去重、排序后的 ROR URL（sort=True 的编码顺序就是字符串顺序）
+    id_codes, id_values = pd.factorize(ror_ids, sort=True)
+    id_values = np.asarray(id_values, dtype=object)
+    has_id = np.array([bool(v) for v in id_values], dtype=bool)[id_codes]
+    keys = np.unique(rows[has_id] * max(len(id_values), 1) + id_codes[has_id])
+    id_rows, id_codes = np.divmod(keys, max(len(id_values), 1))
+
+    return pd.DataFrame({
+        "affil_detail": _join_by_row(rows, np.asarray(tok_values, dtype=object)[tok_codes], n_rows),
+        "match_conf": match_conf,
+        "english_background": english_bg,
+        "affil_ror_ids": _join_by_row(id_rows, id_values[id_codes], n_rows),
+    })
+
+
+def _join_by_row(rows: np.ndarray, values: np.ndarray, n_rows: int, sep: str = "; ") -> np.ndarray:
+    """按行把相邻的 values 用 sep 连起来（rows 已排好序）；没有值的行为 ""。"""
+    out = np.full(n_rows, "", dtype=object)
+    if len(rows) == 0:
+        return out
+    # 值和分隔符交错排好，整列一次 join，再按行尾拆开（token / ROR URL 里不会有换行）
+    last = np.append(rows[1:] != rows[:-1], True)
+    pieces = np.empty(2 * len(rows), dtype=object)
+    pieces[0::2] = values
+    pieces[1::2] = np.where(last, "\n", sep)
+    out[rows[last]] = "".join(pieces.tolist()).split("\n")[:-1]
+    return out
+
+
+def classify_affiliations_batch(
+    affil_strs: Sequence[str],
+    ror_matcher,
+    threshold: float = 95.0,
+    workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    多行版的 classify_affiliations_for_row：整列拆分（split_affiliations_batch），
+    所有候选片段一次 match_many，再用 classify_batch 汇总。
+    ror_matcher 可以是 RorMatcher，也可以是 MatcherClient（只用到 match_many）。
+    workers: 传给 RorMatcher.match_many 的打分线程数；None = 用它的默认值（全部核）。
+        进程池的 worker 里要传 1，否则每个进程各开一整套线程。
+    返回与 affil_strs 等长、OUTPUT_COLUMNS 四列的表，每行与 classify_affiliations_for_row 相同。
+    """
+    with profiling.stage("classify.split"):
+        parts = split_affiliations_batch(affil_strs)
+    prof = profiling.active
+    if prof is not None:
+        prof.count("classify.rows", len(affil_strs))
+        prof.count("classify.segments", len(parts))
+    cats = parts["category"].to_numpy()
+    n = len(parts)
+    tokens = np.empty(n, dtype=object)
+    statuses = np.empty(n, dtype=object)
+    ror_ids = np.full(n, "", dtype=object)
+
+    indep = cats == "Independent"
+    na = cats == "NA"
+    tokens[indep], statuses[indep] = "Independent", "independent"
+    tokens[na], statuses[na] = "N/A", "na"
+
+    # 其余的片段都跑 ROR 匹配（与逐行版一样，只有 Independent / NA 两类跳过）
+    cand = ~(indep | na)
+    if cand.any():
+        with profiling.stage("classify.match"):
+            kwargs = {} if workers is None else {"workers": workers}
+            results = ror_matcher.match_many(parts["raw"].to_numpy()[cand].tolist(), threshold=threshold, **kwargs)
+        tokens[cand] = [country if country else "unknown" for country, _, _, _ in results]
+        statuses[cand] = [status for _, status, _, _ in results]
+        ror_ids[cand] = [ror_id or "" for _, _, _, ror_id in results]
+
+    with profiling.stage("classify.aggregate"):
+        return classify_batch(parts["row"].to_numpy(), tokens, statuses, ror_ids, len(affil_strs))
@@ -1,58 +1,311 @@
 from __future__ import annotations
+import argparse
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
 import pandas as pd
 
+from . import profiling
+from .match_cache import match_cache_path_for
+from .matcher_client import MatcherClient
+from .parallel import ClassifierPool
 from .ror_index import RorMatcher
-from .classifier import classify_affiliations_for_row
+from .classifier import OUTPUT_COLUMNS, classify_affiliations_batch
+from .table_io import (
+    append_csv_chunk, is_parquet, iter_table_chunks, read_table, write_table,
+)
 
 
+# 输入 / 输出可以是 .csv 或 .parquet（按后缀自动选择格式）
 INPUT_CSV = r"E:\SSRNPaperResearch\data\Biorn\result\Bio_law_clarify11.csv"
 OUTPUT_CSV = r"E:\SSRNPaperResearch\data\Biorn\result\Bio_law_ror1234.csv"
 ROR_PKL = r"E:\SSRNPaperResearch\data\new_ror_name.pkl"
 AFFIL_COL = "affiliations"
-ENCODING = "utf-8-sig"
-
 
-def main() -> None:
-    print("初始化 ROR 匹配引擎（倒排索引加速）...")
-    ror_matcher = RorMatcher(ROR_PKL)
+# 流式模式：每块行数（合并多期刊的大表时用）
+DEFAULT_CHUNKSIZE = 5000
 
-    print(f"读取 CSV: {INPUT_CSV}")
-    df = pd.read_csv(INPUT_CSV, encoding=ENCODING)
 
+def classify_frame(
+    df: pd.DataFrame,
+    ror_matcher: Optional[RorMatcher],
+    log_every: Optional[int] = 300,
+    pool: Union[ClassifierPool, MatcherClient, None] = None,
+) -> pd.DataFrame:
+    """
+    给一张表（或一块）加上 affil_detail / match_conf / english_background / affil_ror_ids 四列。
+    很多行的 affiliations 一字不差，所以先 factorize，每个不同的字符串只分类一次，再按编码广播回各行。
+    不同的字符串整批分类（classify_affiliations_batch：整列拆分 + 一次 match_many + 列式汇总）；
+    给了 pool 时交给它（多进程池或常驻匹配服务，结果顺序不变），此时 ror_matcher 可以是 None。
+    """
     if AFFIL_COL not in df.columns:
         raise ValueError(f"CSV 中找不到列 '{AFFIL_COL}'")
 
-    affil_details = []
-    match_confs = []
-    english_bgs = []
-    affil_ror_ids = []   # ★ 新增：每行所有匹配到的 ROR URL
+    col = df[AFFIL_COL]
+    keys = col.where(col.notna(), "").astype(str)   # 空值按 "" 处理
+    with profiling.stage("classify.factorize"):
+        codes, uniques = pd.factorize(keys, sort=False)
+    n_rows, n_uniq = len(df), len(uniques)
+    if log_every and n_rows:
+        print(f"  共 {n_rows} 行，不同的 affiliations {n_uniq} 个（去重比 {n_rows / max(n_uniq, 1):.1f}x）")
+
+    t0 = time.perf_counter()
+    with profiling.stage("classify.unique"):
+        if pool is not None:
+            results = pd.DataFrame(pool.classify_many(list(uniques)), columns=OUTPUT_COLUMNS)
+        else:
+            results = classify_affiliations_batch(list(uniques), ror_matcher)
+    if log_every and n_uniq:
+        dt = time.perf_counter() - t0
+        print(f"  已分类 {n_uniq} 个不同的 affiliations（{dt:.1f}s，{n_uniq / max(dt, 1e-9):,.0f} 个/秒）")
+
+    df = df.copy()
+    df["affil_detail"] = results["affil_detail"].to_numpy(dtype=object)[codes]
+    df["match_conf"] = results["match_conf"].to_numpy(dtype=np.int64)[codes]
+    df["english_background"] = results["english_background"].to_numpy(dtype=object)[codes]
+    df["affil_ror_ids"] = results["affil_ror_ids"].to_numpy(dtype=object)[codes]
+    return df
+
+
+# ===== 流式模式：分块读 → 分类 → 追加写，可断点续跑 =====
+
+def _progress_path(output_path: str) -> Path:
+    return Path(str(output_path) + ".progress.json")
+
+
+def _parts_dir(output_path: str) -> Path:
+    return Path(str(output_path) + ".parts")
+
+
+def _input_signature(input_path: str, chunksize: int) -> dict:
+    st = os.stat(input_path)
+    return {
+        "input": str(Path(input_path).resolve()),
+        "input_size": st.st_size,
+        "input_mtime_ns": st.st_mtime_ns,
+        "chunksize": chunksize,
+    }
+
+
+def _load_progress(output_path: str, signature: dict) -> Optional[dict]:
+    """读取断点；输入文件或块大小变了就作废。"""
+    p = _progress_path(output_path)
+    if not p.exists():
+        return None
+    try:
+        prog = json.loads(p.read_text(encoding="utf-8"))
+    except Exception as e:
+        print(f"⚠️ 断点文件损坏（{e}），从头开始。")
+        return None
+    if any(prog.get(k) != v for k, v in signature.items()):
+        print("⚠️ 输入文件或块大小与断点不一致，从头开始。")
+        return None
+    if not _output_matches_progress(output_path, prog):
+        print("⚠️ 输出文件缺失或比断点记录的短（被删 / 移走过？），从头开始。")
+        return None
+    return prog
+
+
+def _output_matches_progress(output_path: str, prog: dict) -> bool:
+    """断点记下的已完成部分是否都还在：CSV 至少有 csv_bytes 字节，parquet 的分块文件一个不少。"""
+    if prog.get("finished"):
+        return os.path.exists(output_path)
+    if is_parquet(output_path):
+        return len(list(_parts_dir(output_path).glob("part-*.parquet"))) >= prog.get("chunks_done", 0)
+    if prog.get("rows_done", 0) == 0:
+        return True
+    return os.path.exists(output_path) and os.path.getsize(output_path) >= prog.get("csv_bytes", 0)
 
-    for idx, val in df[AFFIL_COL].items():
-        affil_str = "" if pd.isna(val) else str(val)
 
-        # 现在 classify_affiliations_for_row 返回 4 个值
-        detail, conf, en_bg, ror_ids = classify_affiliations_for_row(
-            affil_str,
-            ror_matcher,
+def _save_progress(output_path: str, prog: dict) -> None:
+    p = _progress_path(output_path)
+    tmp = p.with_suffix(".tmp")
+    tmp.write_text(json.dumps(prog, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, p)
+
+
+def _merge_parquet_parts(parts_dir: Path, output_path: str) -> None:
+    """把每块的 parquet 合并成一个文件（逐块写，不整表进内存）。"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    parts = sorted(parts_dir.glob("part-*.parquet"))
+    # 某块整列为空时类型会推成 null，这里统一提升
+    schema = pa.unify_schemas([pq.read_schema(p) for p in parts], promote_options="permissive")
+    with pq.ParquetWriter(output_path, schema, compression="zstd", use_dictionary=True) as writer:
+        for p in parts:
+            writer.write_table(pq.read_table(p).cast(schema))
+
+
+def main_streaming(
+    input_path: str,
+    output_path: str,
+    ror_matcher: Optional[RorMatcher],
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    resume: bool = True,
+    pool: Union[ClassifierPool, MatcherClient, None] = None,
+) -> None:
+    """
+    分块处理：每块分类后立刻追加到输出，并在 <输出>.progress.json 记下完成到第几块。
+    中断后重跑会从最后一个完整写出的块之后继续。
+      - CSV 输出：直接追加到输出文件（续跑时先截掉未记录的半块）
+      - parquet 输出：每块写成 <输出>.parts/part-NNNNN.parquet，全部完成后合并
+    """
+    signature = _input_signature(input_path, chunksize)
+    parquet_out = is_parquet(output_path)
+    parts_dir = _parts_dir(output_path)
+
+    prog = _load_progress(output_path, signature) if resume else None
+    if prog is None:
+        prog = {**signature, "chunks_done": 0, "rows_done": 0, "csv_bytes": 0, "finished": False}
+        if parquet_out:
+            shutil.rmtree(parts_dir, ignore_errors=True)
+        elif os.path.exists(output_path):
+            os.remove(output_path)
+    elif prog.get("finished"):
+        print(f"✅ 断点显示已全部完成（{prog['rows_done']} 行），无需重跑: {output_path}")
+        return
+    else:
+        print(f"↩️ 从断点继续：已完成 {prog['chunks_done']} 块 / {prog['rows_done']} 行")
+        if not parquet_out and os.path.exists(output_path):
+            # 去掉上次中断时写了一半的块
+            with open(output_path, "r+b") as f:
+                f.truncate(prog["csv_bytes"])
+
+    t_start = time.perf_counter()
+    rows_this_run = 0
+    chunks = iter_table_chunks(input_path, chunksize, skip_rows=prog["rows_done"])
+    for chunk in profiling.timed_iter("io.read", chunks):
+        t0 = time.perf_counter()
+        out = classify_frame(chunk, ror_matcher, log_every=None, pool=pool)
+
+        with profiling.stage("io.write"):
+            if parquet_out:
+                parts_dir.mkdir(parents=True, exist_ok=True)
+                write_table(out, parts_dir / f"part-{prog['chunks_done']:05d}.parquet")
+            else:
+                prog["csv_bytes"] = append_csv_chunk(out, output_path, header=prog["rows_done"] == 0)
+
+        prog["chunks_done"] += 1
+        prog["rows_done"] += len(out)
+        _save_progress(output_path, prog)
+
+        rows_this_run += len(out)
+        dt = time.perf_counter() - t0
+        total_dt = time.perf_counter() - t_start
+        print(
+            f"  块 {prog['chunks_done']}: {len(out)} 行，{len(out) / max(dt, 1e-9):,.0f} 行/秒"
+            f"（累计 {prog['rows_done']} 行，本次平均 {rows_this_run / max(total_dt, 1e-9):,.0f} 行/秒）"
         )
 
-        affil_details.append(detail)
-        match_confs.append(conf)
-        english_bgs.append(en_bg)
-        affil_ror_ids.append(ror_ids)   # ★ 新增
+    if parquet_out:
+        if prog["chunks_done"] == 0:
+            write_table(classify_frame(read_table(input_path), ror_matcher, pool=pool), output_path)
+        else:
+            _merge_parquet_parts(parts_dir, output_path)
+        shutil.rmtree(parts_dir, ignore_errors=True)
+    elif prog["chunks_done"] == 0:
+        # 空表：至少写出表头
+        write_table(classify_frame(read_table(input_path), ror_matcher, pool=pool), output_path)
 
-        if idx % 300 == 0:
-            print(f"  已处理 {idx} 行...")
+    prog["finished"] = True
+    _save_progress(output_path, prog)
+    print(f"处理完成，共 {prog['rows_done']} 行，保存到: {output_path}")
 
-    df["affil_detail"] = affil_details
-    df["match_conf"] = match_confs
-    df["english_background"] = english_bgs
-    df["affil_ror_ids"] = affil_ror_ids   # ★ 新增列
 
-    df.to_csv(OUTPUT_CSV, index=False, encoding=ENCODING)
-    print(f"处理完成，保存到: {OUTPUT_CSV}")
+def main(
+    input_csv: str = INPUT_CSV,
+    output_csv: str = OUTPUT_CSV,
+    ror_pkl: str = ROR_PKL,
+    chunksize: Optional[int] = None,
+    resume: bool = True,
+    match_cache: Optional[str] = "",
+    workers: int = 1,
+    matcher_url: Optional[str] = "",
+    profile: Optional[str] = None,
+) -> None:
+    """
+    match_cache: 匹配结果缓存文件；"" = 默认放在 ROR pickle 旁边，None = 只用进程内缓存。
+    workers: 分类用的进程数；1 = 单进程，<= 0 = 全部核。
+    matcher_url: 常驻匹配服务（matcher_service.py）的地址；"" = 默认地址，None = 不用服务。
+        服务在跑且用的是同一份 ROR 数据时直接交给它分类，不在本进程加载索引
+        （此时 match_cache / workers 以服务端的设置为准）。
+    profile: 性能剖析（profiling.py）的 JSON 输出路径；"" = <输出>.profile.json，
+        None = 看环境变量 BGCHECK_PROFILE（没设就不剖析）。
+    """
+    if profile is None:
+        profile = profiling.env_setting()
+    if profile is not None:
+        profiling.enable()
+        profile = profile or str(output_csv) + ".profile.json"
 
+    client = MatcherClient.connect(ror_pkl, matcher_url or None) if matcher_url is not None else None
+    if client is not None:
+        print(f"使用常驻匹配服务 {client.url}（索引版本 {client.health['index_version']}）")
+        ror_matcher, cache, pool = None, None, client
+    else:
+        print("初始化 ROR 匹配引擎（倒排索引加速）...")
+        with profiling.stage("main.load_matcher"):
+            ror_matcher = RorMatcher(ror_pkl)
+            cache = ror_matcher.enable_cache(
+                match_cache_path_for(ror_pkl) if match_cache == "" else match_cache
+            )
+        pool = ClassifierPool(ror_matcher, workers) if workers != 1 else None
+    try:
+        if chunksize:
+            print(f"流式读取: {input_csv}（每块 {chunksize} 行）")
+            main_streaming(input_csv, output_csv, ror_matcher, chunksize=chunksize, resume=resume, pool=pool)
+            return
 
-if __name__ == "__main__":
-    main()
+        print(f"读取 CSV: {input_csv}")
+        with profiling.stage("io.read"):
+            df = read_table(input_csv)
+        df = classify_frame(df, ror_matcher, pool=pool)
 
+        with profiling.stage("io.write"):
+            write_table(df, output_csv)
+        print(f"处理完成，保存到: {output_csv}")
+    finally:
+        if pool is not None:
+            pool.close()
+        if ror_matcher is not None:
+            ror_matcher.report_paths()
+        if cache is not None:
+            cache.report()
+            cache.close()
+        profiling.report(profile)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="按 ROR 判定作者机构的国家 / 英语背景")
+    ap.add_argument("--input", default=INPUT_CSV)
+    ap.add_argument("--output", default=OUTPUT_CSV)
+    ap.add_argument("--ror-pkl", default=ROR_PKL)
+    ap.add_argument("--chunksize", type=int, nargs="?", const=DEFAULT_CHUNKSIZE, default=None,
+                    help=f"流式分块处理（默认每块 {DEFAULT_CHUNKSIZE} 行），可断点续跑")
+    ap.add_argument("--no-resume", action="store_true", help="流式模式下忽略断点，从头开始")
+    ap.add_argument("--match-cache", default="",
+                    help="匹配结果缓存（SQLite）路径，默认放在 ROR pickle 旁边")
+    ap.add_argument("--no-match-cache", action="store_true", help="不用磁盘缓存（只用进程内 LRU）")
+    ap.add_argument("--workers", type=int, default=1, help="分类进程数（1 = 单进程，0 = 全部核）")
+    ap.add_argument("--matcher-url", default="",
+                    help="常驻匹配服务地址（默认 $ROR_MATCHER_URL 或 http://127.0.0.1:8765）")
+    ap.add_argument("--no-matcher-service", action="store_true", help="不用常驻匹配服务，总在本进程匹配")
+    ap.add_argument("--profile", nargs="?", const="", default=None, metavar="JSON",
+                    help=f"打印各阶段耗时 / 候选数直方图并写出 JSON（默认 <输出>.profile.json；"
+                         f"也可设环境变量 {profiling.ENV_VAR}）")
+    args = ap.parse_args()
+    main(
+        args.input, args.output, args.ror_pkl,
+        chunksize=args.chunksize,
+        resume=not args.no_resume,
+        match_cache=None if args.no_match_cache else args.match_cache,
+        workers=args.workers,
+        matcher_url=None if args.no_matcher_service else args.matcher_url,
+        profile=args.profile,
+    )
@@ -0,0 +1,217 @@
+"""
+机构片段匹配结果的两级缓存：进程内 LRU + 磁盘 SQLite。
+
+SSRN 的 affiliations 重复得很厉害（"Harvard University"、
+"Affiliation not provided to SSRN" 在各期刊里出现成千上万次），
+同一个片段没必要每次运行都重新跑一遍 fuzzy 匹配。
+
+键：(规范化后的片段, threshold, 匹配器版本)
+  - 规范化与 RorMatcher.match 一致：strip + lower
+  - 匹配器版本 = ROR 索引版本 + 剪枝参数（见 RorMatcher.cache_version），
+    ROR 数据更新后版本变了，旧结果自然失效；打开缓存时顺带删掉旧索引版本的行
+    （同一索引、不同剪枝参数的行保留：bench / 试验用别的 --top-k 跑一次不会清掉正式的缓存）。
+    索引是增量更新出来的（ror_store.update_index）时，先用 migrate_match_cache
+    把没受影响的结果搬到新版本，只有受影响的片段需要重算
+值：(country, status, score, ror_id)，即 RorMatcher.match 的返回值
+"""
+from __future__ import annotations
+import sqlite3
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+MatchResult = Tuple[str, str, float, str]
+
+DEFAULT_LRU_SIZE = 200_000
+FLUSH_EVERY = 1000   # 攒够这么多条新结果写一次盘
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS match_results (
+    segment   TEXT NOT NULL,
+    threshold REAL NOT NULL,
+    version   TEXT NOT NULL,
+    country   TEXT NOT NULL,
+    status    TEXT NOT NULL,
+    score     REAL NOT NULL,
+    ror_id    TEXT NOT NULL,
+    PRIMARY KEY (segment, threshold, version)
+)
+"""
+
+
+def match_cache_path_for(pkl_path: str) -> str:
+    """默认缓存文件放在 ROR pickle 旁边：new_ror_name.pkl -> new_ror_name.matchcache.sqlite"""
+    return str(Path(pkl_path).with_suffix(".matchcache.sqlite"))
+
+
+def migrate_match_cache(
+    path: str,
+    old_index_version: str,
+    new_index_version: str,
+    is_affected: Callable[[str, float, float, str], bool],
+) -> Tuple[int, int]:
+    """
+    把旧索引版本下的缓存结果搬到新索引版本（剪枝参数等版本后缀保持不变）：
+    is_affected(segment, threshold, score, ror_id) 为真的行删掉，其余改成新版本号。返回 (保留数, 作废数)。
+    """
+    conn = sqlite3.connect(path, timeout=60)
+    try:
+        conn.execute(_SCHEMA)
+        old_prefix = old_index_version + ":"
+        rows = conn.execute(
+            "SELECT segment, threshold, version, score, ror_id FROM match_results "
+            "WHERE substr(version, 1, ?) = ?",
+            (len(old_prefix), old_prefix),
+        ).fetchall()
+        dropped = [(seg, th, ver) for seg, th, ver, score, ror_id in rows if is_affected(seg, th, score, ror_id)]
+        conn.executemany(
+            "DELETE FROM match_results WHERE segment = ? AND threshold = ? AND version = ?", dropped
+        )
+        conn.execute(
+            "UPDATE OR REPLACE match_results SET version = ? || substr(version, ?) "
+            "WHERE substr(version, 1, ?) = ?",
+            (new_index_version, len(old_prefix), len(old_prefix), old_prefix),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return len(rows) - len(dropped), len(dropped)
+
+
+class MatchCache:
+    def __init__(self, path: Optional[str], version: str, lru_size: int = DEFAULT_LRU_SIZE) -> None:
+        """path 为 None 时只用进程内 LRU。"""
+        self.path = path
+        self.version = version
+        self.lru_size = lru_size
+        self._lru: "OrderedDict[Tuple[str, float], MatchResult]" = OrderedDict()
+        self._pending: List[tuple] = []
+
+        self.lru_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.conn: Optional[sqlite3.Connection] = None
+        if path:
+            # 多进程分类时各 worker 同时写，等锁而不是直接报 "database is locked"
+            self.conn = sqlite3.connect(path, timeout=60)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(_SCHEMA)
+            # 只比较索引版本部分（"<索引版本>:k..:g.." 的冒号之前）
+            index_prefix = version.split(":", 1)[0] + ":"
+            stale = self.conn.execute(
+                "DELETE FROM match_results WHERE substr(version, 1, ?) != ?",
+                (len(index_prefix), index_prefix),
+            ).rowcount
+            self.conn.commit()
+            if stale:
+                print(f"  匹配缓存：ROR 索引已更新，清掉旧版本结果 {stale} 条")
+
+    def close(self) -> None:
+        self.flush()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self) -> "MatchCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ----- LRU -----
+
+    def _lru_get(self, key: Tuple[str, float]) -> Optional[MatchResult]:
+        hit = self._lru.get(key)
+        if hit is not None:
+            self._lru.move_to_end(key)
+        return hit
+
+    def _lru_put(self, key: Tuple[str, float], value: MatchResult) -> None:
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    # ----- 读 -----
+
+    def get(self, q: str, threshold: float) -> Optional[MatchResult]:
+        """q 须已规范化（strip + lower）。"""
+        return self.get_many([q], threshold).get(q)
+
+    def get_many(self, qs: Iterable[str], threshold: float) -> Dict[str, MatchResult]:
+        """批量查；返回命中的 {q: 结果}，没命中的不在结果里。"""
+        found: Dict[str, MatchResult] = {}
+        missing: List[str] = []
+        for q in qs:
+            hit = self._lru_get((q, threshold))
+            if hit is not None:
+                found[q] = hit
+                self.lru_hits += 1
+            else:
+                missing.append(q)
+
+        if missing and self.conn is not None:
+            self.flush()
+            for i in range(0, len(missing), 500):   # SQLite 参数个数有上限
+                part = missing[i:i + 500]
+                rows = self.conn.execute(
+                    f"""
+                    SELECT segment, country, status, score, ror_id FROM match_results
+                    WHERE threshold = ? AND version = ? AND segment IN ({",".join("?" * len(part))})
+                    """,
+                    (threshold, self.version, *part),
+                )
+                for seg, country, status, score, ror_id in rows:
+                    value = (country, status, score, ror_id)
+                    found[seg] = value
+                    self._lru_put((seg, threshold), value)
+                    self.disk_hits += 1
+
+        self.misses += sum(1 for q in missing if q not in found)
+        return found
+
+    # ----- 写 -----
+
+    def put(self, q: str, threshold: float, value: MatchResult) -> None:
+        self._lru_put((q, threshold), value)
+        if self.conn is not None:
+            self._pending.append((q, threshold, self.version, *value))
+            if len(self._pending) >= FLUSH_EVERY:
+                self.flush()
+
+    def flush(self) -> None:
+        if self.conn is None or not self._pending:
+            return
+        self.conn.executemany(
+            """
+            INSERT OR REPLACE INTO match_results
+                (segment, threshold, version, country, status, score, ror_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            self._pending,
+        )
+        self.conn.commit()
+        self._pending.clear()
+
+    # ----- 统计 -----
+
+    def stats(self) -> Dict[str, float]:
+        total = self.lru_hits + self.disk_hits + self.misses
+        return {
+            "lookups": total,
+            "lru_hits": self.lru_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.lru_hits + self.disk_hits) / total if total else 0.0,
+        }
+
+    def report(self) -> None:
+        st = self.stats()
+        if not st["lookups"]:
+            return
+        print(
+            f"  匹配缓存：查询 {st['lookups']} 次，命中率 {st['hit_rate']:.1%}"
+            f"（内存 {st['lru_hits']} / 磁盘 {st['disk_hits']} / 未命中 {st['misses']}）"
+        )
@@ -0,0 +1,113 @@
+"""
+matcher_service 的客户端：服务在跑（而且用的是同一份 ROR 数据）就走服务，否则退回进程内匹配。
+
+    from backgroundcheck.matcher_client import connect_or_load
+    matcher = connect_or_load(ror_pkl)          # MatcherClient 或 RorMatcher
+    matcher.match_many(["Harvard University", ...])
+
+MatcherClient 有 match / match_many / classify_many，可以直接当 classify_frame 的 pool 用。
+服务地址默认 http://127.0.0.1:8765，可用环境变量 ROR_MATCHER_URL 改。
+"""
+from __future__ import annotations
+import json
+import os
+import urllib.error
+import urllib.request
+from typing import List, Optional, Sequence, Tuple, Union
+
+from .matcher_service import DEFAULT_HOST, DEFAULT_PORT
+from .ror_index import RorMatcher
+from .ror_store import source_signature
+
+MatchResult = Tuple[str, str, float, str]
+RowResult = Tuple[str, int, str, str]
+
+URL_ENV = "ROR_MATCHER_URL"
+DEFAULT_URL = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}"
+CONNECT_TIMEOUT = 0.5     # 探测服务是否在跑
+REQUEST_TIMEOUT = 600     # 一批的匹配可能要几分钟（缓存还是空的时候）
+BATCH_SIZE = 2000         # 每个请求最多带多少条
+
+
+# 只连本机，不走 http_proxy 之类的环境变量
+_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+
+def default_url() -> str:
+    return os.environ.get(URL_ENV) or DEFAULT_URL
+
+
+class MatcherClient:
+    def __init__(self, url: str, health: dict) -> None:
+        self.url = url.rstrip("/")
+        self.health = health
+
+    @classmethod
+    def connect(cls, ror_pkl: str, url: Optional[str] = None) -> Optional["MatcherClient"]:
+        """服务在跑且数据源与 ror_pkl 一致（文件名 + size/mtime）才返回客户端，否则 None。"""
+        url = (url or default_url()).rstrip("/")
+        try:
+            with _opener.open(url + "/health", timeout=CONNECT_TIMEOUT) as resp:
+                health = json.loads(resp.read().decode("utf-8"))
+        except (OSError, ValueError):   # 连不上 / 超时 / 不是我们的服务
+            return None
+        try:
+            same_source = (
+                os.path.basename(health["source_path"]) == os.path.basename(ror_pkl)
+                and health["source"] == source_signature(ror_pkl)
+            )
+        except (KeyError, OSError):
+            return None
+        if not same_source:
+            print(f"⚠️ {url} 上的匹配服务用的是 {health.get('source_path')}，与 {ror_pkl} 不一致，不使用")
+            return None
+        return cls(url, health)
+
+    def _post(self, path: str, payload: dict) -> list:
+        req = urllib.request.Request(
+            self.url + path,
+            data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+            headers={"Content-Type": "application/json; charset=utf-8"},
+        )
+        try:
+            with _opener.open(req, timeout=REQUEST_TIMEOUT) as resp:
+                return json.loads(resp.read().decode("utf-8"))["results"]
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"匹配服务返回 {e.code}: {e.read().decode('utf-8', 'replace')}") from e
+
+    def match_many(self, segs: Sequence[str], threshold: float = 95.0) -> List[MatchResult]:
+        out: List[MatchResult] = []
+        for i in range(0, len(segs), BATCH_SIZE):
+            batch = [s if isinstance(s, str) else None for s in segs[i:i + BATCH_SIZE]]
+            for country, status, score, ror_id in self._post("/match", {"segments": batch, "threshold": threshold}):
+                out.append((country, status, float(score), ror_id))
+        return out
+
+    def match(self, seg: str, threshold: float = 95.0) -> MatchResult:
+        return self.match_many([seg], threshold)[0]
+
+    def classify_many(self, affil_strs: Sequence[str]) -> List[RowResult]:
+        out: List[RowResult] = []
+        for i in range(0, len(affil_strs), BATCH_SIZE):
+            batch = list(affil_strs[i:i + BATCH_SIZE])
+            for detail, conf, en_bg, ror_ids in self._post("/classify", {"affiliations": batch}):
+                out.append((detail, int(conf), en_bg, ror_ids))
+        return out
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "MatcherClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def connect_or_load(ror_pkl: str, url: Optional[str] = None, **matcher_kwargs) -> Union[MatcherClient, RorMatcher]:
+    """有可用的匹配服务就返回 MatcherClient，否则在本进程里加载 RorMatcher。"""
+    client = MatcherClient.connect(ror_pkl, url)
+    if client is not None:
+        print(f"  使用常驻匹配服务 {client.url}（索引版本 {client.health['index_version']}）")
+        return client
+    return RorMatcher(ror_pkl, **matcher_kwargs)
@@ -0,0 +1,174 @@
+"""
+常驻的本地 ROR 匹配服务：索引只加载一次，之后各脚本通过 localhost HTTP 批量调用。
+
+每个期刊跑一次 backgroundcheck.main 都要重新打开索引、重新预热名称解码缓存和匹配缓存；
+先起一个服务，之后 main（以及 matcher_client.connect_or_load 的调用方）会自动走它：
+
+    python -m backgroundcheck.matcher_service --ror-pkl E:\\SSRNPaperResearch\\data\\new_ror_name.pkl
+    python -m backgroundcheck.matcher_service --ror-pkl ror.zip --port 8766 --workers 4
+
+接口（JSON）：
+    GET  /health                                   -> 数据源、索引版本、缓存统计等
+    POST /match     {"segments": [...], "threshold": 95}   -> {"results": [[country, status, score, ror_id], ...]}
+    POST /classify  {"affiliations": [...]}        -> {"results": [[affil_detail, match_conf, english_background, affil_ror_ids], ...]}
+
+只监听 127.0.0.1（Windows 上也能用，所以没有用 Unix socket）。请求逐个处理：
+匹配器和 SQLite 缓存都只在一个线程里用；要多核就给 --workers，/classify 交给进程池。
+打开性能剖析（--profile 或环境变量 BGCHECK_PROFILE）时，/health 里带上目前为止的剖析数据。
+"""
+from __future__ import annotations
+import json
+import os
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Optional
+
+from . import profiling
+from .classifier import classify_affiliations_batch
+from .match_cache import match_cache_path_for
+from .parallel import ClassifierPool
+from .ror_index import RorMatcher
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+class MatcherService:
+    """服务端状态：一个常驻的 RorMatcher（+ 匹配缓存、可选的进程池）。"""
+
+    def __init__(self, ror_pkl: str, match_cache: Optional[str] = "", workers: int = 1) -> None:
+        self.ror_pkl = ror_pkl
+        self.matcher = RorMatcher(ror_pkl)
+        self.cache = self.matcher.enable_cache(
+            match_cache_path_for(ror_pkl) if match_cache == "" else match_cache
+        )
+        self.pool = ClassifierPool(self.matcher, workers) if workers != 1 else None
+        self.started_at = time.time()
+        self.n_requests = 0
+        self.n_items = 0
+
+    def health(self) -> dict:
+        index = self.matcher.index
+        return {
+            "pid": os.getpid(),
+            "source_path": os.path.abspath(self.ror_pkl),
+            "source": index.header["source"],
+            "params": index.header["params"],
+            "index_version": index.version,
+            "cache_version": self.matcher.cache_version,
+            "uptime": round(time.time() - self.started_at, 1),
+            "requests": self.n_requests,
+            "items": self.n_items,
+            "cache": self.cache.stats(),
+            "paths": self.matcher.path_counts,
+            "profile": profiling.active.to_dict() if profiling.active is not None else None,
+        }
+
+    def match(self, segments: list, threshold: float) -> list:
+        return [list(r) for r in self.matcher.match_many(segments, threshold=threshold)]
+
+    def classify(self, affiliations: list) -> list:
+        if self.pool is not None:
+            return [list(r) for r in self.pool.classify_many(affiliations)]
+        return classify_affiliations_batch(affiliations, self.matcher).values.tolist()
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.close()
+        self.matcher.report_paths()
+        self.cache.report()
+        self.cache.close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_Server"
+
+    def _reply(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path == "/health":
+            self._reply(200, self.server.service.health())
+        else:
+            self._reply(404, {"error": f"未知路径 {self.path}"})
+
+    def do_POST(self) -> None:
+        service = self.server.service
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            req = json.loads(self.rfile.read(length).decode("utf-8") or "{}")
+            if self.path == "/match":
+                items = req["segments"]
+                results = service.match(items, float(req.get("threshold", 95.0)))
+            elif self.path == "/classify":
+                items = req["affiliations"]
+                results = service.classify(items)
+            else:
+                self._reply(404, {"error": f"未知路径 {self.path}"})
+                return
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(400, {"error": f"请求格式不对: {e!r}"})
+            return
+        service.cache.flush()   # 服务被直接杀掉时，已算过的结果也在磁盘上
+        service.n_requests += 1
+        service.n_items += len(items)
+        self._reply(200, {"results": results})
+
+    def log_message(self, fmt: str, *args) -> None:
+        pass   # 批量请求很多，不逐条打印访问日志
+
+
+class _Server(HTTPServer):
+    def __init__(self, address, service: MatcherService) -> None:
+        super().__init__(address, _Handler)
+        self.service = service
+
+
+def serve(ror_pkl: str, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+          match_cache: Optional[str] = "", workers: int = 1, profile: Optional[str] = None) -> None:
+    """profile: 剖析 JSON 路径（"" = 只在退出时打印汇总）；None = 看环境变量 BGCHECK_PROFILE。"""
+    if profile is None:
+        profile = profiling.env_setting()
+    if profile is not None:
+        profiling.enable()
+    print("初始化 ROR 匹配引擎（倒排索引加速）...")
+    service = MatcherService(ror_pkl, match_cache=match_cache, workers=workers)
+    server = _Server((host, port), service)
+    print(f"✅ ROR 匹配服务已启动: http://{host}:{port}（Ctrl+C 退出）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n正在退出 ...")
+    finally:
+        server.server_close()
+        print(f"  共处理 {service.n_requests} 个请求 / {service.n_items} 条")
+        service.close()
+        profiling.report(profile or None)
+
+
+if __name__ == "__main__":
+    import argparse
+    from .main import ROR_PKL
+
+    ap = argparse.ArgumentParser(description="常驻的本地 ROR 匹配服务")
+    ap.add_argument("--ror-pkl", default=ROR_PKL)
+    ap.add_argument("--host", default=DEFAULT_HOST)
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("--match-cache", default="",
+                    help="匹配结果缓存（SQLite）路径，默认放在 ROR pickle 旁边")
+    ap.add_argument("--no-match-cache", action="store_true", help="不用磁盘缓存（只用进程内 LRU）")
+    ap.add_argument("--workers", type=int, default=1, help="/classify 用的进程数（1 = 单进程，0 = 全部核）")
+    ap.add_argument("--profile", nargs="?", const="", default=None, metavar="JSON",
+                    help="退出时打印各阶段耗时汇总（给了路径时同时写出 JSON）")
+    args = ap.parse_args()
+    serve(
+        args.ror_pkl, args.host, args.port,
+        match_cache=None if args.no_match_cache else args.match_cache,
+        workers=args.workers,
+        profile=args.profile,
+    )
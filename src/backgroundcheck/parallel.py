@@ -0,0 +1,112 @@
+"""
+多进程分类：每个 worker 进程自己打开同一个 .rorindex（mmap，只读），
+索引页由操作系统的页缓存共享，不会为每个任务重新 pickle 一份 RorMatcher。
+fork / spawn（Windows）都适用：worker 里重新 mmap 只要几毫秒。
+
+任务按「不同的 affiliations 字符串」分块发出去，executor.map 保证结果顺序与输入一致。
+每个 worker 打开同一个匹配结果缓存（SQLite WAL，多进程可并发读写），
+每块做完就把新结果写盘，并把缓存命中计数带回主进程汇总。
+"""
+from __future__ import annotations
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from . import profiling
+from .classifier import classify_affiliations_batch
+from .ror_index import RorMatcher
+
+RowResult = Tuple[str, int, str, str]
+
+DEFAULT_TASK_SIZE = 200   # 每个任务多少个不同的 affiliations 字符串
+
+_worker_matcher: Optional[RorMatcher] = None
+
+
+def _init_worker(pkl_path: str, index_path: str, top_k: Optional[int], gram_cap: Optional[int],
+                 cache_path: Optional[str], use_cache: bool, profile: bool = False) -> None:
+    global _worker_matcher
+    if profile:
+        profiling.enable(fresh=True)
+    _worker_matcher = RorMatcher(pkl_path, index_path=index_path, top_k=top_k, gram_cap=gram_cap, verbose=False)
+    if use_cache:
+        _worker_matcher.enable_cache(cache_path)
+
+
+def _classify_chunk(
+    affil_strs: Sequence[str],
+) -> Tuple[List[RowResult], Dict[str, int], Optional[dict], Optional[dict]]:
+    """返回 (结果, 各匹配路径的片段数, 缓存命中计数的增量, 剖析数据的增量)。"""
+    m = _worker_matcher
+    before = m.cache.stats() if m.cache is not None else None
+    paths_before = dict(m.path_counts)
+    # 并行已经在进程这一层，每个进程里的 cdist 只用一个线程
+    out = list(classify_affiliations_batch(affil_strs, m, workers=1).itertuples(index=False, name=None))
+    paths = {k: m.path_counts[k] - paths_before[k] for k in m.path_counts}
+    prof = profiling.active.drain() if profiling.active is not None else None
+    if m.cache is None:
+        return out, paths, None, prof
+    m.cache.flush()
+    after = m.cache.stats()
+    return out, paths, {k: after[k] - before[k] for k in ("lru_hits", "disk_hits", "misses")}, prof
+
+
+def resolve_workers(workers: int) -> int:
+    """-1 / 0 = 全部核。"""
+    return (os.cpu_count() or 1) if workers <= 0 else workers
+
+
+class ClassifierPool:
+    """
+    持有一个进程池，供 classify_frame 反复使用（流式模式下每块都用同一个池）。
+
+        with ClassifierPool(ror_matcher, workers=16) as pool:
+            results = pool.classify_many(unique_affils)
+    """
+
+    def __init__(self, ror_matcher: RorMatcher, workers: int, task_size: int = DEFAULT_TASK_SIZE) -> None:
+        self.ror_matcher = ror_matcher
+        self.workers = resolve_workers(workers)
+        self.task_size = task_size
+        cache = ror_matcher.cache
+        if cache is not None:
+            cache.flush()   # worker 会从磁盘读到主进程已有的结果
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(
+                ror_matcher.pkl_path,
+                ror_matcher.index.path,
+                ror_matcher.top_k,
+                ror_matcher.gram_cap,
+                cache.path if cache is not None else None,
+                cache is not None,
+                profiling.active is not None,
+            ),
+        )
+        print(f"  多进程分类：{self.workers} 个 worker 共享 {ror_matcher.index.path}")
+
+    def classify_many(self, affil_strs: Sequence[str]) -> List[RowResult]:
+        chunks = [affil_strs[i:i + self.task_size] for i in range(0, len(affil_strs), self.task_size)]
+        out: List[RowResult] = []
+        cache = self.ror_matcher.cache
+        for results, paths, stats, prof in self._executor.map(_classify_chunk, chunks):
+            out.extend(results)
+            if prof and profiling.active is not None:
+                profiling.active.merge(prof)
+            for k, n in paths.items():
+                self.ror_matcher.path_counts[k] += n
+            if stats and cache is not None:
+                cache.lru_hits += stats["lru_hits"]
+                cache.disk_hits += stats["disk_hits"]
+                cache.misses += stats["misses"]
+        return out
+
+    def close(self) -> None:
+        self._executor.shutdown()
+
+    def __enter__(self) -> "ClassifierPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,176 @@
+"""
+backgroundcheck 的可选性能剖析：各阶段的计时、计数和直方图，运行结束时打印汇总表并写出 JSON。
+
+默认关闭，热路径上只多一次 `profiling.active is None` 的判断。打开方式：
+    python -m backgroundcheck.main --profile                # 汇总写到 <输出>.profile.json
+    python -m backgroundcheck.main --profile prof.json
+    BGCHECK_PROFILE=1 python -m backgroundcheck.main        # 或 BGCHECK_PROFILE=prof.json
+
+埋点：
+    from . import profiling
+    with profiling.stage("io.read"):          # 粗粒度阶段（关闭时是空的上下文）
+        ...
+    prof = profiling.active                   # 每个片段都走的热路径：显式判断，关闭时不计时
+    if prof is not None:
+        prof.add_time("match.exact", dt)
+        prof.observe("match.candidates", len(cand))
+
+阶段名用 "模块.步骤"；外层阶段的时间包含内层（例如 classify.match 包含 match.*），
+所以占比一列加起来会超过 100%。多进程分类时 worker 的数据在每块结束后合并回主进程，
+各进程的时间相加，单个阶段的占比也可能超过 100%。
+"""
+from __future__ import annotations
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterable, Iterator, List, Optional
+
+ENV_VAR = "BGCHECK_PROFILE"
+
+_NULL_STAGE = nullcontext()
+
+
+class Profiler:
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.timers: Dict[str, List[float]] = {}        # 名称 -> [次数, 总秒数, 最大秒数]
+        self.counters: Dict[str, int] = {}
+        self.hists: Dict[str, Dict[int, int]] = {}      # 名称 -> {桶上界（2 的幂）: 次数}
+
+    def add_time(self, name: str, seconds: float, calls: int = 1) -> None:
+        t = self.timers.get(name)
+        if t is None:
+            self.timers[name] = [calls, seconds, seconds]
+        else:
+            t[0] += calls
+            t[1] += seconds
+            if seconds > t[2]:
+                t[2] = seconds
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - t0)
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name: str, value: int) -> None:
+        """记一个取值到直方图：桶为 0, 1, 2, 4, 8, ...（不小于 value 的最小的 2 的幂）。"""
+        bucket = 0 if value <= 0 else 1 << (int(value) - 1).bit_length()
+        h = self.hists.setdefault(name, {})
+        h[bucket] = h.get(bucket, 0) + 1
+
+    # ----- 多进程：worker 交出增量，主进程合并 -----
+
+    def drain(self) -> dict:
+        """取出目前的数据并清零（worker 每块结束时调用）。"""
+        raw = {"timers": self.timers, "counters": self.counters, "hists": self.hists}
+        self.timers, self.counters, self.hists = {}, {}, {}
+        return raw
+
+    def merge(self, raw: dict) -> None:
+        for name, (calls, total, longest) in raw["timers"].items():
+            t = self.timers.get(name)
+            if t is None:
+                self.timers[name] = [calls, total, longest]
+            else:
+                t[0] += calls
+                t[1] += total
+                t[2] = max(t[2], longest)
+        for name, n in raw["counters"].items():
+            self.count(name, n)
+        for name, buckets in raw["hists"].items():
+            h = self.hists.setdefault(name, {})
+            for bucket, n in buckets.items():
+                h[bucket] = h.get(bucket, 0) + n
+
+    # ----- 汇总 -----
+
+    def to_dict(self) -> dict:
+        return {
+            "wall_s": round(time.perf_counter() - self.started, 3),
+            "timers": {
+                name: {
+                    "calls": int(calls),
+                    "total_s": round(total, 4),
+                    "mean_ms": round(total / max(calls, 1) * 1000, 4),
+                    "max_ms": round(longest * 1000, 4),
+                }
+                for name, (calls, total, longest) in sorted(self.timers.items())
+            },
+            "counters": dict(sorted(self.counters.items())),
+            "histograms": {
+                name: {str(bucket): n for bucket, n in sorted(h.items())}
+                for name, h in sorted(self.hists.items())
+            },
+        }
+
+    def print_summary(self) -> None:
+        d = self.to_dict()
+        wall = max(d["wall_s"], 1e-9)
+        print(f"性能剖析（墙钟 {d['wall_s']:.2f}s；外层阶段包含内层）:")
+        # 中文表头每个字占两列宽，少补两个空格才能与下面的数字对齐
+        print(f"  {'阶段':<26}{'次数':>8}{'总计 s':>8}{'平均 ms':>9}{'最大 ms':>9}{'占比':>6}")
+        for name, t in d["timers"].items():
+            print(f"  {name:<28}{t['calls']:>10}{t['total_s']:>10.3f}{t['mean_ms']:>11.3f}"
+                  f"{t['max_ms']:>11.2f}{t['total_s'] / wall:>8.1%}")
+        if d["counters"]:
+            print("  计数: " + "，".join(f"{k} {v}" for k, v in d["counters"].items()))
+        for name, h in d["histograms"].items():
+            total = sum(h.values())
+            print(f"  {name}（共 {total}）: " + "  ".join(f"≤{b}: {n}" for b, n in h.items()))
+
+
+# 当前进程的剖析器；None = 关闭
+active: Optional[Profiler] = None
+
+
+def enable(fresh: bool = False) -> Profiler:
+    """打开剖析；fresh=True 时丢掉已有的数据（fork 出的 worker 会继承父进程的剖析器）。"""
+    global active
+    if active is None or fresh:
+        active = Profiler()
+    return active
+
+
+def env_setting() -> Optional[str]:
+    """BGCHECK_PROFILE：未设置 / 空 / "0" -> None；"1" -> ""（默认 JSON 路径）；其他 -> JSON 路径。"""
+    value = os.environ.get(ENV_VAR, "").strip()
+    if value in ("", "0"):
+        return None
+    return "" if value == "1" else value
+
+
+def stage(name: str):
+    """粗粒度阶段的计时上下文；关闭时什么也不做。"""
+    return active.stage(name) if active is not None else _NULL_STAGE
+
+
+def timed_iter(name: str, iterable: Iterable) -> Iterator:
+    """逐个产出 iterable 的元素，取每个元素的耗时记到 name（例如分块读表）。"""
+    it = iter(iterable)
+    while True:
+        t0 = time.perf_counter()
+        try:
+            item = next(it)
+        except StopIteration:
+            return
+        if active is not None:
+            active.add_time(name, time.perf_counter() - t0)
+        yield item
+
+
+def report(json_path: Optional[str] = None) -> None:
+    """打印汇总表；给了 json_path 时同时写出 JSON。关闭时什么也不做。"""
+    if active is None:
+        return
+    active.print_summary()
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(active.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f"  剖析结果已写入 {json_path}")
@@ -0,0 +1,390 @@
+"""
+RorMatcher 的基准：建索引耗时 / 加载耗时 / 内存 / 单片段延迟（p50、p99）/ 批量吞吐，
+结果存成 JSON，可以和之前保存的基线对比，改 ror_index.py / ror_store.py 前后各跑一次即可。
+
+数据：
+  - 机构表：默认按 --orgs 合成一份 ROR 风格的 slim pickle（也可 --ror 指定真实的 pickle / dump）
+  - 片段：默认合成，精确 / 近似（大小写、冠词、&、重音、标点、错字）/ 噪声（院系前缀、粘连、
+    乱序、截断）/ 匹配不上 四类混合；也可 --corpus 指定真实的 affiliations 表（csv / parquet）
+
+Usage（在 src/ 下）:
+    python -m backgroundcheck.ror_bench                                  # 合成 20 万机构、1 万片段
+    python -m backgroundcheck.ror_bench --orgs 50000 --segments 3000
+    python -m backgroundcheck.ror_bench --ror E:\\...\\new_ror_name.pkl --corpus result\\Bio_law_clarify11.csv
+    python -m backgroundcheck.ror_bench --save-baseline bench_base.json   # 记下基线
+    python -m backgroundcheck.ror_bench --baseline bench_base.json        # 对比，变慢超过容差时退出码为 1
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import pickle
+import platform
+import random
+import statistics as _stats
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .affiliation_cleaner import split_affiliations_batch
+from .ror_dump import peak_rss_mb
+from .ror_index import RorMatcher
+from .ror_store import index_path_for
+from .table_io import read_table
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_ORGS = 200_000
+DEFAULT_SEGMENTS = 10_000
+DEFAULT_TOLERANCE = 0.10
+LOAD_REPEAT = 5
+DEFAULT_REPEAT = 3
+
+# 对比基线时，绝对差低于这些值的不算回退（亚毫秒级的延迟、几 MB 的内存差、
+# 子进程启动带来的零点几秒本身就是噪声）；按指标名后缀匹配，先匹配先用
+NOISE_FLOOR = {"_per_s": 0.05, "_ms": 0.1, "_mb": 1.0, "_s": 0.5}
+# 吞吐（x 片段/秒）换算成整批耗时再比：耗时差不超过 NOISE_FLOOR["_per_s"] 秒的不算
+# p99 至少要这么多个样本才参与判定（样本少时 p99 就是最慢的一两个，全看调度）
+MIN_P99_SAMPLES = 1000
+
+# 合成片段里各类的占比
+SEGMENT_MIX = {"exact": 0.40, "near": 0.25, "noisy": 0.25, "unmatched": 0.10}
+
+# 越大越好的指标（其余都是越小越好）
+HIGHER_IS_BETTER = {"batch_segments_per_s"}
+
+_WORDS = [
+    "national", "medical", "research", "hospital", "university", "college", "institute",
+    "technology", "science", "law", "business", "economics", "state", "central", "northern",
+    "southern", "royal", "catholic", "polytechnic", "academy", "foundation", "bank", "center",
+    "agricultural", "normal", "international", "public", "health", "studies", "policy",
+]
+_COUNTRIES = ["US", "GB", "CN", "DE", "FR", "JP", "AU", "CA", "IN", "BR", "IT", "ES", "NL", "KR", "CH"]
+_ACCENTS = str.maketrans("aeiouc", "áéíöüç")
+_DEPARTMENTS = ["department of economics", "school of law", "faculty of medicine", "dept. of finance"]
+
+
+# ===== 合成数据 =====
+
+def synthetic_orgs(n: int, seed: int = 1) -> List[Dict]:
+    """slim ROR 结构的合成机构：地名 + 1~3 个常见词，两种语序，部分带缩写 / 重音 / &。"""
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnoprstuvwxyz"
+    places = [
+        "".join(rng.choice(letters) for _ in range(rng.randint(4, 9))).capitalize()
+        for _ in range(max(n // 12, 50))
+    ]
+    orgs = []
+    for i in range(n):
+        place = rng.choice(places)
+        base = " ".join(rng.choice(_WORDS).capitalize() for _ in range(rng.randint(1, 3)))
+        names = [f"{place} {base}", f"{base} of {place}"]
+        r = rng.random()
+        if r < 0.3:
+            names.append("".join(w[0] for w in names[0].split()).upper())
+        elif r < 0.35:
+            names.append(names[0].translate(_ACCENTS))
+        elif r < 0.40:
+            names.append(f"{place} {base} & Partners")
+        country = rng.choice(_COUNTRIES) if rng.random() < 0.97 else None
+        orgs.append({"id": f"https://ror.org/{i:09x}", "country_code": country, "names": names})
+    return orgs
+
+
+def _typo(word: str, rng: random.Random) -> str:
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def synthetic_segments(orgs: List[Dict], n: int, seed: int = 2) -> List[Tuple[str, str]]:
+    """(类别, 片段) 列表，类别占比见 SEGMENT_MIX。"""
+    rng = random.Random(seed)
+    cats = list(SEGMENT_MIX)
+    out = []
+    for _ in range(n):
+        cat = rng.choices(cats, weights=[SEGMENT_MIX[c] for c in cats])[0]
+        name = rng.choice(rng.choice(orgs)["names"])
+        words = name.split()
+        if cat == "exact":
+            seg = rng.choice([name, name.lower(), name.upper()])
+        elif cat == "near":
+            seg = rng.choice([
+                f"The {name}", name.replace(" of ", " & "), name.translate(_ACCENTS), f"{name}.",
+                " ".join(_typo(w, rng) if j == len(words) - 1 else w for j, w in enumerate(words)),
+            ])
+        elif cat == "noisy":
+            r = rng.random()
+            if r < 0.3:
+                seg = f"{rng.choice(_DEPARTMENTS)} {name}"
+            elif r < 0.5 and len(words) > 1:
+                i = rng.randrange(len(words) - 1)
+                seg = " ".join(words[:i] + [words[i] + words[i + 1]] + words[i + 2:])
+            elif r < 0.75:
+                rng.shuffle(words)
+                seg = " ".join(words)
+            else:
+                seg = name[:max(4, len(name) * 2 // 3)]
+        else:
+            seg = " ".join(
+                "".join(rng.choice("bcdfghjklmnpqrstvwxz") for _ in range(rng.randint(3, 8)))
+                for _ in range(rng.randint(1, 3))
+            )
+        out.append((cat, seg))
+    return out
+
+
+def recorded_segments(path: str, limit: int, seed: int = 2) -> List[Tuple[str, str]]:
+    """真实 affiliations 表里的不同候选片段（超过 limit 时随机抽样）。"""
+    from .main import AFFIL_COL
+
+    df = read_table(path)
+    parts = split_affiliations_batch(df[AFFIL_COL])
+    segs = sorted(set(parts.loc[parts["category"] == "candidate", "raw"]))
+    if limit and len(segs) > limit:
+        segs = random.Random(seed).sample(segs, limit)
+    return [("recorded", s) for s in segs]
+
+
+# ===== 测量 =====
+
+def current_rss_mb() -> Optional[float]:
+    """当前常驻内存（Linux 读 /proc，其他平台有 psutil 就用）。"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def children_peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:   # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _pct(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR, capture_output=True, text=True, timeout=10,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def run_bench(source: str, segments: List[Tuple[str, str]], workdir: Path,
+              threshold: float = 95.0, repeat: int = DEFAULT_REPEAT) -> Dict:
+    """repeat: 延迟 / 吞吐各跑几遍，每个片段取最快的一次、吞吐取最好的一遍（压掉调度噪声）。"""
+    index_path = str(workdir / Path(index_path_for(source)).name)
+
+    # 1. 建索引：放到子进程里，峰值内存单独统计，也不把建索引的堆留在本进程
+    t0 = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "backgroundcheck.ror_store", source, "--index", index_path, "--rebuild"],
+        cwd=SRC_DIR, check=True, stdout=subprocess.DEVNULL,
+    )
+    build_s = time.perf_counter() - t0
+
+    # 2. 加载（mmap）
+    rss_before = current_rss_mb()
+    load_times = []
+    for _ in range(LOAD_REPEAT):
+        t0 = time.perf_counter()
+        matcher = RorMatcher(source, index_path=index_path, verbose=False)
+        load_times.append((time.perf_counter() - t0) * 1000)
+    rss_loaded = current_rss_mb()
+
+    # 3. 单片段延迟（不开缓存；先用一小段预热）
+    for _, seg in segments[:200]:
+        matcher.match(seg, threshold=threshold)
+    best = [float("inf")] * len(segments)
+    for _ in range(max(repeat, 1)):
+        for i, (_, seg) in enumerate(segments):
+            t0 = time.perf_counter()
+            matcher.match(seg, threshold=threshold)
+            best[i] = min(best[i], (time.perf_counter() - t0) * 1000)
+    lat: Dict[str, List[float]] = {}
+    for (cat, _), ms in zip(segments, best):
+        lat.setdefault(cat, []).append(ms)
+    rss_matched = current_rss_mb()
+    all_lat = best
+
+    # 4. 批量吞吐（每遍一个新的匹配器：名称解码缓存从空开始）
+    batch_s = float("inf")
+    for _ in range(max(repeat, 1)):
+        batch = RorMatcher(source, index_path=index_path, verbose=False)
+        t0 = time.perf_counter()
+        batch.match_many([seg for _, seg in segments], threshold=threshold, workers=1)
+        batch_s = min(batch_s, time.perf_counter() - t0)
+    paths = batch.path_counts
+    n_paths = max(sum(paths.values()), 1)
+
+    metrics: Dict[str, float] = {
+        "build_s": build_s,
+        "index_mb": os.path.getsize(index_path) / 1e6,
+        "load_ms": _stats.median(load_times),
+        "latency_p50_ms": _pct(all_lat, 50),
+        "latency_p99_ms": _pct(all_lat, 99),
+        "latency_mean_ms": float(np.mean(all_lat)) if all_lat else 0.0,
+        "batch_segments_per_s": len(segments) / max(batch_s, 1e-9),
+    }
+    for cat, values in lat.items():
+        metrics[f"latency_p50_ms.{cat}"] = _pct(values, 50)
+        metrics[f"latency_p99_ms.{cat}"] = _pct(values, 99)
+    build_peak = children_peak_rss_mb()
+    if build_peak is not None:
+        metrics["build_peak_rss_mb"] = build_peak
+    if rss_before is not None:
+        metrics["load_rss_mb"] = rss_loaded - rss_before
+        metrics["match_rss_mb"] = rss_matched - rss_before
+    return {
+        "metrics": {k: round(v, 4) for k, v in metrics.items()},
+        "paths": {k: round(v / n_paths, 4) for k, v in paths.items()},
+        "segments_by_category": {cat: len(v) for cat, v in lat.items()},
+    }
+
+
+# ===== 与基线对比 =====
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """打印对比表，返回变差超过容差的指标名。"""
+    if current["config"] != baseline.get("config"):
+        print(f"⚠️ 与基线的配置不同（基线 {baseline.get('config')}），对比仅供参考")
+    regressions = []
+    cur, base = current["metrics"], baseline["metrics"]
+    n_segments = current["config"].get("segments", 0)
+    samples = current.get("segments_by_category", {})
+    print(f"{'指标':<28}{'基线':>12}{'本次':>12}{'变化':>10}")
+    for name in sorted(cur.keys() & base.keys()):
+        b, c = base[name], cur[name]
+        change = (c - b) / b if b else 0.0
+        worse = -change if name in HIGHER_IS_BETTER else change
+        metric, _, cat = name.partition(".")
+        suffix = next((sfx for sfx in NOISE_FLOOR if metric.endswith(sfx)), None)
+        if suffix == "_per_s":
+            diff = abs(n_segments / max(c, 1e-9) - n_segments / max(b, 1e-9))
+        else:
+            diff = abs(c - b)
+        flag = ""
+        if metric.startswith("latency_p99") and samples.get(cat, n_segments) < MIN_P99_SAMPLES:
+            flag = " ·"   # 样本太少，只展示不判定
+        elif suffix is not None and diff <= NOISE_FLOOR[suffix]:
+            pass
+        elif worse > tolerance:
+            regressions.append(name)
+            flag = " ❌"
+        elif worse < -tolerance:
+            flag = " ✅"
+        print(f"{name:<28}{b:>12.3f}{c:>12.3f}{change:>+10.1%}{flag}")
+    print(f"（· = 样本不足 {MIN_P99_SAMPLES} 个，p99 不参与判定）")
+    return regressions
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="RorMatcher 基准（结果存 JSON，可与基线对比）")
+    ap.add_argument("--ror", default=None, help="真实的 slim ROR pickle / dump；不给时合成")
+    ap.add_argument("--orgs", type=int, default=DEFAULT_ORGS, help="合成机构数")
+    ap.add_argument("--corpus", default=None, help="真实的 affiliations 表（csv / parquet）；不给时合成片段")
+    ap.add_argument("--segments", type=int, default=DEFAULT_SEGMENTS, help="片段数（真实语料时为抽样上限）")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="延迟 / 吞吐各测几遍，取最好的")
+    ap.add_argument("--workdir", default=None, help="放合成数据和索引的目录（默认临时目录，跑完删掉）")
+    ap.add_argument("--out", default=None, help="结果 JSON 路径")
+    ap.add_argument("--baseline", default=None, help="与这个基线 JSON 对比")
+    ap.add_argument("--save-baseline", default=None, help="把本次结果存成基线")
+    ap.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="变差超过多少算回退（默认 10%%）")
+    args = ap.parse_args()
+
+    tmp = None if args.workdir else tempfile.TemporaryDirectory(prefix="ror_bench_")
+    workdir = Path(args.workdir or tmp.name)
+    workdir.mkdir(parents=True, exist_ok=True)
+    try:
+        if args.ror:
+            source = args.ror
+            with open(source, "rb") as f:
+                orgs = pickle.load(f) if Path(source).suffix == ".pkl" else None
+        else:
+            orgs = synthetic_orgs(args.orgs, seed=args.seed)
+            source = str(workdir / f"synthetic_{args.orgs}.pkl")
+            with open(source, "wb") as f:
+                pickle.dump(orgs, f)
+
+        if args.corpus:
+            segments = recorded_segments(args.corpus, args.segments, seed=args.seed)
+        elif orgs is not None:
+            segments = synthetic_segments(orgs, args.segments, seed=args.seed + 1)
+        else:
+            raise SystemExit("--ror 是 dump 时请用 --corpus 指定片段")
+        del orgs
+
+        config = {
+            "ror": os.path.basename(args.ror) if args.ror else f"synthetic:{args.orgs}:{args.seed}",
+            "corpus": os.path.basename(args.corpus) if args.corpus else f"synthetic:{args.segments}:{args.seed}",
+            "segments": len(segments),
+            "repeat": args.repeat,
+        }
+        print(f"基准：{config}")
+        result = {
+            "config": config,
+            "meta": {
+                "commit": _git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            },
+            **run_bench(source, segments, workdir, repeat=args.repeat),
+        }
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    m = result["metrics"]
+    print(f"  建索引 {m['build_s']:.1f}s（{m['index_mb']:.1f} MB"
+          + (f"，峰值 {m['build_peak_rss_mb']:.0f} MB" if "build_peak_rss_mb" in m else "") + "）")
+    print(f"  加载 {m['load_ms']:.1f} ms" + (f"，加载后 +{m['load_rss_mb']:.0f} MB / 匹配后 +{m['match_rss_mb']:.0f} MB"
+                                          if "load_rss_mb" in m else ""))
+    print(f"  单片段延迟 p50 {m['latency_p50_ms']:.2f} ms / p99 {m['latency_p99_ms']:.2f} ms"
+          f"（平均 {m['latency_mean_ms']:.2f} ms）")
+    for cat, n in result["segments_by_category"].items():
+        print(f"    {cat:<10} {n:>6} 个  p50 {m[f'latency_p50_ms.{cat}']:.2f} ms / p99 {m[f'latency_p99_ms.{cat}']:.2f} ms")
+    print(f"  批量吞吐 {m['batch_segments_per_s']:,.0f} 片段/秒；解决路径 {result['paths']}")
+    peak = peak_rss_mb()
+    if peak:
+        print(f"  本进程峰值内存 {peak:.0f} MB")
+
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            print(f"结果已写入 {path}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            raise SystemExit(f"❌ 有 {len(regressions)} 项指标比基线差超过 {args.tolerance:.0%}: {', '.join(regressions)}")
+        print("✅ 没有超过容差的回退")
+
+
+if __name__ == "__main__":
+    main()
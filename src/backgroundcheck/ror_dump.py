@@ -0,0 +1,143 @@
+"""
+ROR 数据 dump（v2 schema 的 JSON，或官方发布的 .zip）的流式读取。
+
+原来的做法（newRORjson.py 里注释掉的 build_slim_ror）是 json.load 整个几百 MB 的
+ror-data_schema_v2.json，再写一个 slim pickle；现在按记录逐条解析（内存只与缓冲区大小有关），
+直接交给 ror_store 写出 RorMatcher 的索引文件，不再需要中间的 pickle：
+
+    python -m backgroundcheck.ror_dump v1.72-2025-10-06-ror-data_schema_v2.json
+    python -m backgroundcheck.ror_dump v1.72-2025-10-06-ror-data.zip --index data/ror.rorindex
+
+之后 RorMatcher / backgroundcheck.main 的 --ror-pkl 直接指向这个 dump 即可
+（索引按 dump 文件的 size/mtime 判断是否需要更新）。新版本 dump 文件名不同时，
+用旧索引做基础增量更新，只重算受影响的片段：
+
+    python -m backgroundcheck.ror_store v1.73-...-ror-data.zip --base v1.72-...-ror-data.rorindex
+"""
+from __future__ import annotations
+import io
+import json
+import sys
+import time
+import zipfile
+from contextlib import contextmanager
+from typing import IO, Dict, Iterator, Optional
+
+DUMP_SUFFIXES = {".json", ".zip"}
+READ_CHUNK = 1 << 20   # 每次读 1M 字符
+
+
+def iter_json_array(f: IO[str], chunk_size: int = READ_CHUNK) -> Iterator[dict]:
+    """逐个产出顶层 JSON 数组里的元素（raw_decode + 滑动缓冲区）。"""
+    decoder = json.JSONDecoder()
+    buf = f.read(chunk_size)
+    pos = 0
+    eof = not buf
+
+    # 跳到 '['
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n\ufeff":
+            pos += 1
+        if pos < len(buf):
+            break
+        if eof:
+            return
+        buf, pos = f.read(chunk_size), 0
+        eof = not buf
+    if buf[pos] != "[":
+        raise ValueError("ROR dump 应当是一个 JSON 数组")
+    pos += 1
+
+    while True:
+        # 跳过空白和逗号
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buf) and buf[pos] == "]":
+            return
+        if pos < len(buf):
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield obj
+                pos = end
+                continue
+        elif eof:
+            raise ValueError("ROR dump 不完整：缺少结尾的 ']'")
+
+        # 缓冲区里没有完整的记录了：丢掉已解析的部分，再读一块
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf, pos = buf[pos:] + chunk, 0
+
+
+@contextmanager
+def _open_dump_text(path: str) -> Iterator[IO[str]]:
+    """以文本方式打开 dump；.zip 时退出时连同 ZipFile 一起关掉（Windows 上不关会一直锁着文件）。"""
+    if not path.lower().endswith(".zip"):
+        with open(path, "r", encoding="utf-8") as f:
+            yield f
+        return
+    with zipfile.ZipFile(path) as zf:
+        members = [n for n in zf.namelist() if n.endswith(".json")]
+        # 官方 zip 里同时有 v1 / v2 两份 JSON，优先 v2
+        members.sort(key=lambda n: ("schema_v2" not in n, n))
+        if not members:
+            raise ValueError(f"{path} 里没有 JSON 文件")
+        with io.TextIOWrapper(zf.open(members[0]), encoding="utf-8") as f:
+            yield f
+
+
+def slim_record(org: dict) -> Dict:
+    """一条 ROR 记录 -> {"id", "country_code", "names"}（与旧的 slim pickle 同样的结构）。"""
+    if "locations" in org or isinstance(org.get("names"), list):
+        # v2 schema：names 里包含 ror_display / label / alias / acronym 各类名称
+        names = [e["value"] for e in org.get("names") or [] if e.get("value")]
+        country_code = None
+        locations = org.get("locations") or []
+        if locations:
+            # 取第一个地点的国家代码（大部分机构国家是唯一的）
+            details = locations[0].get("geonames_details") or {}
+            country_code = details.get("country_code")
+    else:
+        # v1 schema
+        names = [org["name"]] if org.get("name") else []
+        names += org.get("aliases") or []
+        names += org.get("acronyms") or []
+        names += [lb["label"] for lb in org.get("labels") or [] if lb.get("label")]
+        country_code = (org.get("country") or {}).get("country_code")
+
+    return {"id": org.get("id"), "country_code": country_code, "names": names}
+
+
+def iter_slim_orgs(path: str) -> Iterator[Dict]:
+    with _open_dump_text(path) as f:
+        for org in iter_json_array(f):
+            yield slim_record(org)
+
+
+def peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:   # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+if __name__ == "__main__":
+    import argparse
+    from .ror_index import RorMatcher
+
+    ap = argparse.ArgumentParser(description="流式读取 ROR dump，直接写出 RorMatcher 索引")
+    ap.add_argument("dump", help="ror-data_schema_v2.json 或官方 .zip")
+    ap.add_argument("--index", default=None, help="索引输出路径（默认与 dump 同名，后缀 .rorindex）")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    idx = RorMatcher(args.dump, index_path=args.index, rebuild=True).index
+    peak = peak_rss_mb()
+    print(f"✅ {idx.path}: {idx.header['n_orgs']} 个机构，{idx.n_names} 个名称，"
+          f"用时 {time.perf_counter() - t0:.1f}s" + (f"，峰值内存 {peak:.0f} MB" if peak else ""))
@@ -1,9 +1,16 @@
 from __future__ import annotations
+import os
 import re
-import pickle
-from typing import Dict, List, Set, Tuple, Optional
+import time
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
 from rapidfuzz import process, fuzz
 
+from . import profiling
+from .match_cache import MatchCache, migrate_match_cache
+from .ror_store import IndexDiff, RorIndex, canonicalize, char_grams, diff_path_for, load_or_build_index
+
 TOKEN_SPLIT_RE = re.compile(r"[^\w']+")
 
 DEFAULT_STOPWORDS = {
@@ -12,6 +19,28 @@ DEFAULT_STOPWORDS = {
     "of", "the", "for", "in", "de", "di",
 }
 
+# fuzzy 匹配前最多保留多少个候选（按 IDF 加权的 token 重合度排序）；None = 不剪枝
+DEFAULT_TOP_K = 500
+
+# match_many：候选数至少这么多、且可用线程数够多时用 cdist 多线程打分。
+# cdist 会算满整行（没有 extractOne 的提前退出），单线程下约是 extractOne 的 3 倍工作量，
+# 所以核数少于 CDIST_MIN_WORKERS 时仍走 extractOne。
+PARALLEL_MIN_CANDIDATES = 2000
+CDIST_MIN_WORKERS = 4
+
+# 字符 trigram 倒排：片段的 token 一个候选也找不到（全是停用词 / 太短 / 拼错 / 粘连）时兜底；
+# token 候选剪枝后仍超过 MAX_TOKEN_CANDIDATES（常见词同分）时按 trigram 重合度补充排序。
+# 两种情况都只留 trigram 分数最高的 gram_cap 个候选；参与打分的 trigram 从罕见的开始取，
+# 倒排总长不超过 GRAM_POSTINGS_BUDGET，每次查询的开销有上界。
+DEFAULT_GRAM_CAP = 1000
+MAX_TOKEN_CANDIDATES = 5000
+GRAM_POSTINGS_BUDGET = 200_000
+
+UNKNOWN_RESULT = ("unknown", "unknown", 0.0, "")
+
+# 片段最终是在哪一步解决的（path_counts 的键）；缓存命中的 fuzzy 结果也算 fuzzy
+MATCH_PATHS = ("exact", "canonical", "fuzzy")
+
 def tokenize(text: str) -> List[str]:
     """简单 token 化：按非字母数字分割，并转小写。"""
     if not isinstance(text, str):
@@ -22,18 +51,22 @@ def tokenize(text: str) -> List[str]:
 class RorMatcher:
     """
     ROR 加速匹配引擎：
-      - 从 ror_slim.pkl 加载机构：
+      - 从 ror_slim.pkl（或直接从 ROR 官方 dump .json/.zip，见 ror_dump.py）加载机构：
         每条记录形如：
            {"id": ..., "country_code": "AU", "names": ["RMIT", "RMIT University", ...]}
-      - 构建：
-           * name_to_country: 精确匹配用（name_lower -> country_code）
-           * all_names: 所有名称（小写字符串列表）
-           * token_index: token -> set(name_lower)，倒排表
+      - 索引（见 ror_store.py）：
+           * names: 所有名称（小写、去重、排序），精确匹配用二分查找
+           * name_country / name_ror: 名称 -> 国家代码 / ROR ID（第一次出现的机构）
+           * 倒排表: token -> 名称 id（升序 int32）
+        建好后存成 <数据源同名>.rorindex，之后直接 mmap 加载；数据源变了会以旧索引为基础增量更新。
 
     match(segment):
-      1. 精确匹配：O(1)
-      2. 根据 tokens 从倒排表取候选名称集合
-      3. 在候选上用 rapidfuzz fuzzy 匹配
+      1. 精确匹配：O(log n)；不中再查规范化精确表（canonicalize：去附加符号、标点、"the"、& -> and），
+         命中同样记为 "exact"
+      2. 根据 tokens 从倒排表取候选名称，按 IDF 加权的 token 重合度只留前 top_k 个；
+         没有 token 候选、或候选仍然太多时改用 / 加上字符 trigram 倒排，最多 gram_cap 个
+      3. 在候选上用 rapidfuzz fuzzy 匹配（score_cutoff=threshold，够不到阈值的提前放弃）
+    2、3 步的结果可以用 enable_cache() 打开的两级缓存（match_cache.py）记住，跨运行复用。
     """
 
     def __init__(
@@ -41,69 +74,213 @@ class RorMatcher:
         pkl_path: str,
         stopwords: Optional[Set[str]] = None,
         min_token_len: int = 3,
+        index_path: Optional[str] = None,
+        rebuild: bool = False,
+        top_k: Optional[int] = DEFAULT_TOP_K,
+        verbose: bool = True,
+        gram_cap: Optional[int] = DEFAULT_GRAM_CAP,
     ) -> None:
+        """gram_cap: trigram 候选上限；None = 不用 trigram 倒排（与只按 token 找候选时结果相同）。"""
         self.pkl_path = pkl_path
         self.stopwords: Set[str] = stopwords or DEFAULT_STOPWORDS
         self.min_token_len = min_token_len
+        self.top_k = top_k
+        self.gram_cap = gram_cap
+        self.cache: Optional[MatchCache] = None
+        self.path_counts: Dict[str, int] = dict.fromkeys(MATCH_PATHS, 0)
 
-        self.all_names: List[str] = []                 # 所有名称（小写）
-        self.name_to_country: Dict[str, Optional[str]] = {}  # name_lower -> country_code
-        self.token_index: Dict[str, Set[str]] = {}     # token -> set(name_lower)
-        self.name_to_rorid: Dict[str, Optional[str]] = {}    # ★ 新增：name_lower -> ror_id (URL)
-
-        self._load_and_build()
-
-    def _load_and_build(self) -> None:
-        print(f"从 {self.pkl_path} 加载 ROR slim 数据 ...")
-        with open(self.pkl_path, "rb") as f:
-            slim_orgs = pickle.load(f)
-
-        print(f"  共有 {len(slim_orgs)} 个机构记录，开始构建索引...")
-
-        for org in slim_orgs:
-            country = org.get("country_code")
-            ror_id = org.get("id")  # 形如 "https://ror.org/04ttjf776"
-            names = org.get("names") or []
-            for name in names:
-                name_l = name.lower()
-                self.all_names.append(name_l)
-
-                # 精确匹配字典
-                if name_l not in self.name_to_country:
-                    self.name_to_country[name_l] = country
-
-                # ★ 新增：名字 -> ror_id（第一次出现的为主）
-                if name_l not in self.name_to_rorid:
-                    self.name_to_rorid[name_l] = ror_id
-
-                # 为倒排索引做 token 化
-                toks = tokenize(name_l)
-                for tok in toks:
-                    if len(tok) < self.min_token_len:
-                        continue
-                    if tok in self.stopwords:
-                        continue
-                    self.token_index.setdefault(tok, set()).add(name_l)
-
-        print(f"  名称总数: {len(self.all_names)}")
-        print(f"  倒排表 token 数量: {len(self.token_index)}")
-        print("  ROR 索引构建完成。")
+        t0 = time.perf_counter()
+        self.index: RorIndex = load_or_build_index(
+            pkl_path, self.stopwords, min_token_len, tokenize,
+            index_path=index_path, rebuild=rebuild,
+        )
+        if verbose:
+            print(
+                f"  ROR 索引就绪：{self.index.n_names} 个名称，{self.index.n_tokens} 个 token"
+                f"（{time.perf_counter() - t0:.2f}s，版本 {self.index.version}）"
+            )
 
-    def _candidate_names_from_segment(self, seg: str) -> List[str]:
-        """根据片段 tokens，从倒排表中取出候选名称（字符串）。"""
-        toks = tokenize(seg)
-        cand_set: Set[str] = set()
+    @property
+    def index_version(self) -> str:
+        return self.index.version
 
-        for tok in toks:
-            if len(tok) < self.min_token_len:
-                continue
-            if tok in self.stopwords:
-                continue
-            names = self.token_index.get(tok)
-            if names:
-                cand_set.update(names)
+    @property
+    def cache_version(self) -> str:
+        """缓存键里的版本：索引内容 + 会影响结果的匹配参数。"""
+        return f"{self.index.version}:k{self.top_k}:g{self.gram_cap}"
+
+    def report_paths(self) -> None:
+        """打印各步骤解决的片段占比（精确 / 规范化精确 / fuzzy）。"""
+        total = sum(self.path_counts.values())
+        if not total:
+            return
+        exact, canon, fuzzy = (self.path_counts[k] for k in MATCH_PATHS)
+        print(f"  ROR 匹配：{total} 个片段，精确 {exact / total:.1%}，规范化精确 {canon / total:.1%}，"
+              f"fuzzy {fuzzy / total:.1%}（规范化省掉了 {canon / max(canon + fuzzy, 1):.1%} 的 fuzzy 匹配）")
 
-        return list(cand_set)
+    def _exact_name_id(self, q: str) -> Tuple[int, str]:
+        """精确表 -> 规范化精确表；返回 (名称 id, 路径)，都不中时名称 id 为 -1。"""
+        name_id = self.index.name_id(q)
+        if name_id >= 0:
+            return name_id, "exact"
+        return self.index.canonical_name_id(canonicalize(q)), "canonical"
+
+    def enable_cache(self, path: Optional[str], lru_size: Optional[int] = None) -> MatchCache:
+        """打开匹配结果缓存（path 为 None 时只用进程内 LRU）。"""
+        kwargs = {"lru_size": lru_size} if lru_size else {}
+        if path and os.path.exists(path):
+            self._carry_over_cache(path)
+        self.cache = MatchCache(path, self.cache_version, **kwargs)
+        return self.cache
+
+    def _carry_over_cache(self, path: str) -> None:
+        """索引是增量更新出来的：旧版本下没受影响的缓存结果搬到新版本（其余的打开缓存时清掉）。"""
+        diff_path = diff_path_for(self.index.path)
+        if not self.index.header.get("updated_from") or not os.path.exists(diff_path):
+            return
+        diff = IndexDiff.load(diff_path)
+        if diff.to_version != self.index.version:
+            return
+        kept, dropped = migrate_match_cache(
+            path, diff.from_version, diff.to_version,
+            lambda seg, threshold, score, ror_id: self._stale_after_update(diff, seg, threshold, score, ror_id),
+        )
+        if kept or dropped:
+            print(f"  匹配缓存：ROR 索引增量更新（{diff.summary()}），"
+                  f"保留 {kept} 条结果，作废 {dropped} 条")
+
+    def _stale_after_update(self, diff: IndexDiff, q: str, threshold: float, score: float, ror_id: str) -> bool:
+        """
+        旧版本缓存的 fuzzy 结果 (score, ror_id) 在增量更新后的索引上是否可能变化：
+        指向的机构变了，或有新出现 / 映射变了的候选名称打分不低于旧结果（同分时名称顺序可能换人）。
+        """
+        if ror_id and ror_id in diff.changed_rors:
+            return True
+        toks = self._query_tokens(q)
+        if self.gram_cap:
+            # trigram 候选的排序牵涉全部名称，不逐个判断：新旧版本下只要有一边走 trigram 就重算。
+            # 旧版本的 token 候选与现在不同，必然共享某个 df 变了的 token
+            if self._uses_grams(len(self._token_candidates(q))):
+                return True
+            old_dfs = [self.index.token_df(t) - diff.token_df_delta.get(t, 0) for t in toks]
+            if any(t in diff.token_df_delta for t in toks) and (
+                not any(old_dfs) or sum(old_dfs) > MAX_TOKEN_CANDIDATES
+            ):
+                return True
+        near = diff.rescore_names_near(toks)
+        if not near:
+            return False
+        cutoff = max(score, threshold)
+        return process.extractOne(q, near, scorer=fuzz.token_set_ratio, score_cutoff=cutoff) is not None
+
+    def _query_tokens(self, seg: str) -> List[str]:
+        toks = [
+            tok for tok in tokenize(seg)
+            if len(tok) >= self.min_token_len and tok not in self.stopwords
+        ]
+        return list(dict.fromkeys(toks))   # 去重保序
+
+    def _candidate_ids_from_segment(self, seg: str) -> np.ndarray:
+        """候选名称 id（升序、去重）：token 倒排为主，trigram 倒排兜底 / 封顶。"""
+        return self._candidates_and_scorer(seg)[0]
+
+    def _candidates_and_scorer(self, seg: str):
+        """
+        (候选 id, fuzzy 打分函数)。
+        trigram 兜底的候选与片段没有共同 token，token_set_ratio 会把「片段是名称的子集」
+        （例如只剩停用词的 "University"）算成 100，所以改用整串的 fuzz.ratio。
+        """
+        cand = self._token_candidates(seg)
+        if not self._uses_grams(len(cand)):
+            return cand, fuzz.token_set_ratio
+        score = self._gram_scores(seg)
+        if len(cand):
+            return self._top_by_score(cand, score[cand], self.gram_cap), fuzz.token_set_ratio
+        cand = np.flatnonzero(score)
+        return self._top_by_score(cand, score[cand], self.gram_cap), fuzz.ratio
+
+    def _uses_grams(self, n_token_candidates: int) -> bool:
+        return bool(self.gram_cap) and (n_token_candidates == 0 or n_token_candidates > MAX_TOKEN_CANDIDATES)
+
+    def _gram_scores(self, seg: str) -> np.ndarray:
+        """每个名称与片段的 IDF 加权 trigram 重合度（长度 = 名称数）；只取罕见的 trigram，倒排总长有上限。"""
+        n_names = self.index.n_names
+        postings = [p for p in map(self.index.gram_postings, char_grams(seg)) if p is not None and len(p)]
+        postings.sort(key=len)
+        taken, total = [], 0
+        for p in postings:
+            if taken and total + len(p) > GRAM_POSTINGS_BUDGET:
+                break
+            taken.append(p)
+            total += len(p)
+        if not taken:
+            return np.zeros(n_names)
+        w = np.repeat([np.log(n_names / len(p)) for p in taken], [len(p) for p in taken])
+        return np.bincount(np.concatenate(taken), weights=w, minlength=n_names)
+
+    @staticmethod
+    def _top_by_score(ids: np.ndarray, score: np.ndarray, cap: int) -> np.ndarray:
+        """分数最高的 cap 个 id（升序返回）；边界上同分的取 id 小的，结果确定。"""
+        if len(ids) <= cap:
+            return ids
+        kth = np.partition(score, len(score) - cap)[len(score) - cap]
+        above = ids[score > kth]
+        ties = ids[score == kth][:cap - len(above)]
+        return np.sort(np.concatenate([above, ties]))
+
+    def _token_candidates(self, seg: str) -> np.ndarray:
+        """
+        根据片段 tokens，从倒排表中取出候选名称 id（升序、去重）。
+
+        候选超过 top_k 时按 IDF 加权的 token 重合度 sum(log(N / df)) 剪枝：
+        token_set_ratio 高分的名称几乎必然包含片段里的罕见 token，
+        只共享 "national" / "medical" 这类常见词的名称到不了阈值。
+          - 保留分数 >= 第 top_k 名分数的全部候选（边界上同分的不截断，
+            所以只有一个常见 token 的片段仍会扫全部候选，结果与不剪枝一致）
+          - 片段里不在 token 表中的词（多半是被截断的）按前缀展开，只用来加权排序，
+            不引入新的候选（候选始终是各 token 倒排的并集）
+        """
+        postings = []
+        weights = []
+        prefix_hits = []
+        n_names = self.index.n_names
+        for tok in self._query_tokens(seg):
+            ids = self.index.token_postings(tok)
+            if ids is not None and len(ids):
+                postings.append(ids)
+                weights.append(np.log(n_names / len(ids)))
+            elif self.top_k:
+                pre = self.index.prefix_postings(tok)
+                if pre is not None and len(pre):
+                    prefix_hits.append(pre)
+
+        if not postings:
+            return np.empty(0, dtype=np.int32)
+        if len(postings) == 1 and not prefix_hits:
+            return postings[0]
+
+        cand, inverse = np.unique(np.concatenate(postings), return_inverse=True)
+        k = self.top_k
+        if not k or len(cand) <= k:
+            return cand
+
+        w = np.repeat(np.asarray(weights), [len(p) for p in postings])
+        score = np.bincount(inverse, weights=w, minlength=len(cand))
+        for pre in prefix_hits:
+            score[np.isin(cand, pre, assume_unique=True)] += np.log(n_names / len(pre))
+        kth = np.partition(score, len(score) - k)[len(score) - k]   # 第 k 大的分数
+        return cand[score >= kth]
+
+    def _candidate_names_from_segment(self, seg: str) -> List[str]:
+        """根据片段 tokens，从倒排表中取出候选名称（字符串，按名称排序）。"""
+        return self.index.names.get_many(self._candidate_ids_from_segment(seg))
+
+    def _result_for_name(self, name_id: int, status: str, score: float) -> Tuple[str, str, float, str]:
+        country = self.index.country_of(name_id)
+        ror_id = self.index.ror_id_of(name_id)
+        if country:
+            return country.upper(), status, score, ror_id
+        return "unknown", "unknown", score, ror_id
 
     def match(self, seg: str, threshold: float = 95.0) -> Tuple[str, str, float, str]:
         """
@@ -111,46 +288,165 @@ class RorMatcher:
         返回: (country_code_or_unknown, match_status, score, ror_id_or_empty)
             - country_code_or_unknown: "US" / "CN" / "unknown"
             - match_status: "exact" / "fuzzy" / "unknown"
-            - score: fuzzy 匹配得分（0-100），精确匹配时为 100
+            - score: fuzzy 匹配得分（0-100），精确匹配时为 100；没有候选达到阈值时为 0
             - ror_id_or_empty: 例如 "https://ror.org/04ttjf776" 或 ""
         """
         if not isinstance(seg, str):
-            return "unknown", "unknown", 0.0, ""
+            return UNKNOWN_RESULT
 
         q = seg.strip().lower()
         if not q:
-            return "unknown", "unknown", 0.0, ""
-
-        # 1. 精确匹配
-        if q in self.name_to_country:
-            country = self.name_to_country.get(q)
-            ror_id = self.name_to_rorid.get(q) or ""
-            if country:
-                return country.upper(), "exact", 100.0, ror_id
-            else:
-                return "unknown", "unknown", 100.0, ror_id
-
-        # 2. 通过 tokens 找候选名称（字符串）
-        cand_names = self._candidate_names_from_segment(q)
-        if not cand_names:
-            return "unknown", "unknown", 0.0, ""
-
-        # 3. 仅在候选名称上做 fuzzy 匹配
-        best_name, score, _ = process.extractOne(
-            q,
-            cand_names,
-            scorer=fuzz.token_set_ratio,
-        )
+            return UNKNOWN_RESULT
 
-        if score >= threshold:
-            country = self.name_to_country.get(best_name)
-            ror_id = self.name_to_rorid.get(best_name) or ""
-            if country:
-                return country.upper(), "fuzzy", float(score), ror_id
-            else:
-                return "unknown", "unknown", float(score), ror_id
+        prof = profiling.active
+        if prof is not None:
+            t0 = time.perf_counter()
+
+        # 1. 精确匹配（原文 / 规范化后）
+        name_id, path = self._exact_name_id(q)
+        if prof is not None:
+            prof.add_time("match.exact", time.perf_counter() - t0)
+        if name_id >= 0:
+            self.path_counts[path] += 1
+            return self._profiled(self._result_for_name(name_id, "exact", 100.0))
+
+        # 2 + 3. 候选 + fuzzy（精确匹配本身就很快，只缓存这一步）
+        self.path_counts["fuzzy"] += 1
+        if self.cache is None:
+            return self._profiled(self._match_fuzzy(q, threshold, workers=1))
+        if prof is not None:
+            t0 = time.perf_counter()
+        hit = self.cache.get(q, threshold)
+        if prof is not None:
+            prof.add_time("match.cache", time.perf_counter() - t0)
+        if hit is not None:
+            return self._profiled(hit)
+        result = self._match_fuzzy(q, threshold, workers=1)
+        self.cache.put(q, threshold, result)
+        return self._profiled(result)
+
+    @staticmethod
+    def _profiled(result: Tuple[str, str, float, str], n: int = 1) -> Tuple[str, str, float, str]:
+        """剖析打开时按结果状态计数（exact / fuzzy / unknown）。"""
+        if profiling.active is not None:
+            profiling.active.count(f"match.status.{result[1]}", n)
+        return result
+
+    def _match_fuzzy(self, q: str, threshold: float, workers: int) -> Tuple[str, str, float, str]:
+        prof = profiling.active
+        if prof is not None:
+            t0 = time.perf_counter()
+
+        # 通过 tokens（或 trigram）找候选名称 id
+        cand_ids, scorer = self._candidates_and_scorer(q)
+        if prof is not None:
+            t1 = time.perf_counter()
+            prof.add_time("match.candidates", t1 - t0)
+            prof.observe("match.candidates", len(cand_ids))
+            if scorer is fuzz.ratio:
+                prof.count("match.gram_fallback")
+        if not len(cand_ids):
+            return UNKNOWN_RESULT
+
+        # 仅在候选名称上做 fuzzy 匹配（候选按名称排序，同分时结果稳定）
+        # score_cutoff：到不了阈值的候选 rapidfuzz 会提前放弃；全都不够时不再给出具体分数（记为 0.0）
+        names = self.index.names.get_many(cand_ids)
+        if prof is not None:
+            t2 = time.perf_counter()
+            prof.add_time("match.decode_names", t2 - t1)
+        result = self._score_candidates(q, names, cand_ids, scorer, threshold, workers)
+        if prof is not None:
+            prof.add_time("match.rapidfuzz", time.perf_counter() - t2)
+        return result
+
+    def _score_candidates(self, q: str, names: List[str], cand_ids: np.ndarray, scorer,
+                          threshold: float, workers: int) -> Tuple[str, str, float, str]:
+        if workers >= CDIST_MIN_WORKERS and len(names) >= PARALLEL_MIN_CANDIDATES:
+            # 多线程一次算完整行；argmax 取第一个最高分，与 extractOne 的取舍一致
+            scores = process.cdist(
+                [q], names,
+                scorer=scorer,
+                score_cutoff=threshold,
+                dtype=np.float64,
+                workers=workers,
+            )[0]
+            pos = int(np.argmax(scores))
+            score = float(scores[pos])
+            if score < threshold:
+                return UNKNOWN_RESULT
         else:
-            return "unknown", "unknown", float(score), ""
+            best = process.extractOne(q, names, scorer=scorer, score_cutoff=threshold)
+            if best is None:
+                return UNKNOWN_RESULT
+            _, score, pos = best
+
+        return self._result_for_name(int(cand_ids[pos]), "fuzzy", float(score))
+
+    def match_many(
+        self,
+        segs: Sequence[str],
+        threshold: float = 95.0,
+        workers: int = -1,
+    ) -> List[Tuple[str, str, float, str]]:
+        """
+        批量版 match，结果与逐个调用 match 完全相同（顺序与 segs 一一对应）：
+          1. 先按规范化后的文本去重（同一个片段只算一次）
+          2. 一次性把精确命中的解决掉（原文 / 规范化后）
+          3. 剩下的先查缓存（若已 enable_cache），再做 fuzzy；
+             候选多的用 rapidfuzz cdist(workers=workers) 多核打分
+        workers: 与 rapidfuzz 相同，-1 = 全部核。
+        """
+        if workers < 0:
+            workers = os.cpu_count() or 1
+        out: List[Tuple[str, str, float, str]] = [UNKNOWN_RESULT] * len(segs)
+        positions: Dict[str, List[int]] = {}
+        for i, seg in enumerate(segs):
+            if not isinstance(seg, str):
+                continue
+            q = seg.strip().lower()
+            if q:
+                positions.setdefault(q, []).append(i)
+
+        t0 = time.perf_counter()
+        results: Dict[str, Tuple[str, str, float, str]] = {}
+        pending: List[str] = []
+        paths: Dict[str, str] = {}
+        for q, name_id in zip(positions, self.index.names.find_many(list(positions))):
+            path = "exact"
+            if name_id < 0:
+                name_id, path = self.index.canonical_name_id(canonicalize(q)), "canonical"
+            if name_id >= 0:
+                results[q] = self._result_for_name(name_id, "exact", 100.0)
+                paths[q] = path
+            else:
+                pending.append(q)
+                paths[q] = "fuzzy"
+        for q, idxs in positions.items():
+            self.path_counts[paths[q]] += len(idxs)
+        prof = profiling.active
+        if prof is not None:
+            t1 = time.perf_counter()
+            prof.add_time("match_many.exact", t1 - t0)
+
+        if self.cache is not None:
+            cached = self.cache.get_many(pending, threshold)
+            results.update(cached)
+            pending = [q for q in pending if q not in cached]
+            if prof is not None:
+                prof.add_time("match_many.cache", time.perf_counter() - t1)
+
+        for q in pending:
+            results[q] = self._match_fuzzy(q, threshold, workers)
+            if self.cache is not None:
+                self.cache.put(q, threshold, results[q])
+
+        for q, idxs in positions.items():
+            r = results[q]
+            for i in idxs:
+                out[i] = r
+            if prof is not None:
+                self._profiled(r, len(idxs))
+        return out
 
 
 def match_ror_segment(seg: str, ror_matcher: "RorMatcher", threshold: float = 95.0):
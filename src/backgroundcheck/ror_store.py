@@ -0,0 +1,842 @@
+"""
+RorMatcher 索引的磁盘格式（单文件、版本化、可 mmap）。
+
+每次 RorMatcher(...) 都要 unpickle 整个 slim ROR 列表，再用 Python dict/set
+重建精确表和倒排表，十几秒起步、占好几 G 内存。这里把建好的索引存成一个文件：
+
+    [MAGIC 8B][header_len uint32][header JSON][pad 到 8 字节]
+    [各 section 的原始数组，8 字节对齐]
+
+数据源可以是旧的 slim ROR pickle，也可以直接是 ROR 官方 dump（.json / .zip，流式读取，见 ror_dump.py）。
+
+header 里记录格式版本、数据源文件的 size/mtime、建索引参数（停用词、最短 token）、
+国家代码表，以及每个 section 的 (offset, dtype, count)。section：
+
+    names_blob / names_off   所有名称（小写、去重、按字典序排好）的 UTF-8 拼接 + 偏移
+    name_org                 int32，名称 -> 机构下标（第一次出现的机构）
+    org_country              int16，机构 -> 国家代码表下标（-1 = 无）
+    ror_blob / ror_off       每个机构的 ROR URL（按机构下标）
+    org_names_ptr / org_names  CSR：机构 -> 它的全部名称 id（增量更新时与新数据源比对用）
+    tokens_blob / tokens_off 倒排表的 token（排好序）
+    post_ptr / postings      CSR 形式的倒排表：token i 的名称 id 为
+                             postings[post_ptr[i]:post_ptr[i+1]]（升序 int32）
+    grams_blob / grams_off   字符 trigram（见 char_grams，排好序）
+    gram_ptr / gram_postings trigram -> 名称 id 的倒排表（同样是 CSR）；token 用不上时找候选
+    canon_blob / canon_off   规范化后的名称（见 canonicalize，去重、排好序）
+    canon_name               int32，规范化名称 -> 名称 id（对应多个机构的规范化名称不收录）
+
+偏移 / 指针数组在装得下时用 uint32。国家代码和 ROR URL 只按机构存一份，不随名称重复。
+名称和 token 都按 UTF-8 字节序排好（与 Python 字符串比较顺序一致），精确匹配用二分查找。
+加载时只读 header，数组直接是 mmap 上的 numpy 视图，不到一秒。
+数据源变了（size / mtime）时以旧索引为基础增量更新（update_index：只 token 化新增的名称，
+并记下受影响的名称，匹配结果缓存据此只作废相关的片段）；参数或格式变了则全量重建。
+
+命令行：
+    python -m backgroundcheck.ror_store <ror.pkl | ror dump .json/.zip> [--rebuild]
+    python -m backgroundcheck.ror_store <新 dump> --base <旧 dump 的 .rorindex>   # 增量更新
+"""
+from __future__ import annotations
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import re
+import struct
+import sys
+import time
+import unicodedata
+from array import array
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from .ror_dump import DUMP_SUFFIXES, iter_slim_orgs
+
+MAGIC = b"RORIDX\x00\x00"
+FORMAT_VERSION = 5
+INDEX_SUFFIX = ".rorindex"
+GRAM_N = 3
+CANON_VERSION = 1   # canonicalize 的规则改了就加一，索引会重建
+DIFF_SUFFIX = ".diff.json"
+_ALIGN = 8
+
+
+_GRAM_SPLIT_RE = re.compile(r"\W+")
+
+
+def char_grams(text: str, n: int = GRAM_N) -> Set[str]:
+    """字符 n-gram：小写，标点 / 空白折成一个空格，两头补空格（"mit" -> " mi", "mit", "it "）。"""
+    s = " " + " ".join(t for t in _GRAM_SPLIT_RE.split(text.lower()) if t) + " "
+    return {s[i:i + n] for i in range(len(s) - n + 1)} if len(s) > 2 else set()
+
+
+_CANON_APOSTROPHE_RE = re.compile(r"['\u2019\u2018`\u00b4]")
+_CANON_ARTICLES = {"the"}
+
+
+def canonicalize(text: str) -> str:
+    """
+    名称 / 片段的规范形式，精确匹配之后、fuzzy 之前查一次规范化精确表：
+      - Unicode 折叠：NFKD 后去掉附加符号，casefold（"Zürich" -> "zurich"，"ß" -> "ss"）
+      - "&" -> "and"；撇号直接删掉（"King's" -> "kings"），其余标点变空格，空白合并
+      - 去掉冠词 "the"（"The Ohio State University" -> "ohio state university"）
+    """
+    s = text
+    if not s.isascii():
+        s = "".join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
+    s = _CANON_APOSTROPHE_RE.sub("", s.casefold().replace("&", " and "))
+    return " ".join(t for t in _GRAM_SPLIT_RE.split(s) if t and t not in _CANON_ARTICLES)
+
+
+def index_path_for(source_path: str) -> str:
+    """默认索引文件放在数据源旁边：new_ror_name.pkl -> new_ror_name.rorindex"""
+    return str(Path(source_path).with_suffix(INDEX_SUFFIX))
+
+
+def source_signature(source_path: str) -> Dict[str, int]:
+    st = os.stat(source_path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+class StringTable:
+    """
+    mmap 上的只读字符串表：UTF-8 拼接 blob + 偏移数组。
+    解码后的 Python 字符串按需缓存（只缓存取过的），decode_all() 可一次性全部解码。
+    """
+
+    def __init__(self, blob: memoryview, offsets: np.ndarray) -> None:
+        self._blob = blob
+        self._off = offsets
+        self._cache: Optional[List[Optional[str]]] = None
+        self._complete = False
+
+    def __len__(self) -> int:
+        return len(self._off) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return str(self._blob[int(self._off[i]):int(self._off[i + 1])], "utf-8")
+
+    def _key(self, i: int) -> bytes:
+        return bytes(self._blob[int(self._off[i]):int(self._off[i + 1])])
+
+    def find(self, s: str) -> int:
+        """二分查找（表按字节序排好），找不到返回 -1。"""
+        if self._complete:
+            return self._find_decoded(s)
+        key = s.encode("utf-8")
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self) and self._key(lo) == key:
+            return lo
+        return -1
+
+    def _find_decoded(self, s: str) -> int:
+        i = bisect.bisect_left(self._cache, s)
+        return i if i < len(self._cache) and self._cache[i] == s else -1
+
+    def find_many(self, strings: Sequence[str]) -> List[int]:
+        """批量查找，找不到为 -1（已整表解码时在 Python 列表上二分，C 实现）。"""
+        return [self.find(s) for s in strings]
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """以 prefix 开头的字符串在表中的下标区间 [lo, hi)。"""
+        key = prefix.encode("utf-8")
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        start = lo
+        hi = len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid).startswith(key):
+                lo = mid + 1
+            else:
+                hi = mid
+        return start, lo
+
+    def decode_all(self) -> List[str]:
+        """整表解码成 Python 字符串列表（之后 find 也走列表上的二分）。"""
+        if not self._complete:
+            off = self._off.tolist()
+            blob = self._blob
+            self._cache = [str(blob[off[i]:off[i + 1]], "utf-8") for i in range(len(off) - 1)]
+            self._complete = True
+        return self._cache
+
+    def get_many(self, ids: Iterable[int]) -> List[str]:
+        """按下标批量取字符串；没取过的才从 mmap 解码，解码结果缓存起来。"""
+        ids = np.asarray(ids).tolist()
+        if self._cache is None:
+            self._cache = [None] * len(self)
+        cache = self._cache
+        out = [cache[i] for i in ids]
+        if None in out:
+            off, blob = self._off, self._blob
+            for j, i in enumerate(ids):
+                if out[j] is None:
+                    out[j] = cache[i] = str(blob[int(off[i]):int(off[i + 1])], "utf-8")
+        return out
+
+
+class RorIndex:
+    """已加载（mmap）的 ROR 索引。"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"不是 ROR 索引文件: {path}")
+        (header_len,) = struct.unpack_from("<I", self._mm, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = json.loads(self._mm[start:start + header_len].decode("utf-8"))
+        if self.header.get("format") != FORMAT_VERSION:
+            raise ValueError(f"索引格式版本不符: {self.header.get('format')} != {FORMAT_VERSION}")
+        self._data_start = _align(start + header_len)
+
+        self.countries: List[str] = self.header["countries"]
+        self.names = StringTable(self._bytes("names_blob"), self._array("names_off"))
+        self.name_org = self._array("name_org")
+        self.org_country = self._array("org_country")
+        self.ror_ids = StringTable(self._bytes("ror_blob"), self._array("ror_off"))
+        self.org_names_ptr = self._array("org_names_ptr")
+        self.org_names = self._array("org_names")
+        self.tokens = StringTable(self._bytes("tokens_blob"), self._array("tokens_off"))
+        self.post_ptr = self._array("post_ptr")
+        self.postings = self._array("postings")
+        self.grams = StringTable(self._bytes("grams_blob"), self._array("grams_off"))
+        self.gram_ptr = self._array("gram_ptr")
+        self.gram_ids = self._array("gram_postings")
+        self.canon = StringTable(self._bytes("canon_blob"), self._array("canon_off"))
+        self.canon_name = self._array("canon_name")
+
+    def _array(self, name: str) -> np.ndarray:
+        sec = self.header["sections"][name]
+        return np.frombuffer(
+            self._mm, dtype=np.dtype(sec["dtype"]), count=sec["count"],
+            offset=self._data_start + sec["offset"],
+        )
+
+    def _bytes(self, name: str) -> memoryview:
+        sec = self.header["sections"][name]
+        a = self._data_start + sec["offset"]
+        return memoryview(self._mm)[a:a + sec["count"]]
+
+    # ----- 元信息 -----
+
+    @property
+    def version(self) -> str:
+        """索引内容的版本号（源 pickle + 参数 + 格式），给结果缓存做失效判断用。"""
+        return _version_of(self.header)
+
+    @property
+    def n_names(self) -> int:
+        return len(self.names)
+
+    @property
+    def n_tokens(self) -> int:
+        return len(self.tokens)
+
+    def matches_source(self, source_path: str, params: Dict) -> bool:
+        return self.header["source"] == source_signature(source_path) and self.header["params"] == params
+
+    # ----- 查询 -----
+
+    def name_id(self, name_l: str) -> int:
+        return self.names.find(name_l)
+
+    def country_of(self, name_id: int) -> Optional[str]:
+        ci = int(self.org_country[self.name_org[name_id]])
+        return self.countries[ci] if ci >= 0 else None
+
+    def ror_id_of(self, name_id: int) -> str:
+        return self.ror_ids[int(self.name_org[name_id])]
+
+    def canonical_name_id(self, canon: str) -> int:
+        """规范化精确表：canonicalize 后的文本 -> 名称 id，找不到（或有歧义）返回 -1。"""
+        c = self.canon.find(canon) if canon else -1
+        return int(self.canon_name[c]) if c >= 0 else -1
+
+    def token_postings(self, token: str) -> Optional[np.ndarray]:
+        t = self.tokens.find(token)
+        if t < 0:
+            return None
+        return self.postings[int(self.post_ptr[t]):int(self.post_ptr[t + 1])]
+
+    def token_df(self, token: str) -> int:
+        t = self.tokens.find(token)
+        return int(self.post_ptr[t + 1] - self.post_ptr[t]) if t >= 0 else 0
+
+    def gram_postings(self, gram: str) -> Optional[np.ndarray]:
+        g = self.grams.find(gram)
+        if g < 0:
+            return None
+        return self.gram_ids[int(self.gram_ptr[g]):int(self.gram_ptr[g + 1])]
+
+    def prefix_postings(self, prefix: str, max_tokens: int = 64) -> Optional[np.ndarray]:
+        """所有以 prefix 开头的 token 的倒排合并（升序去重）；匹配的 token 太多时返回 None。"""
+        lo, hi = self.tokens.prefix_range(prefix)
+        if lo >= hi or hi - lo > max_tokens:
+            return None
+        if hi - lo == 1:
+            return self.postings[int(self.post_ptr[lo]):int(self.post_ptr[hi])]
+        parts = [self.postings[int(self.post_ptr[t]):int(self.post_ptr[t + 1])] for t in range(lo, hi)]
+        return np.unique(np.concatenate(parts))
+
+
+def _version_of(header: Dict) -> str:
+    meta = {k: header[k] for k in ("format", "source", "params")}
+    return hashlib.sha1(json.dumps(meta, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _align(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _offsets(lengths: List[int]) -> np.ndarray:
+    """长度 -> 前缀和偏移（n + 1 个）；总长装得下 uint32 就用 uint32。"""
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    if offsets[-1] < 2 ** 32:
+        return offsets.astype(np.uint32)
+    return offsets
+
+
+def _string_table(strings: List[str]) -> Tuple[bytes, np.ndarray]:
+    encoded = [s.encode("utf-8") for s in strings]
+    return b"".join(encoded), _offsets([len(b) for b in encoded])
+
+
+def iter_source_orgs(source_path: str) -> Iterator[Dict]:
+    """
+    逐条产出 {"id", "country_code", "names"}：
+      - .pkl：旧的 slim ROR pickle（整表加载）
+      - .json / .zip：ROR 官方 dump，流式解析（见 ror_dump.py）
+    """
+    if Path(source_path).suffix.lower() in DUMP_SUFFIXES:
+        yield from iter_slim_orgs(source_path)
+        return
+    with open(source_path, "rb") as f:
+        slim_orgs = pickle.load(f)
+    yield from slim_orgs
+
+
+@dataclass
+class _OrgTable:
+    """扫一遍数据源得到的机构表（建索引 / 增量更新共用）。"""
+    countries: List[str]
+    org_country: np.ndarray
+    org_ror: List[str]
+    org_names: List[List[str]]   # 每个机构的名称（小写、机构内去重，保持原顺序）
+    first_org: Dict[str, int]    # name_lower -> 第一次出现的机构
+    n_names_total: int
+
+    def country(self, org: int) -> Optional[str]:
+        ci = int(self.org_country[org])
+        return self.countries[ci] if ci >= 0 else None
+
+
+def _scan_orgs(source_path: str) -> _OrgTable:
+    countries: List[str] = []
+    country_idx: Dict[str, int] = {}
+    org_country_list = array("h")
+    org_ror: List[str] = []
+    org_names: List[List[str]] = []
+    first_org: Dict[str, int] = {}
+    n_names_total = 0
+
+    for oi, org in enumerate(iter_source_orgs(source_path)):
+        country = org.get("country_code")
+        if country is not None:
+            if country not in country_idx:
+                country_idx[country] = len(countries)
+                countries.append(country)
+            org_country_list.append(country_idx[country])
+        else:
+            org_country_list.append(-1)
+        org_ror.append(org.get("id") or "")
+        own: List[str] = []
+        for name in org.get("names") or []:
+            n_names_total += 1
+            name_l = name.lower()
+            first_org.setdefault(name_l, oi)
+            if name_l not in own:
+                own.append(name_l)
+        org_names.append(own)
+
+    org_country = np.frombuffer(org_country_list, dtype=np.int16).copy()
+    return _OrgTable(countries, org_country, org_ror, org_names, first_org, n_names_total)
+
+
+def _name_tokens(name_l: str, stopwords: Set[str], min_token_len: int, tokenize) -> Set[str]:
+    return {tok for tok in tokenize(name_l) if len(tok) >= min_token_len and tok not in stopwords}
+
+
+class _Postings(NamedTuple):
+    """CSR 倒排表：keys[i] 的名称 id 为 ids[ptr[i]:ptr[i+1]]（升序）。"""
+    keys: List[str]
+    ptr: np.ndarray
+    ids: np.ndarray
+
+
+def _build_postings(names: Sequence[str], keys_of: Callable[[str], Set[str]]) -> _Postings:
+    lists: Dict[str, List[int]] = {}
+    for nid, name_l in enumerate(names):
+        for key in keys_of(name_l):
+            lists.setdefault(key, []).append(nid)   # nid 递增，天然有序
+    keys = sorted(lists)
+    ptr = _offsets([len(lists[k]) for k in keys])
+    ids = np.fromiter((nid for k in keys for nid in lists[k]), dtype=np.int32, count=int(ptr[-1]))
+    return _Postings(keys, ptr, ids)
+
+
+def _patch_postings(
+    old: _Postings,
+    remap: np.ndarray,
+    names: Sequence[str],
+    added_ids: np.ndarray,
+    keys_of: Callable[[str], Set[str]],
+) -> _Postings:
+    """
+    旧倒排表按「旧名称 id -> 新名称 id」（remap，-1 = 已删除）整体重映射，
+    再并进新增名称的 key；名称全被删掉的 key 不再保留。结果与 _build_postings 全量重建相同。
+    """
+    old_key_of = np.repeat(np.arange(len(old.keys)), np.diff(old.ptr.astype(np.int64)))
+    moved = remap[old.ids]
+    keep = moved >= 0
+    new_pairs = [(key, nid) for nid in added_ids.tolist() for key in keys_of(names[nid])]
+    all_keys = sorted(set(old.keys).union(key for key, _ in new_pairs))
+    key_ids = {k: i for i, k in enumerate(all_keys)}
+    old_key_map = np.fromiter((key_ids[k] for k in old.keys), dtype=np.int64, count=len(old.keys))
+    pair_key = np.fromiter((key_ids[k] for k, _ in new_pairs), dtype=np.int64, count=len(new_pairs))
+    pair_nid = np.fromiter((nid for _, nid in new_pairs), dtype=np.int64, count=len(new_pairs))
+
+    post_key = np.concatenate([old_key_map[old_key_of[keep]], pair_key])
+    post_nid = np.concatenate([moved[keep], pair_nid])
+    order = np.lexsort((post_nid, post_key))
+    counts = np.bincount(post_key, minlength=len(all_keys))
+    alive = counts > 0
+    keys = [k for k, a in zip(all_keys, alive.tolist()) if a]
+    return _Postings(keys, _offsets(counts[alive].tolist()), post_nid[order].astype(np.int32))
+
+
+def _postings_of(index: "RorIndex", kind: str) -> _Postings:
+    """从已加载的索引里拷出一张倒排表（kind = "token" / "gram"）。"""
+    if kind == "token":
+        table, ptr, ids = index.tokens, index.post_ptr, index.postings
+    else:
+        table, ptr, ids = index.grams, index.gram_ptr, index.gram_ids
+    return _Postings(list(table.decode_all()), np.array(ptr, dtype=np.int64), np.array(ids))
+
+
+def _canonical_table(names: Sequence[str], name_org: np.ndarray, orgs: _OrgTable) -> Tuple[List[str], np.ndarray]:
+    """
+    规范化名称 -> 名称 id（同一规范形式取 id 最小的名称）。
+    规范形式相同、但 (ROR ID, 国家) 不同的名称有歧义，整条不收录，留给 fuzzy。
+    """
+    by_key: Dict[str, int] = {}
+    for nid, name_l in enumerate(names):
+        key = canonicalize(name_l)
+        if not key:
+            continue
+        prev = by_key.setdefault(key, nid)
+        if prev >= 0 and prev != nid:
+            a, b = int(name_org[prev]), int(name_org[nid])
+            if a != b and (orgs.org_ror[a], orgs.country(a)) != (orgs.org_ror[b], orgs.country(b)):
+                by_key[key] = -1
+    keys = sorted(k for k, v in by_key.items() if v >= 0)
+    return keys, np.fromiter((by_key[k] for k in keys), dtype=np.int32, count=len(keys))
+
+
+def _write_index(
+    index_path: str,
+    source_path: str,
+    params: Dict,
+    orgs: _OrgTable,
+    names: List[str],
+    name_ids: Dict[str, int],
+    token_post: _Postings,
+    gram_post: _Postings,
+    extra_header: Optional[Dict] = None,
+) -> Dict:
+    """把建好的各张表写成索引文件（先写临时文件再替换），返回 header。"""
+    name_org = np.fromiter((orgs.first_org[n] for n in names), dtype=np.int32, count=len(names))
+    org_names_ptr = _offsets([len(own) for own in orgs.org_names])
+    org_names = np.fromiter(
+        (name_ids[n] for own in orgs.org_names for n in own), dtype=np.int32, count=int(org_names_ptr[-1])
+    )
+
+    names_blob, names_off = _string_table(names)
+    ror_blob, ror_off = _string_table(orgs.org_ror)
+    tokens_blob, tokens_off = _string_table(token_post.keys)
+    grams_blob, grams_off = _string_table(gram_post.keys)
+    canon_keys, canon_name = _canonical_table(names, name_org, orgs)
+    canon_blob, canon_off = _string_table(canon_keys)
+
+    sections = [
+        ("names_blob", np.frombuffer(names_blob, dtype=np.uint8)),
+        ("names_off", names_off),
+        ("name_org", name_org),
+        ("org_country", orgs.org_country),
+        ("ror_blob", np.frombuffer(ror_blob, dtype=np.uint8)),
+        ("ror_off", ror_off),
+        ("org_names_ptr", org_names_ptr),
+        ("org_names", org_names),
+        ("tokens_blob", np.frombuffer(tokens_blob, dtype=np.uint8)),
+        ("tokens_off", tokens_off),
+        ("post_ptr", token_post.ptr),
+        ("postings", token_post.ids),
+        ("grams_blob", np.frombuffer(grams_blob, dtype=np.uint8)),
+        ("grams_off", grams_off),
+        ("gram_ptr", gram_post.ptr),
+        ("gram_postings", gram_post.ids),
+        ("canon_blob", np.frombuffer(canon_blob, dtype=np.uint8)),
+        ("canon_off", canon_off),
+        ("canon_name", canon_name),
+    ]
+    layout = {}
+    offset = 0
+    for name, arr in sections:
+        layout[name] = {"offset": offset, "dtype": arr.dtype.str, "count": int(arr.size)}
+        offset = _align(offset + arr.nbytes)
+
+    header = {
+        "format": FORMAT_VERSION,
+        "source": source_signature(source_path),
+        "params": params,
+        "countries": orgs.countries,
+        "n_orgs": len(orgs.org_ror),
+        "n_names_total": orgs.n_names_total,
+        "built_at": int(time.time()),
+        **(extra_header or {}),
+        "sections": layout,
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+
+    tmp = index_path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        data_start = _align(f.tell())
+        for name, arr in sections:
+            f.seek(data_start + layout[name]["offset"])
+            f.write(np.ascontiguousarray(arr).tobytes())
+    _publish(tmp, index_path)
+    return header
+
+
+def _publish(tmp: str, index_path: str) -> None:
+    """
+    用写好的临时文件替换正式索引。Windows 上别的进程（matcher_service、分类进程池）
+    正 mmap 着旧索引时替换会 PermissionError：删掉临时文件，旧索引原样保留，给出明确的提示。
+    """
+    try:
+        os.replace(tmp, index_path)
+    except PermissionError as e:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise RuntimeError(
+            f"索引文件 {index_path} 正被其他进程打开（matcher_service / 分类进程池等），无法替换；"
+            f"先停掉这些进程再更新索引。旧索引保持不变。（{e}）"
+        ) from None
+
+
+def build_index(
+    source_path: str,
+    index_path: str,
+    stopwords: Set[str],
+    min_token_len: int,
+    tokenize,
+) -> None:
+    """从 slim ROR pickle 或 ROR dump 建索引并写到 index_path（先写临时文件再替换）。"""
+    t0 = time.perf_counter()
+    print(f"从 {source_path} 读取 ROR 数据 ...")
+    orgs = _scan_orgs(source_path)
+    print(f"  共有 {len(orgs.org_ror)} 个机构记录，开始构建索引...")
+
+    names = sorted(orgs.first_org)
+    token_post = _build_postings(names, lambda n: _name_tokens(n, stopwords, min_token_len, tokenize))
+    gram_post = _build_postings(names, char_grams)
+
+    _write_index(index_path, source_path, index_params(stopwords, min_token_len),
+                 orgs, names, {n: i for i, n in enumerate(names)}, token_post, gram_post)
+
+    print(f"  名称总数: {orgs.n_names_total}（去重后 {len(names)}）")
+    print(f"  倒排表 token 数量: {len(token_post.keys)}，trigram 数量: {len(gram_post.keys)}")
+    print(f"  索引已写入 {index_path}（{os.path.getsize(index_path) / 1e6:.1f} MB，"
+          f"{time.perf_counter() - t0:.1f}s）")
+
+
+# ----- 增量更新 -----
+
+def diff_path_for(index_path: str) -> str:
+    """增量更新的差异记录放在索引旁边：ror.rorindex -> ror.rorindex.diff.json"""
+    return index_path + DIFF_SUFFIX
+
+
+@dataclass
+class IndexDiff:
+    """
+    两个版本索引之间的差异（按 ROR ID 对比机构）：
+      - added / removed：新增 / 删除的机构
+      - renamed：名称集合变了的机构；country_changed：国家代码变了的机构
+      - affected_names：(国家, ROR ID) 映射有变化的规范化名称，含新增和删除的名称
+      - rescore_tokens：token -> 新索引里新出现或映射变了的名称（affected_names 去掉已删除的）
+      - token_df_delta：受影响 token 的 df 变化（新 - 旧）
+    匹配结果缓存据此只作废可能变化的片段（见 RorMatcher._carry_over_cache）。
+    """
+    from_version: str
+    to_version: str
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    renamed: List[str] = field(default_factory=list)
+    country_changed: List[str] = field(default_factory=list)
+    affected_names: List[str] = field(default_factory=list)
+    rescore_tokens: Dict[str, List[str]] = field(default_factory=dict)
+    token_df_delta: Dict[str, int] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self.changed_rors = set(self.removed) | set(self.renamed) | set(self.country_changed)
+        self._tokens = sorted(self.rescore_tokens)
+
+    def summary(self) -> str:
+        return (f"新增 {len(self.added)} / 删除 {len(self.removed)} / 改名 {len(self.renamed)} / "
+                f"改国家 {len(self.country_changed)} 个机构，受影响名称 {len(self.affected_names)} 个")
+
+    def rescore_names_near(self, query_tokens: Iterable[str]) -> List[str]:
+        """
+        与片段共享 token（或片段 token 是其 token 的前缀，对应截断词的前缀展开）的待重新打分名称。
+        旧版本下算出的 fuzzy 结果在新版本下只有两种可能会变：
+          - 结果指向的机构在 changed_rors 里（被删除的名称一定属于这类机构）
+          - 这里返回的某个名称打分不低于旧结果
+        （名称总数变化会整体平移 IDF 权重，只影响 top_k 剪枝边界附近的排序，这里不计。）
+        """
+        toks = self._tokens
+        near: Dict[str, None] = {}
+        for tok in query_tokens:
+            i = bisect.bisect_left(toks, tok)
+            while i < len(toks) and toks[i].startswith(tok):
+                near.update(dict.fromkeys(self.rescore_tokens[toks[i]]))
+                i += 1
+        return list(near)
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({k: getattr(self, k) for k in self.__dataclass_fields__}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "IndexDiff":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+
+def _org_name_hashes(ptr: np.ndarray, name_ids: np.ndarray) -> np.ndarray:
+    """每个机构的名称 id 集合 -> 一个 64 位哈希（各名称 id 混合后求和，与顺序无关）。"""
+    h = name_ids.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    h ^= h >> np.uint64(29)
+    cs = np.zeros(len(h) + 1, dtype=np.uint64)
+    np.cumsum(h, out=cs[1:])
+    ptr = ptr.astype(np.int64)
+    return cs[ptr[1:]] - cs[ptr[:-1]]
+
+
+def update_index(
+    base_path: str,
+    source_path: str,
+    index_path: str,
+    stopwords: Set[str],
+    min_token_len: int,
+    tokenize,
+) -> IndexDiff:
+    """
+    以 base_path 处的旧索引为基础，按新的数据源增量写出 index_path（可以就是 base_path），
+    并把差异写到 diff_path_for(index_path)。
+
+    机构表 / 名称表随新数据源整体重写（读数据源本身躲不掉）；token / trigram 倒排表不重新切分：
+    旧 postings 按「旧名称 id -> 新名称 id」整体重映射，删掉已消失的名称，
+    只对新增的名称做切分再并进去（_patch_postings）。结果与 build_index 全量重建逐字节相同（header 除外）。
+    旧索引格式 / 参数不符时抛 ValueError（调用方改走全量重建）。
+    """
+    t0 = time.perf_counter()
+    params = index_params(stopwords, min_token_len)
+    base = RorIndex(base_path)
+    if base.header["params"] != params:
+        raise ValueError("旧索引的建索引参数不同")
+
+    # 先把旧索引里要用的表都拷进内存，base_path == index_path 时才能替换掉旧文件
+    old_version = base.version
+    old_names = list(base.names.decode_all())
+    old_name_org = np.array(base.name_org)
+    old_token_post = _postings_of(base, "token")
+    old_gram_post = _postings_of(base, "gram")
+    old_rors = list(base.ror_ids.decode_all())
+    old_country = [base.countries[c] if c >= 0 else None for c in base.org_country.tolist()]
+    old_org_ptr = np.array(base.org_names_ptr, dtype=np.int64)
+    old_org_names = np.array(base.org_names)
+    del base
+
+    print(f"从 {source_path} 读取 ROR 数据，与 {base_path} 比对 ...")
+    orgs = _scan_orgs(source_path)
+    names = sorted(orgs.first_org)
+    new_ids = {n: i for i, n in enumerate(names)}
+
+    # 旧名称 id -> 新名称 id（-1 = 已删除）
+    remap = np.fromiter((new_ids.get(n, -1) for n in old_names), dtype=np.int64, count=len(old_names))
+    kept = remap >= 0
+    is_old = np.zeros(len(names), dtype=bool)
+    is_old[remap[kept]] = True
+    added_ids = np.flatnonzero(~is_old)
+
+    # 倒排表：旧 postings 重映射，只对新增的名称做 token 化 / 切 trigram
+    def name_tokens(name_l: str) -> Set[str]:
+        return _name_tokens(name_l, stopwords, min_token_len, tokenize)
+
+    token_post = _patch_postings(old_token_post, remap, names, added_ids, name_tokens)
+    gram_post = _patch_postings(old_gram_post, remap, names, added_ids, char_grams)
+
+    # 受影响的名称：新增、删除，以及 (ROR ID, 国家) 映射变了的
+    new_country = [orgs.country(o) for o in range(len(orgs.org_ror))]
+    old_key = np.array([f"{r}\t{c}" for r, c in zip(old_rors, old_country)], dtype=object)[old_name_org]
+    name_org = np.fromiter((orgs.first_org[n] for n in names), dtype=np.int64, count=len(names))
+    new_key = np.array([f"{r}\t{c}" for r, c in zip(orgs.org_ror, new_country)], dtype=object)[name_org]
+    kept_ids = np.flatnonzero(kept)
+    changed = kept_ids[old_key[kept_ids] != new_key[remap[kept_ids]]]
+    rescore = [names[i] for i in added_ids.tolist()] + [old_names[i] for i in changed.tolist()]
+    affected = set(rescore).union(old_names[i] for i in np.flatnonzero(~kept).tolist())
+    rescore_tokens: Dict[str, List[str]] = {}
+    for n in sorted(rescore):
+        for tok in name_tokens(n):
+            rescore_tokens.setdefault(tok, []).append(n)
+
+    # 受影响名称的 token 的 df 变化（匹配器据此判断旧版本下片段走的是哪条候选路径）
+    old_df = dict(zip(old_token_post.keys, np.diff(old_token_post.ptr).tolist()))
+    new_df = dict(zip(token_post.keys, np.diff(token_post.ptr.astype(np.int64)).tolist()))
+    token_df_delta = {}
+    for n in affected:
+        for tok in name_tokens(n):
+            delta = new_df.get(tok, 0) - old_df.get(tok, 0)
+            if delta:
+                token_df_delta[tok] = delta
+
+    # 机构层面的差异（按 ROR ID）：名称集合用新名称 id 比较，已删除的名称换成不会冲突的 id
+    old_org_of = {r: o for o, r in enumerate(old_rors) if r}
+    new_org_of = {r: o for o, r in enumerate(orgs.org_ror) if r}
+    common = sorted(old_org_of.keys() & new_org_of.keys())
+    old_hash = _org_name_hashes(
+        old_org_ptr, np.where(kept, remap, len(names) + np.arange(len(old_names)))[old_org_names])
+    new_ptr = _offsets([len(own) for own in orgs.org_names])
+    new_hash = _org_name_hashes(new_ptr, np.fromiter(
+        (new_ids[n] for own in orgs.org_names for n in own), dtype=np.int64, count=int(new_ptr[-1])))
+    pairs = np.array([(old_org_of[r], new_org_of[r]) for r in common], dtype=np.int64).reshape(-1, 2)
+    renamed = (old_hash[pairs[:, 0]] != new_hash[pairs[:, 1]]) | (
+        np.diff(old_org_ptr)[pairs[:, 0]] != np.diff(new_ptr.astype(np.int64))[pairs[:, 1]])
+
+    header = _write_index(index_path, source_path, params, orgs, names, new_ids, token_post, gram_post,
+                          extra_header={"updated_from": old_version})
+    diff = IndexDiff(
+        from_version=old_version,
+        to_version=_version_of(header),
+        added=sorted(new_org_of.keys() - old_org_of.keys()),
+        removed=sorted(old_org_of.keys() - new_org_of.keys()),
+        renamed=[r for r, x in zip(common, renamed.tolist()) if x],
+        country_changed=[r for r, (o, n) in zip(common, pairs.tolist()) if old_country[o] != new_country[n]],
+        affected_names=sorted(affected),
+        rescore_tokens=rescore_tokens,
+        token_df_delta=dict(sorted(token_df_delta.items())),
+    )
+    diff.save(diff_path_for(index_path))
+
+    print(f"  {diff.summary()}")
+    print(f"  索引已增量更新到 {index_path}（新切分 {len(added_ids)} 个名称，"
+          f"{time.perf_counter() - t0:.1f}s）")
+    return diff
+
+
+def index_params(stopwords: Set[str], min_token_len: int) -> Dict:
+    return {"stopwords": sorted(stopwords), "min_token_len": min_token_len, "gram_n": GRAM_N,
+            "canon": CANON_VERSION}
+
+
+def load_or_build_index(
+    source_path: str,
+    stopwords: Set[str],
+    min_token_len: int,
+    tokenize,
+    index_path: Optional[str] = None,
+    rebuild: bool = False,
+) -> RorIndex:
+    """
+    有可用的索引文件就直接 mmap；数据源变了就以旧索引为基础增量更新（update_index），
+    旧索引不可用（或 rebuild=True）时全量重建。
+    """
+    index_path = index_path or index_path_for(source_path)
+    params = index_params(stopwords, min_token_len)
+
+    if not rebuild and os.path.exists(index_path):
+        try:
+            index = RorIndex(index_path)
+            if index.matches_source(source_path, params):
+                return index
+            same_params = index.header["params"] == params
+            del index
+            if same_params:
+                print("ROR 数据源有变化，增量更新索引 ...")
+                update_index(index_path, source_path, index_path, stopwords, min_token_len, tokenize)
+                return RorIndex(index_path)
+            print("索引参数有变化，重建索引 ...")
+        except (ValueError, KeyError, struct.error) as e:
+            print(f"⚠️ 索引文件不可用（{e}），重建 ...")
+
+    build_index(source_path, index_path, stopwords, min_token_len, tokenize)
+    return RorIndex(index_path)
+
+
+if __name__ == "__main__":
+    import argparse
+    import sqlite3
+    from .match_cache import match_cache_path_for
+    from .ror_index import DEFAULT_STOPWORDS, RorMatcher, tokenize
+
+    ap = argparse.ArgumentParser(description="构建 / 查看 RorMatcher 的磁盘索引")
+    ap.add_argument("pkl", help="slim ROR pickle 或 ROR dump（.json / .zip）")
+    ap.add_argument("--index", default=None, help=f"索引文件路径（默认与 pickle 同名，后缀 {INDEX_SUFFIX}）")
+    ap.add_argument("--rebuild", action="store_true", help="强制重建")
+    ap.add_argument("--base", default=None,
+                    help="以这个旧索引为基础增量更新（新 dump 文件名不同时用），"
+                         "旧索引旁的匹配缓存也会复制过来，下次运行时只重算受影响的片段")
+    args = ap.parse_args()
+
+    if args.base:
+        index_path = args.index or index_path_for(args.pkl)
+        update_index(args.base, args.pkl, index_path, DEFAULT_STOPWORDS, 3, tokenize)
+        old_cache, new_cache = match_cache_path_for(args.base), match_cache_path_for(args.pkl)
+        if os.path.exists(old_cache) and not os.path.exists(new_cache):
+            src, dst = sqlite3.connect(old_cache), sqlite3.connect(new_cache)
+            src.backup(dst)   # WAL 里还没合并的页也一起带上
+            src.close()
+            dst.close()
+            print(f"  匹配缓存已复制到 {new_cache}")
+        args.index = index_path
+
+    idx = RorMatcher(args.pkl, index_path=args.index, rebuild=args.rebuild).index
+    print(f"✅ {idx.path}: {idx.header['n_orgs']} 个机构，{idx.n_names} 个名称，"
+          f"{idx.n_tokens} 个 token，{len(idx.grams)} 个 trigram，{len(idx.canon)} 个规范化名称，"
+          f"版本 {idx.version}")
+    sys.exit(0)
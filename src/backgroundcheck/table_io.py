@@ -0,0 +1,158 @@
+"""
+各阶段结果表的读写（statistics → backgroundcheck → SaveInPNG 共用）。
+
+按文件后缀选择格式：
+  - .csv              : utf-8-sig 文本，方便人工查看 / Excel 打开
+  - .parquet / .pq    : Arrow 列式存储，zstd 压缩，分类列字典编码，
+                        可以只读需要的列，且不用每次重新推断 dtype
+
+命令行互转（例如把 parquet 导出成 CSV 给人看）：
+    python -m backgroundcheck.table_io in.parquet [out.csv]
+"""
+from __future__ import annotations
+import sys
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import pandas as pd
+
+ENCODING = "utf-8-sig"
+PARQUET_SUFFIXES = {".parquet", ".pq"}
+PARQUET_COMPRESSION = "zstd"
+
+# 已知列的存储类型：
+#   "string"   -> 文本（空值保持为空）
+#   "category" -> 字典编码（取值少、重复多的列）
+#   其余为 pandas dtype 名
+COLUMN_TYPES = {
+    "abstract_id": "string",
+    "title": "string",
+    "posted": "string",
+    "authors": "string",
+    "affiliations": "string",
+    "source_file": "category",
+    "mark": "category",
+    "affil_detail": "string",
+    "match_conf": "Int8",
+    "english_background": "category",
+    "affil_ror_ids": "string",
+}
+
+
+def is_parquet(path) -> bool:
+    return Path(str(path)).suffix.lower() in PARQUET_SUFFIXES
+
+
+def with_format(path, fmt: str) -> str:
+    """把路径的后缀换成 fmt 对应的格式（"csv" / "parquet"）。"""
+    p = Path(str(path))
+    if fmt == "parquet":
+        return str(p.with_suffix(".parquet"))
+    if fmt == "csv":
+        return str(p.with_suffix(".csv"))
+    raise ValueError(f"未知的存储格式: {fmt!r}（可选 csv / parquet）")
+
+
+def _require_pyarrow() -> None:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise RuntimeError("Parquet 读写需要 pyarrow：pip install pyarrow") from None
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """按 COLUMN_TYPES 统一已知列的类型（写 parquet 前调用）。"""
+    out = df.copy()
+    for col, kind in COLUMN_TYPES.items():
+        if col not in out.columns:
+            continue
+        s = out[col]
+        if kind == "string":
+            # 保持 object + str，读回来与 read_csv 的行为一致（空值为 None/NaN）
+            out[col] = s.map(lambda v: v if isinstance(v, str) or pd.isna(v) else str(v))
+        elif kind == "category":
+            out[col] = s.astype("category")
+        else:
+            out[col] = s.astype(kind)
+    return out
+
+
+# 读 CSV 时按文本读的列（与 parquet 一致，abstract_id 等不会被推成 int64 / float64）
+CSV_TEXT_DTYPES = {col: str for col, kind in COLUMN_TYPES.items() if kind == "string"}
+
+
+def read_table(path, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """读取一个阶段的结果表；columns 给定时只读这些列。"""
+    cols = list(columns) if columns is not None else None
+    if is_parquet(path):
+        _require_pyarrow()
+        return pd.read_parquet(path, columns=cols, engine="pyarrow")
+    return pd.read_csv(path, encoding=ENCODING, usecols=cols, dtype=CSV_TEXT_DTYPES)
+
+
+def write_table(df: pd.DataFrame, path) -> None:
+    """写出一个阶段的结果表（格式由后缀决定）。"""
+    Path(str(path)).parent.mkdir(parents=True, exist_ok=True)
+    if is_parquet(path):
+        _require_pyarrow()
+        apply_schema(df).to_parquet(
+            path,
+            engine="pyarrow",
+            index=False,
+            compression=PARQUET_COMPRESSION,
+            use_dictionary=True,
+        )
+    else:
+        df.to_csv(path, index=False, encoding=ENCODING)
+
+
+def iter_table_chunks(path, chunksize: int, skip_rows: int = 0) -> Iterator[pd.DataFrame]:
+    """
+    按 chunksize 行一块地读表（不把整张表读进内存）。
+    skip_rows: 跳过开头多少个数据行（断点续跑时用），不计表头。
+    """
+    if is_parquet(path):
+        _require_pyarrow()
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(path)
+        skipped = 0
+        for batch in pf.iter_batches(batch_size=chunksize):
+            if skipped + batch.num_rows <= skip_rows:
+                skipped += batch.num_rows
+                continue
+            df = batch.to_pandas()
+            if skipped < skip_rows:
+                df = df.iloc[skip_rows - skipped:].reset_index(drop=True)
+                skipped = skip_rows
+            yield df
+        return
+
+    skip = range(1, skip_rows + 1) if skip_rows else None
+    yield from pd.read_csv(path, encoding=ENCODING, chunksize=chunksize, skiprows=skip, dtype=CSV_TEXT_DTYPES)
+
+
+def append_csv_chunk(df: pd.DataFrame, path, header: bool) -> int:
+    """把一块结果追加到 CSV 末尾，返回写完后的文件字节长度（断点用）。"""
+    Path(str(path)).parent.mkdir(parents=True, exist_ok=True)
+    # 追加模式下 utf-8-sig 只在文件开头写 BOM
+    with open(path, "a", encoding=ENCODING, newline="") as f:
+        df.to_csv(f, index=False, header=header)
+        f.flush()
+        return f.tell()
+
+
+def convert_table(src, dst=None) -> str:
+    """parquet <-> csv 互转；dst 省略时换个后缀写在同目录。"""
+    if dst is None:
+        dst = with_format(src, "csv" if is_parquet(src) else "parquet")
+    write_table(read_table(src), dst)
+    return str(dst)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m backgroundcheck.table_io <in.parquet|in.csv> [out]")
+        sys.exit(1)
+    out = convert_table(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"✅ 已写出: {out}")
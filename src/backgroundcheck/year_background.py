@@ -0,0 +1,101 @@
+"""
+年份 × english_background 的聚合层（SaveInPNG 画图用）。
+
+每个结果表只读 posted / english_background 两列，聚合成 (年份, english_background, 条数) 的小表，
+缓存在 <输入>.yearbg.json，按输入文件的大小 / 修改时间判断是否失效。
+同一个期刊重画、换年份区间、或把多个期刊合成一张图时，都只读这些小表：
+
+    from backgroundcheck.year_background import load_counts, pivot_counts
+    pivot = pivot_counts([load_counts(p) for p in paths], (2014, 2025))
+
+聚合不按年份区间过滤（区间在 pivot_counts 里选），所以缓存与区间无关。
+"""
+from __future__ import annotations
+import json
+import os
+import re
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .table_io import read_table
+except ImportError:  # 直接作为脚本运行
+    from table_io import read_table
+
+CACHE_SUFFIX = '.yearbg.json'
+AGG_VERSION = 1   # 聚合口径变了就加一，旧缓存全部作废
+COLUMNS = ['posted', 'english_background']
+COUNT_COLUMNS = ['posted', 'english_background', 'count']
+
+YEAR_RE = re.compile(r'(\d{4})')
+
+
+# ====== 提取年份 ======
+def extract_years(posted: pd.Series) -> pd.Series:
+    """
+    posted 里第一个 4 位数字作为年份，返回 Int64（没有年份 / 非字符串的为 <NA>）。
+    发布日期大量重复（同一天的很多条），先 factorize，只在不同的取值上做一次 str.extract。
+    """
+    codes, uniques = pd.factorize(posted)   # NaN -> -1
+    found = pd.Series(uniques, dtype=object).str.extract(YEAR_RE, expand=False)   # 非字符串 -> NaN
+    # 末尾补一个 -1，codes 为 -1（空值）时正好取到它
+    year_of = np.array([int(y) if isinstance(y, str) else -1 for y in found.tolist()] + [-1], dtype=np.int64)
+    years = year_of[codes]
+    return pd.Series(years, index=posted.index, dtype='Int64').mask(years < 0)
+
+
+# ====== 聚合 ======
+def aggregate_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """(posted 年份, english_background, count)；没有年份的行不计。"""
+    years = extract_years(df['posted'])
+    keep = years.notna().to_numpy()
+    bg = df.loc[keep, 'english_background'].astype(str).str.strip()
+    return (
+        pd.DataFrame({'posted': years[keep].astype(int).to_numpy(), 'english_background': bg.to_numpy()})
+        .groupby(['posted', 'english_background']).size()
+        .reset_index(name='count')
+    )
+
+
+def _signature(path: str) -> Dict:
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'version': AGG_VERSION}
+
+
+def load_counts(path: str, use_cache: bool = True) -> pd.DataFrame:
+    """一个结果表的聚合：缓存有效就直接用，否则读两列重新聚合并写缓存。"""
+    cache_path = str(path) + CACHE_SUFFIX
+    sig = _signature(path)
+    if use_cache and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('signature') == sig:
+                return pd.DataFrame(cached['counts'], columns=COUNT_COLUMNS)
+        except (OSError, ValueError, KeyError) as e:
+            print(f'⚠️ 聚合缓存损坏（{e}），重新聚合: {cache_path}')
+
+    counts = aggregate_frame(read_table(path, columns=COLUMNS))
+    if use_cache:
+        tmp = cache_path + '.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'source': os.path.basename(str(path)), 'signature': sig,
+                           'counts': [list(r) for r in counts.itertuples(index=False, name=None)]},
+                          f, ensure_ascii=False)
+            os.replace(tmp, cache_path)
+        except OSError as e:   # 输入目录只读等：不缓存，照常出图
+            print(f'⚠️ 写不了聚合缓存（{e}）: {cache_path}')
+    return counts
+
+
+def pivot_counts(counts: Iterable[pd.DataFrame], year_range: Optional[Tuple[int, int]] = None) -> pd.DataFrame:
+    """把一个或多个聚合表相加，转成 年份 × english_background 的计数表（行按年份排序）。"""
+    df = pd.concat(list(counts), ignore_index=True)
+    if year_range is not None:
+        df = df[df['posted'].between(*year_range)]
+    pivot_df = df.groupby(['posted', 'english_background'])['count'].sum().unstack(fill_value=0)
+    pivot_df.columns.name = 'english_background'
+    return pivot_df.astype(int).sort_index()
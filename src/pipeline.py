@@ -0,0 +1,372 @@
+"""
+整条处理链的 make 式运行器：
+
+    parse    目录页 HTML      -> result/<期刊>.csv                  (statistics/just_affiliation_txt.py)
+    fix      补 affiliations  -> result/<期刊>_with_fixed_affil.csv (statistics/fix_unavailable_affiliation.py)
+    clarify  核对作者/机构数  -> result/<期刊>_clarify.csv          (statistics/affiliations_quantity_clarify.py)
+    ror      ROR 国家判定     -> result/<期刊>_ror.csv              (backgroundcheck.main)
+    plot     年份 × 背景柱图  -> result/<期刊>_english_bg.png       (backgroundcheck.SaveInPNG)
+
+各期刊跑完后，再用 data/ 下所有期刊已有的 ror 结果画一张合并图 data/result/all_journals_english_bg.png；
+它只读各期刊结果旁边的聚合缓存（<结果>.yearbg.json），不重新读整张表。
+
+每个阶段的指纹 = 输入文件内容 + 阶段代码 + 参数；指纹没变且输出都在就跳过。
+不同期刊之间互不依赖，并行跑；每个阶段的输出写到 result/<期刊>.<阶段>.log。
+fix 阶段要访问 SSRN（浏览器 + 请求间隔），各期刊的 fix 一次只跑一个；第一个没有登录态时
+会弹出浏览器，登录后在这个终端按 Enter（提示写在它的日志里），登录态保存下来后其余期刊直接复用。
+
+Usage（在 src/ 下）:
+    python pipeline.py [期刊目录 ...] [--jobs N] [--format csv|parquet]
+                       [--skip fix] [--force] [--ror-pkl PATH]
+不给期刊目录时，自动找 data/ 下含 list_*.html 的目录。
+先起 `python -m backgroundcheck.matcher_service --ror-pkl PATH` 的话，各期刊的 ror 阶段
+共用这一个常驻的匹配服务，不再各自加载索引。
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+SRC_DIR = Path(__file__).resolve().parent
+DATA_DIR = SRC_DIR.parent / "data"
+STATE_FILE = DATA_DIR / ".pipeline_state.json"
+DEFAULT_ROR_PKL = r"E:\SSRNPaperResearch\data\new_ror_name.pkl"
+
+STAGE_NAMES = ["parse", "fix", "clarify", "ror", "plot"]
+# 输入只能来自某个阶段的输出（要用它新增的列）：那个阶段跳过时，这个阶段也跳过，不往上游改接
+# （plot 要 ror 加的 english_background 列，接到 clarify 的输出上会 KeyError）
+REQUIRES_STAGE = {"plot": "ror"}
+# ror 阶段（backgroundcheck.main）实际 import 到的模块；改 SaveInPNG / bench 脚本等不会让各期刊重新分类。
+# matcher_service 也算：matcher_client 要 import 它，服务在跑时分类就是它做的
+ROR_CODE = [f"backgroundcheck/{m}.py" for m in (
+    "main", "classifier", "affiliation_cleaner", "ror_index", "ror_store", "ror_dump", "match_cache",
+    "parallel", "matcher_client", "matcher_service", "table_io", "config", "profiling",
+)]
+PLOT_CODE = ["backgroundcheck/SaveInPNG.py", "backgroundcheck/year_background.py", "backgroundcheck/table_io.py"]
+MERGED_NAME = "all_journals"
+
+# 访问网络的阶段（fix）全局串行：多个浏览器同时打 SSRN 会绕过各进程自己的请求间隔
+NETWORK_LOCK = threading.Lock()
+
+
+@dataclass
+class Stage:
+    name: str
+    journal: str
+    cmd: List[str]          # 相对 src/ 的命令（不含 python 解释器）
+    code: List[str]         # 参与指纹的代码文件 / 目录（相对 src/）
+    inputs: List[Path]      # 文件或目录
+    outputs: List[Path]
+    exclusive: bool = False  # True：持 NETWORK_LOCK 运行，同一时间只跑一个
+    wall_time: Optional[float] = None
+    status: str = "pending"  # pending / skipped / done / failed
+
+    @property
+    def key(self) -> str:
+        return f"{self.journal}:{self.name}"
+
+
+@dataclass
+class Journal:
+    name: str
+    html_dir: Path
+    stages: List[Stage] = field(default_factory=list)
+
+
+# ===== 指纹 =====
+
+class Fingerprinter:
+    """
+    文件内容哈希，按 (size, mtime_ns) 缓存，没改过的大文件（ROR pkl 等）不重复读。
+    cache 就是 PipelineState 里要保存的 hash_cache，所以和它共用一把锁：
+    保存时 json.dumps 遍历这个 dict，不能有别的线程同时往里写。
+    """
+
+    def __init__(self, cache: Dict[str, list], lock: threading.Lock) -> None:
+        self.cache = cache
+        self.lock = lock
+
+    def file_hash(self, path: Path) -> str:
+        st = path.stat()
+        key = str(path.resolve())
+        with self.lock:
+            hit = self.cache.get(key)
+        if hit and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+            return hit[2]
+
+        h = hashlib.sha256()
+        with path.open("rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with self.lock:
+            self.cache[key] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def path_hash(self, path: Path) -> str:
+        if not path.exists():
+            return "missing"
+        if path.is_file():
+            return self.file_hash(path)
+        # 目录：只看 .html / .py 文件的相对路径 + 大小 + mtime（目录页可能有几千个）
+        h = hashlib.sha256()
+        for p in sorted(path.rglob("*")):
+            if p.is_file() and p.suffix in (".html", ".py"):
+                st = p.stat()
+                h.update(f"{p.relative_to(path)}|{st.st_size}|{st.st_mtime_ns}\n".encode("utf-8"))
+        return h.hexdigest()
+
+    def stage_fingerprint(self, stage: Stage) -> str:
+        h = hashlib.sha256()
+        h.update(json.dumps(stage.cmd).encode("utf-8"))
+        for c in stage.code:
+            h.update(f"code:{c}:{self.path_hash(SRC_DIR / c)}\n".encode("utf-8"))
+        for p in stage.inputs:
+            h.update(f"in:{p}:{self.path_hash(p)}\n".encode("utf-8"))
+        return h.hexdigest()
+
+
+class PipelineState:
+    """data/.pipeline_state.json：各阶段上次成功时的指纹 / 输出哈希 / 用时。"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.data: Dict = {"stages": {}, "hash_cache": {}}
+        if path.exists():
+            try:
+                self.data = json.loads(path.read_text(encoding="utf-8"))
+            except Exception as e:
+                print(f"⚠️ 状态文件损坏：{e}，全部重跑。")
+        self.data.setdefault("stages", {})
+        self.data.setdefault("hash_cache", {})
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self.lock:
+            return self.data["stages"].get(key)
+
+    def put(self, key: str, record: Dict) -> None:
+        with self.lock:
+            self.data["stages"][key] = record
+            self.save_locked()
+
+    def save_locked(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.data, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+# ===== 阶段声明 =====
+
+def ror_output_for(html_dir: Path, fmt: str) -> Path:
+    ext = ".parquet" if fmt == "parquet" else ".csv"
+    return html_dir.parent / "result" / f"{html_dir.name}_ror{ext}"
+
+
+def build_journal(html_dir: Path, fmt: str, ror_pkl: str, skip: List[str]) -> Journal:
+    name = html_dir.name
+    result = html_dir.parent / "result"
+    ext = ".parquet" if fmt == "parquet" else ".csv"
+
+    parsed = result / f"{name}{ext}"
+    fixed = result / f"{name}_with_fixed_affil{ext}"
+    clarified = result / f"{name}_clarify{ext}"
+    ror_out = ror_output_for(html_dir, fmt)
+    png = result / f"{name}_english_bg.png"
+
+    parse_cmd = ["statistics/just_affiliation_txt.py", str(html_dir)]
+    if fmt == "parquet":
+        parse_cmd.append("--parquet")
+
+    stages = [
+        Stage("parse", name, parse_cmd,
+              ["statistics/just_affiliation_txt.py", "statistics/html_parsers.py"],
+              [html_dir], [parsed]),
+        Stage("fix", name,
+              ["statistics/fix_unavailable_affiliation.py", "--input", str(parsed), "--output", str(fixed)],
+              ["statistics/fix_unavailable_affiliation.py", "statistics/ssrn_detail.py",
+               "statistics/html_parsers.py", "statistics/fix_cache.py"],
+              [parsed], [fixed], exclusive=True),
+        Stage("clarify", name,
+              ["statistics/affiliations_quantity_clarify.py", "--input", str(fixed), "--output", str(clarified)],
+              ["statistics/affiliations_quantity_clarify.py"],
+              [fixed], [clarified]),
+        Stage("ror", name,
+              ["-m", "backgroundcheck.main", "--input", str(clarified), "--output", str(ror_out),
+               "--ror-pkl", ror_pkl],
+              ROR_CODE,
+              [clarified, Path(ror_pkl)], [ror_out]),
+        Stage("plot", name,
+              ["-m", "backgroundcheck.SaveInPNG", "--input", str(ror_out), "--output", str(png)],
+              PLOT_CODE,
+              [ror_out], [png]),
+    ]
+
+    # 跳过的阶段：下游直接吃上游的输出；REQUIRES_STAGE 里的下游不改接，一并跳过
+    kept: List[Stage] = []
+    for st in stages:
+        if st.name in skip or REQUIRES_STAGE.get(st.name) in skip:
+            if kept and st.inputs and st.outputs:
+                _rewire(stages, st.outputs[0], kept[-1].outputs[0])
+            continue
+        kept.append(st)
+    return Journal(name, html_dir, kept)
+
+
+def expand_skip(skip: List[str]) -> List[str]:
+    """加上因为 REQUIRES_STAGE 而必须一起跳过的阶段。"""
+    skip = list(skip)
+    for name, needed in REQUIRES_STAGE.items():
+        if needed in skip and name not in skip:
+            print(f"⚠️ 跳过了 {needed}，{name} 没有可用的输入，一并跳过。")
+            skip.append(name)
+    return skip
+
+
+def _rewire(stages: List[Stage], old: Path, new: Path) -> None:
+    for st in stages:
+        st.inputs = [new if p == old else p for p in st.inputs]
+        st.cmd = [str(new) if c == str(old) else c for c in st.cmd]
+
+
+def build_merged_plot(journals: List[Journal], fmt: str) -> Optional[Journal]:
+    """
+    所有期刊合成一张图：输入是 data/ 下自动发现的全部期刊（加上本次给的）已有的 ror 结果，
+    与这次跑了哪几个期刊无关，至少两个时才画。
+    本次有期刊在 ror 或之前的阶段失败时不画：它的 ror 结果可能是旧的，合并图会悄悄混进去。
+    """
+    failed = sorted({j.name for j in journals for st in j.stages if st.status == "failed" and st.name != "plot"})
+    if failed:
+        print(f"⚠️ {', '.join(failed)} 有阶段失败，不更新合并图。")
+        return None
+    dirs = sorted(set(discover_journals()) | {j.html_dir for j in journals})
+    ror_outs = [p for p in (ror_output_for(d, fmt) for d in dirs) if p.exists()]
+    if len(ror_outs) < 2:
+        return None
+    png = DATA_DIR / "result" / f"{MERGED_NAME}_english_bg.png"
+    stage = Stage("plot", MERGED_NAME,
+                  ["-m", "backgroundcheck.SaveInPNG", "--input", *map(str, ror_outs), "--output", str(png)],
+                  PLOT_CODE, ror_outs, [png])
+    return Journal(MERGED_NAME, DATA_DIR, [stage])
+
+
+def discover_journals() -> List[Path]:
+    dirs = {p.parent for p in DATA_DIR.rglob("list_*.html") if not p.parent.name.startswith("_")}
+    return sorted(dirs)
+
+
+# ===== 运行 =====
+
+def run_stage(stage: Stage, fp: Fingerprinter, state: PipelineState, force: bool) -> bool:
+    fingerprint = fp.stage_fingerprint(stage)
+    prev = state.get(stage.key)
+    if (
+        not force
+        and prev
+        and prev.get("fingerprint") == fingerprint
+        and all(p.exists() and prev.get("outputs", {}).get(str(p)) == fp.path_hash(p) for p in stage.outputs)
+    ):
+        stage.status = "skipped"
+        print(f"⏭️  [{stage.key}] 已是最新，跳过")
+        return True
+
+    log_path = stage.outputs[0].parent / f"{stage.journal}.{stage.name}.log"
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    print(f"▶️  [{stage.key}] 运行中（日志: {log_path}）")
+
+    with NETWORK_LOCK if stage.exclusive else nullcontext():
+        t0 = time.perf_counter()
+        with log_path.open("w", encoding="utf-8") as log:
+            proc = subprocess.run(
+                [sys.executable, *stage.cmd],
+                cwd=SRC_DIR,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                env={**os.environ, "PYTHONIOENCODING": "utf-8"},
+            )
+        stage.wall_time = time.perf_counter() - t0
+
+    missing = [p for p in stage.outputs if not p.exists()]
+    if proc.returncode != 0 or missing:
+        stage.status = "failed"
+        why = f"退出码 {proc.returncode}" if proc.returncode != 0 else f"缺少输出 {missing}"
+        print(f"❌ [{stage.key}] 失败（{why}），见 {log_path}")
+        return False
+
+    stage.status = "done"
+    state.put(stage.key, {
+        "fingerprint": fingerprint,
+        "outputs": {str(p): fp.path_hash(p) for p in stage.outputs},
+        "wall_time": round(stage.wall_time, 3),
+        "finished_at": int(time.time()),
+    })
+    print(f"✅ [{stage.key}] 完成，用时 {stage.wall_time:.1f}s")
+    return True
+
+
+def run_journal(journal: Journal, fp: Fingerprinter, state: PipelineState, force: bool) -> None:
+    for stage in journal.stages:
+        if not run_stage(stage, fp, state, force):
+            break  # 下游全部不跑
+
+
+def print_report(journals: List[Journal], total: float) -> None:
+    print("\n===== 各阶段用时 =====")
+    print(f"{'期刊':<24}{'阶段':<10}{'状态':<10}{'用时(s)':>10}")
+    for j in journals:
+        for st in j.stages:
+            t = f"{st.wall_time:.1f}" if st.wall_time is not None else "-"
+            print(f"{j.name:<24}{st.name:<10}{st.status:<10}{t:>10}")
+    print(f"总用时: {total:.1f}s")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="parse → fix → clarify → ror → plot 增量运行器")
+    ap.add_argument("journals", nargs="*", help="期刊目录页 HTML 所在目录（默认自动发现）")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="并行的期刊数")
+    ap.add_argument("--format", choices=["csv", "parquet"], default="csv", help="中间结果格式")
+    ap.add_argument("--skip", action="append", default=[], choices=STAGE_NAMES,
+                    help="跳过某阶段（可多次），例如 --skip fix")
+    ap.add_argument("--force", action="store_true", help="忽略指纹，全部重跑")
+    ap.add_argument("--ror-pkl", default=DEFAULT_ROR_PKL)
+    args = ap.parse_args(argv)
+    args.skip = expand_skip(args.skip)
+
+    dirs = [Path(d).resolve() for d in args.journals] or discover_journals()
+    if not dirs:
+        print("⚠️ 没有找到任何期刊目录。")
+        return 1
+
+    journals = [build_journal(d, args.format, args.ror_pkl, args.skip) for d in dirs]
+    state = PipelineState(STATE_FILE)
+    fp = Fingerprinter(state.data["hash_cache"], state.lock)
+
+    print(f"🔧 {len(journals)} 个期刊，并行度 {args.jobs}")
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as ex:
+        list(ex.map(lambda j: run_journal(j, fp, state, args.force), journals))
+    merged = build_merged_plot(journals, args.format) if "plot" not in args.skip else None
+    if merged is not None:
+        run_journal(merged, fp, state, args.force)
+        journals.append(merged)
+    with state.lock:
+        state.save_locked()  # 顺带保存哈希缓存
+
+    print_report(journals, time.perf_counter() - t0)
+    failed = any(st.status == "failed" for j in journals for st in j.stages)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,12 @@
+"""
+statistics/ 下的脚本是直接运行的（python statistics/xxx.py），sys.path 里只有 statistics/ 本身。
+import 一下本模块就把 src/ 也加进去，之后可以 import backgroundcheck.* / crawler.*：
+
+    import _paths  # noqa: F401
+"""
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parents[1]
+if str(SRC_DIR) not in sys.path:
+    sys.path.append(str(SRC_DIR))
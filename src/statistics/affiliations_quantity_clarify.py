@@ -1,21 +1,32 @@
 
 
 from __future__ import annotations
-import pandas as pd
+import argparse
 import re
+import time
+
+import numpy as np
+import pandas as pd
+
+import _paths  # noqa: F401  把 src/ 加进 sys.path
+
+from backgroundcheck.table_io import read_table, write_table
 
 # ======== 配置区：根据需要修改 ========
+# 输入 / 输出可以是 .csv 或 .parquet（按后缀自动选择格式）
 INPUT_CSV = "E:/SSRNPaperResearch/data/Biorn/result/Bio_law_with_fixed_affil11.csv"
 OUTPUT_CSV = "E:/SSRNPaperResearch/data/Biorn/result/Bio_law_clarify11.csv"
 
 AUTH_COL = "authors"        # 作者列名（用分号 ; 分隔）
 AFFIL_COL = "affiliations"  # 机构列名（用逗号 , 分隔）
-ENCODING = "utf-8-sig"
 # ===================================
 
 
 AND_PATTERN = re.compile(r"\band\b", re.IGNORECASE)
 
+# Python 的 str.strip() 认、但 Arrow(RE2) 的 \s 不认的空白字符；含这些字符的行走逐行逻辑
+ODD_WHITESPACE_RE = "[\x0b\x1c-\x1f\x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]"
+
 
 def split_authors_field(text: str) -> list[str]:
     """
@@ -136,85 +147,135 @@ def replace_last_comma_with_dash(text: str) -> str:
     return s[:pos] + " -" + s[pos + 1:]
 
 
-def main() -> None:
-    print(f"读取 CSV: {INPUT_CSV}")
-    df = pd.read_csv(INPUT_CSV, encoding=ENCODING)
+def clarify_row(authors_raw, affil_raw) -> tuple[str, str, bool]:
+    """
+    单行修复（原 main 里逐行的逻辑）。
+    返回：(新的 affiliations 字符串, mark, 是否发生了修改)
+    """
+    authors = split_authors_field(authors_raw)
+    base_affil_str = affil_raw
 
-    if AUTH_COL not in df.columns or AFFIL_COL not in df.columns:
-        raise ValueError(f"CSV 中必须包含列 '{AUTH_COL}' 和 '{AFFIL_COL}'")
+    # 对于每一行，允许最多两轮“最后逗号替换为 ' -'”的修复尝试
+    attempts = 0
+    final_mark = ""
+    final_affils = None
+
+    while attempts <= 2:
+        affils = split_affil_field(base_affil_str)
+        new_affils, mark = try_fix_last_affil_with_and(authors, affils)
+
+        # 情况一：不是 mismatch_no_and，直接接受（包括 ""、其他 mark）
+        if mark != "mismatch_no_and":
+            final_mark = mark
+            final_affils = new_affils
+            break
+
+        # 情况二：是 mismatch_no_and，执行“最后一个逗号替换为 ' -'”逻辑
+        #        然后再循环一次（最多两次）
+        base_affil_str_prev = base_affil_str
+        base_affil_str = replace_last_comma_with_dash(base_affil_str)
+
+        # 如果替换前后没有变化，说明没有逗号可替换，结束循环
+        if base_affil_str == base_affil_str_prev:
+            final_mark = mark
+            final_affils = new_affils
+            break
+
+        attempts += 1
 
+        # 替换后会再次进入 while，重新 split_affil_field + try_fix...
+
+    # 防御：如果 while 正常结束但 final_affils 还没被赋值，就用当前 affils
+    if final_affils is None:
+        final_affils = split_affil_field(base_affil_str)
+
+    changed = final_affils != split_affil_field(affil_raw)
+    return join_affil_field(final_affils), final_mark, changed
+
+
+def clarify_rowwise(df: pd.DataFrame) -> tuple[list[str], list[str], int]:
+    """逐行版本（参照实现，bench_clarify.py 用它做一致性校验）。"""
     new_affil_col: list[str] = []
     marks: list[str] = []
-
-    total_rows = len(df)
     fixed_count = 0
-    has_mark_count = 0
+    for authors_raw, affil_raw in zip(df[AUTH_COL], df[AFFIL_COL]):
+        new_affil, mark, changed = clarify_row(authors_raw, affil_raw)
+        new_affil_col.append(new_affil)
+        marks.append(mark)
+        fixed_count += changed
+    return new_affil_col, marks, fixed_count
 
-    for idx, row in df.iterrows():
-        authors = split_authors_field(row[AUTH_COL])
-        base_affil_str = row[AFFIL_COL]
 
-        # 对于每一行，允许最多两轮“最后逗号替换为 ' -'”的修复尝试
-        attempts = 0
-        final_mark = ""
-        final_affils = None
+def _count_parts(s: pd.Series, sep: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    向量化统计每行按 sep 拆分后的片段数。
+    返回 (片段数, 是否可信)：有空片段（如 "a,,b" / 结尾逗号）或特殊空白的行不可信，交给逐行逻辑。
+    """
+    blank = (s.str.strip() == "").to_numpy()
+    has_empty = s.str.contains(rf"(?:^|{sep})\s*(?:{sep}|$)", regex=True).to_numpy()
+    odd_ws = s.str.contains(ODD_WHITESPACE_RE, regex=True).to_numpy()
+    n = np.where(blank, 0, s.str.count(sep).to_numpy() + 1)
+    return n, (blank | ~has_empty) & ~odd_ws
 
-        while attempts <= 2:
-            affils = split_affil_field(base_affil_str)
-            new_affils, mark = try_fix_last_affil_with_and(authors, affils)
 
-            # 情况一：不是 mismatch_no_and，直接接受（包括 ""、其他 mark）
-            if mark != "mismatch_no_and":
-                final_mark = mark
-                final_affils = new_affils
-                break
+def clarify_frame(df: pd.DataFrame) -> tuple[list[str], list[str], int]:
+    """
+    批量版本，结果与 clarify_rowwise 完全一致：
+      1. 用向量化字符串操作算出每行作者数 / 机构数
+      2. 数量一致、且没有空片段的行（绝大多数）：只需把逗号两侧空白规整成 ", "
+      3. 其余行（数量不一致 / 有空片段 / 特殊空白）才逐行走 clarify_row
+    返回：(新的 affiliations 列, mark 列, 发生修改的行数)
+    """
+    authors_raw = df[AUTH_COL].to_numpy(dtype=object)
+    affil_raw = df[AFFIL_COL].to_numpy(dtype=object)
 
-            # 情况二：是 mismatch_no_and，执行“最后一个逗号替换为 ' -'”逻辑
-            #        然后再循环一次（最多两次）
-            base_affil_str_prev = base_affil_str
-            base_affil_str = replace_last_comma_with_dash(base_affil_str)
+    auth_s = df[AUTH_COL].fillna("").astype(str)
+    affil_s = df[AFFIL_COL].fillna("").astype(str)
 
-            # 如果替换前后没有变化，说明没有逗号可替换，结束循环
-            if base_affil_str == base_affil_str_prev:
-                final_mark = mark
-                final_affils = new_affils
-                break
+    n_auth, auth_ok = _count_parts(auth_s, ";")
+    n_affil, affil_ok = _count_parts(affil_s, ",")
+    simple = auth_ok & affil_ok & (n_auth == n_affil)
 
-            attempts += 1
+    new_affil = affil_s.str.replace(r"\s*,\s*", ", ", regex=True).str.strip().to_numpy(dtype=object)
+    marks = np.full(len(df), "", dtype=object)
+    fixed_count = 0
 
-            # 替换后会再次进入 while，重新 split_affil_field + try_fix...
+    for pos in np.flatnonzero(~simple):
+        new_affil[pos], marks[pos], changed = clarify_row(authors_raw[pos], affil_raw[pos])
+        fixed_count += changed
 
-        # 防御：如果 while 正常结束但 final_affils 还没被赋值，就用当前 affils
-        if final_affils is None:
-            final_affils = split_affil_field(base_affil_str)
+    return new_affil.tolist(), marks.tolist(), fixed_count
 
-        # 统计：是否发生了修改
-        original_affils = split_affil_field(row[AFFIL_COL])
-        if final_affils != original_affils:
-            fixed_count += 1
 
-        if final_mark:
-            has_mark_count += 1
+def main(input_csv: str = INPUT_CSV, output_csv: str = OUTPUT_CSV) -> None:
+    print(f"读取 CSV: {input_csv}")
+    df = read_table(input_csv)
 
-        new_affil_str = join_affil_field(final_affils)
-        new_affil_col.append(new_affil_str)
-        marks.append(final_mark)
+    if AUTH_COL not in df.columns or AFFIL_COL not in df.columns:
+        raise ValueError(f"CSV 中必须包含列 '{AUTH_COL}' 和 '{AFFIL_COL}'")
 
-        if idx % 500 == 0:
-            print(f"  已处理 {idx} / {total_rows} 行...")
+    total_rows = len(df)
+    t0 = time.perf_counter()
+    new_affil_col, marks, fixed_count = clarify_frame(df)
+    elapsed = time.perf_counter() - t0
+    has_mark_count = sum(1 for m in marks if m)
 
     # 覆盖原来的 affiliations 列
     df[AFFIL_COL] = new_affil_col
     # 保留一个 mark 列方便你后面筛查
     df["mark"] = marks
 
-    print(f"总行数: {total_rows}")
+    print(f"总行数: {total_rows}（用时 {elapsed:.2f}s）")
     print(f"  自动修改（包括 and 拆分 / 逗号合并）的行数: {fixed_count}")
     print(f"  有 mark 需要关注的行数: {has_mark_count}")
 
-    df.to_csv(OUTPUT_CSV, index=False, encoding=ENCODING)
-    print(f"已保存到: {OUTPUT_CSV}")
+    write_table(df, output_csv)
+    print(f"已保存到: {output_csv}")
 
 
 if __name__ == "__main__":
-    main()
+    ap = argparse.ArgumentParser(description="核对作者数与机构数，尝试修复最后一个机构")
+    ap.add_argument("--input", default=INPUT_CSV)
+    ap.add_argument("--output", default=OUTPUT_CSV)
+    args = ap.parse_args()
+    main(args.input, args.output)
@@ -0,0 +1,110 @@
+"""
+affiliations_quantity_clarify 的一致性校验 + 吞吐对比：
+逐行参照实现 clarify_rowwise vs 批量实现 clarify_frame。
+
+Usage:
+    python bench_clarify.py <input.csv|input.parquet>
+    python bench_clarify.py --synthetic 200000
+
+批量结果与 clarify_row 逐行结果（iterrows 与 clarify_rowwise 两种走法）有任何一行不一致时退出码为 1，
+改 clarify_frame / clarify_row 之后可以当一致性检查跑。
+"""
+from __future__ import annotations
+import argparse
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+from affiliations_quantity_clarify import (
+    AUTH_COL, AFFIL_COL, clarify_row, clarify_rowwise, clarify_frame, read_table,
+)
+
+_INSTS = [
+    "Harvard University", "University of Oxford", "MIT", "Tsinghua University",
+    "Affiliation not provided to SSRN", "Independent", "Stanford University - Law School",
+    "Peking University and Fudan University", "ETH Zurich", "University of Tokyo",
+]
+
+
+# 合成数据里固定带上的边界行：空值、纯空白、空片段、结尾逗号、特殊空白、and 连接、作者为空
+_EDGE_ROWS = [
+    ("A;B", np.nan), (np.nan, "Harvard University"), (np.nan, np.nan), ("", ""), ("A", "   "),
+    ("A;B", "Harvard University,,MIT"), ("A;B", "Harvard University, MIT,"), ("A;B", ",Harvard University"),
+    ("A;B", "Harvard University,\u00a0MIT"), ("A;B", "Harvard University\tand MIT"),
+    ("A;B;C", "Harvard University, Oxford and MIT"), ("A;B", "Harvard University and MIT and ETH Zurich"),
+    ("A; ;B", "Harvard University, MIT"), ("A;B", "Harvard University, Law School, MIT"),
+    ("A", "Harvard University and MIT, Stanford"), (" A ; B ", "  Harvard University ,MIT  "),
+]
+
+
+def synthetic_frame(n: int, seed: int = 0) -> pd.DataFrame:
+    """造一批带各种毛病的行：数量不一致、and 连接、空片段、多余空白、NaN（另加 _EDGE_ROWS）。"""
+    rng = random.Random(seed)
+    authors = [a for a, _ in _EDGE_ROWS]
+    affils = [f for _, f in _EDGE_ROWS]
+    for _ in range(n):
+        k = rng.randint(1, 4)
+        authors.append(";".join(f"Author {rng.randint(1, 999)}" for _ in range(k)))
+
+        parts = [rng.choice(_INSTS) for _ in range(k)]
+        r = rng.random()
+        if r < 0.05 and k > 1:
+            parts = parts[:-2] + [f"{parts[-2]} and {parts[-1]}"]
+        elif r < 0.07:
+            parts.append("Department of Economics")
+        elif r < 0.08:
+            parts.insert(rng.randrange(len(parts) + 1), " ")
+        elif r < 0.09:
+            affils.append(np.nan)
+            continue
+        sep = rng.choice([", ", ", ", ",", " , "])
+        affils.append(sep.join(parts) + ("," if rng.random() < 0.02 else ""))
+    return pd.DataFrame({AUTH_COL: authors, AFFIL_COL: affils})
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="clarify 批量实现的一致性校验与吞吐对比")
+    ap.add_argument("input", nargs="?", help="CSV / parquet 输入")
+    ap.add_argument("--synthetic", type=int, default=0, help="不给输入时生成多少行合成数据")
+    args = ap.parse_args()
+
+    if args.input:
+        df = read_table(args.input)
+    else:
+        df = synthetic_frame(args.synthetic or 100_000)
+    n = len(df)
+
+    # 改造前 main 的做法：iterrows 逐行（结果也参与比对）
+    t0 = time.perf_counter()
+    iter_rows = [clarify_row(row[AUTH_COL], row[AFFIL_COL]) for _, row in df.iterrows()]
+    t_iter = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    ref = clarify_rowwise(df)
+    t_ref = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    got = clarify_frame(df)
+    t_new = time.perf_counter() - t0
+
+    bad = [
+        i for i in range(n)
+        if ref[0][i] != got[0][i] or ref[1][i] != got[1][i] or iter_rows[i][:2] != (got[0][i], got[1][i])
+    ]
+    iter_fixed = sum(changed for _, _, changed in iter_rows)
+    print(f"行数: {n}")
+    print(f"  iterrows（改造前）: {t_iter:.2f}s（{n / t_iter:,.0f} 行/秒）")
+    print(f"  逐行: {t_ref:.2f}s（{n / t_ref:,.0f} 行/秒）")
+    print(f"  批量: {t_new:.2f}s（{n / t_new:,.0f} 行/秒），相对 iterrows {t_iter / t_new:.1f}x")
+    print(f"  修改行数: iterrows {iter_fixed} / 逐行 {ref[2]} / 批量 {got[2]}")
+    if bad or not iter_fixed == ref[2] == got[2]:
+        for i in bad[:10]:
+            print(f"  !! 第 {i} 行不一致: {ref[0][i]!r}/{ref[1][i]!r} vs {got[0][i]!r}/{got[1][i]!r}")
+        raise SystemExit(f"❌ 不一致 {len(bad)} 行（修改行数 {iter_fixed} / {ref[2]} / {got[2]}）")
+    print("✅ affiliations 与 mark 完全一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+详情页机构解析的微基准：老的整页逐行扫描 vs 现在的选择器提取（ssrn_detail）。
+
+输入可以是保存详情页 .html 的目录，也可以是 fix_unavailable_affiliation
+的结果缓存（*.fixcache.sqlite，里面存了原始 HTML）。作者列表取自页面作者块。
+
+Usage: python bench_detail_parse.py <dir | cache.sqlite> [--repeat N] [--limit N]
+"""
+from __future__ import annotations
+import argparse
+import statistics as _stats  # 注意：本目录名也叫 statistics，这里是标准库
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from bs4 import BeautifulSoup
+
+from html_parsers import read_html_text
+from ssrn_detail import extract_author_blocks, normalize, parse_affiliations_from_html
+
+
+def legacy_parse_affiliations_from_html(html: str, authors: List[str]) -> Optional[str]:
+    """改造前的实现（原样保留，作为基准）：每行在嵌套循环里反复 normalize。"""
+    if not html or not authors:
+        return None
+
+    soup = BeautifulSoup(html, "lxml")
+    text = soup.get_text("\n", strip=True)
+
+    lines = [ln.strip() for ln in text.splitlines()]
+    lines = [ln for ln in lines if ln]
+    if not lines:
+        return None
+
+    norm_authors = [normalize(a) for a in authors]
+    first_author_norm = norm_authors[0]
+
+    start_idx = None
+    for i, ln in enumerate(lines):
+        if normalize(ln) == first_author_norm:
+            start_idx = i
+            break
+    if start_idx is None:
+        for i, ln in enumerate(lines):
+            if first_author_norm in normalize(ln):
+                start_idx = i
+                break
+    if start_idx is None:
+        return None
+
+    lines_after = lines[start_idx:]
+
+    collected_affils: List[str] = []
+    i = 0
+    while i < len(lines_after):
+        ln = lines_after[i]
+        n_ln = normalize(ln)
+
+        if n_ln in norm_authors:
+            j = i + 1
+            aff_lines = []
+            while j < len(lines_after):
+                ln2 = lines_after[j]
+                n_ln2 = normalize(ln2)
+
+                if n_ln2 in norm_authors:
+                    break
+                if "date written" in n_ln2 or n_ln2.startswith("abstract"):
+                    break
+                if n_ln2.startswith("journal of ") or "pages posted" in n_ln2:
+                    j += 1
+                    continue
+
+                aff_lines.append(ln2)
+                j += 1
+
+            aff = " ".join(aff_lines).strip()
+            if aff:
+                collected_affils.append(aff)
+            i = j
+        else:
+            i += 1
+
+    if not collected_affils:
+        return None
+
+    seen = set()
+    uniq = []
+    for a in collected_affils:
+        if a not in seen:
+            seen.add(a)
+            uniq.append(a)
+    return "; ".join(uniq)
+
+
+def load_pages(src: str, limit: Optional[int]) -> List[Tuple[str, str]]:
+    """返回 [(名字, html), ...]"""
+    p = Path(src)
+    pages: List[Tuple[str, str]] = []
+    if p.is_dir():
+        for f in sorted(p.rglob("*.html")):
+            pages.append((f.name, read_html_text(f)))
+            if limit and len(pages) >= limit:
+                break
+    else:
+        from fix_cache import FixCache
+        with FixCache(str(p)) as cache:
+            for aid, html in cache.iter_html():
+                pages.append((aid, html))
+                if limit and len(pages) >= limit:
+                    break
+    return pages
+
+
+def time_per_page(fn: Callable[[str, List[str]], Optional[str]],
+                  cases: List[Tuple[str, List[str]]], repeat: int) -> List[float]:
+    out = []
+    for html, authors in cases:
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn(html, authors)
+            best = min(best, time.perf_counter() - t0)
+        out.append(best)
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("source", help="详情页 .html 目录，或 *.fixcache.sqlite")
+    ap.add_argument("--repeat", type=int, default=3, help="每页重复次数（取最快一次）")
+    ap.add_argument("--limit", type=int, default=None, help="最多取多少页")
+    args = ap.parse_args()
+
+    cases: List[Tuple[str, List[str]]] = []
+    for _, html in load_pages(args.source, args.limit):
+        authors = [name for name, _ in extract_author_blocks(BeautifulSoup(html, "lxml"))]
+        if authors:
+            cases.append((html, authors))
+    if not cases:
+        raise SystemExit("没有可用的详情页（页面里找不到作者块）。")
+
+    same = sum(
+        legacy_parse_affiliations_from_html(h, a) == parse_affiliations_from_html(h, a)
+        for h, a in cases
+    )
+
+    old = time_per_page(legacy_parse_affiliations_from_html, cases, args.repeat)
+    new = time_per_page(parse_affiliations_from_html, cases, args.repeat)
+
+    def fmt(xs: List[float]) -> str:
+        return f"median {_stats.median(xs) * 1000:.2f} ms  mean {_stats.mean(xs) * 1000:.2f} ms"
+
+    print(f"页面数: {len(cases)}（结果与老实现一致: {same}/{len(cases)}）")
+    print(f"  老：逐行扫描   {fmt(old)}")
+    print(f"  新：选择器提取 {fmt(new)}")
+    print(f"  每页耗时下降: {(1 - sum(new) / sum(old)) * 100:.1f}%（{sum(old) / sum(new):.2f}x）")
+
+
+if __name__ == "__main__":
+    main()
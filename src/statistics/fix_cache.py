@@ -0,0 +1,102 @@
+"""
+fix_unavailable_affiliation 的持久化结果缓存（SQLite，按 abstract_id 一行）。
+
+每解析完一个详情页就立刻写入（连同 zlib 压缩后的原始 HTML），
+所以中途崩溃 / Ctrl+C 不会丢已抓到的结果：
+  - 重跑时 status='ok' 的 abstract_id 直接复用，不再访问 SSRN
+  - 'no_affil' / 'error' 的会重新抓取
+  - 保存的 HTML 可以离线重新解析（解析逻辑改进后不必重抓）
+"""
+from __future__ import annotations
+import sqlite3
+import time
+import zlib
+from typing import Dict, Iterator, Optional, Tuple
+
+STATUS_OK = "ok"              # 解析出了 affiliations
+STATUS_NO_AFFIL = "no_affil"  # 页面拿到了，但没解析出机构
+STATUS_ERROR = "error"        # 打开页面出错 / 超时
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS detail_results (
+    abstract_id  TEXT PRIMARY KEY,
+    status       TEXT NOT NULL,
+    affiliations TEXT,
+    error        TEXT,
+    html         BLOB,
+    fetched_at   REAL NOT NULL
+)
+"""
+
+
+class FixCache:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(_SCHEMA)
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "FixCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ----- 写 -----
+
+    def put(
+        self,
+        abstract_id: str,
+        status: str,
+        affiliations: Optional[str] = None,
+        html: Optional[str] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        """写入 / 覆盖一条结果并立即提交。html 为 None 时保留已有的 HTML。"""
+        blob = zlib.compress(html.encode("utf-8")) if html is not None else None
+        self.conn.execute(
+            """
+            INSERT INTO detail_results (abstract_id, status, affiliations, error, html, fetched_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(abstract_id) DO UPDATE SET
+                status = excluded.status,
+                affiliations = excluded.affiliations,
+                error = excluded.error,
+                html = COALESCE(excluded.html, detail_results.html),
+                fetched_at = excluded.fetched_at
+            """,
+            (str(abstract_id), status, affiliations, error, blob, time.time()),
+        )
+        self.conn.commit()
+
+    # ----- 读 -----
+
+    def resolved(self) -> Dict[str, str]:
+        """abstract_id -> affiliations（仅 status='ok'）"""
+        rows = self.conn.execute(
+            "SELECT abstract_id, affiliations FROM detail_results WHERE status = ?",
+            (STATUS_OK,),
+        )
+        return {aid: affil for aid, affil in rows}
+
+    def stored(self) -> Dict[str, Tuple[str, Optional[str]]]:
+        """abstract_id -> (status, affiliations)，所有行。"""
+        rows = self.conn.execute("SELECT abstract_id, status, affiliations FROM detail_results")
+        return {aid: (status, affil) for aid, status, affil in rows}
+
+    def iter_html(self) -> Iterator[Tuple[str, str]]:
+        """遍历所有保存了 HTML 的 (abstract_id, html)，用于离线重新解析。"""
+        rows = self.conn.execute(
+            "SELECT abstract_id, html FROM detail_results WHERE html IS NOT NULL"
+        )
+        for aid, blob in rows.fetchall():
+            yield aid, zlib.decompress(blob).decode("utf-8")
+
+    def counts(self) -> Dict[str, int]:
+        rows = self.conn.execute("SELECT status, COUNT(*) FROM detail_results GROUP BY status")
+        return {status: n for status, n in rows}
@@ -1,15 +1,25 @@
 #INPUT_CSV = "E:/SSRNPaperResearch/data/Biorn/result/Bio_law.csv"
 #OUTPUT_CSV = "E:/SSRNPaperResearch/data/Biorn/result/Bio_law_with_fixed_affil.csv"
+import argparse
 import asyncio
+import os
 import re
 import time
 import random
+from pathlib import Path
 
 import pandas as pd
-from bs4 import BeautifulSoup
-from playwright.async_api import async_playwright
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+
+import _paths  # noqa: F401  把 src/ 加进 sys.path
+
+from backgroundcheck.table_io import read_table, write_table
+from crawler.config import COOKIE_FILE, USER_AGENTS
+from fix_cache import FixCache, STATUS_OK, STATUS_NO_AFFIL, STATUS_ERROR
+from ssrn_detail import parse_affiliations_from_html
 
 # ===== 基本配置 =====
+# 输入 / 输出可以是 .csv 或 .parquet（按后缀自动选择格式）
 INPUT_CSV = "E:/SSRNPaperResearch/data/Biorn/result/Bio_law_with_fixed_affil.csv"
 OUTPUT_CSV = "E:/SSRNPaperResearch/data/Biorn/result/Bio_law_with_fixed_affil11.csv"
 
@@ -19,13 +29,21 @@ COL_AFFIL = "affiliations"
 
 BASE_URL = "https://papers.ssrn.com/sol3/papers.cfm?abstract_id={}"
 
+# ===== 并发 / 节流 =====
+CONCURRENCY = 3                  # 同时打开的详情页数量
+PACE_RANGE = (1.0, 2.5)          # 所有页面共享：相邻两次请求之间的随机间隔（秒）
+HEADLESS = True                  # 有 COOKIE_FILE 时可无人值守；没有时会强制弹出浏览器手动登录
+
+# 详情页作者块出现即可解析（代替固定 wait_for_timeout）
+DETAIL_SELECTOR = "div.authors h2, div.authors a"
+DETAIL_WAIT_MS = 15_000
+
 
 # ===== 工具函数 =====
 
-def normalize(s: str) -> str:
-    s = s or ""
-    s = re.sub(r"\s+", " ", s.strip())
-    return s.lower()
+def cache_db_for(output_csv: str) -> str:
+    """结果缓存放在输出旁边：每个 abstract_id 的抓取结果 + 原始 HTML，边抓边写；重跑时跳过已成功的。"""
+    return str(Path(output_csv).with_suffix(".fixcache.sqlite"))
 
 
 def split_authors(authors_str: str) -> list[str]:
@@ -74,173 +92,240 @@ def is_bad_affiliation(affil) -> bool:
 
 
 
-def parse_affiliations_from_html(html: str, authors: list[str]) -> str | None:
-    """从整页 HTML 文本里，根据作者行去找机构行。"""
-    if not html or not authors:
-        return None
-
-    soup = BeautifulSoup(html, "lxml")
-    text = soup.get_text("\n", strip=True)
-
-    lines = [ln.strip() for ln in text.splitlines()]
-    lines = [ln for ln in lines if ln]
-    if not lines:
-        return None
-
-    norm_authors = [normalize(a) for a in authors]
-    first_author_norm = norm_authors[0]
-
-    # 找到第一个作者出现的位置
-    start_idx = None
-    for i, ln in enumerate(lines):
-        if normalize(ln) == first_author_norm:
-            start_idx = i
-            break
-    if start_idx is None:
-        # 放宽一点：包含完整名字也算
-        for i, ln in enumerate(lines):
-            if first_author_norm in normalize(ln):
-                start_idx = i
-                break
-    if start_idx is None:
-        print("    !! 在页面中找不到第一个作者名")
-        return None
-
-    lines_after = lines[start_idx:]
-
-    collected_affils: list[str] = []
-    i = 0
-    while i < len(lines_after):
-        ln = lines_after[i]
-        n_ln = normalize(ln)
-
-        if n_ln in norm_authors:
-            j = i + 1
-            aff_lines = []
-            while j < len(lines_after):
-                ln2 = lines_after[j]
-                n_ln2 = normalize(ln2)
-
-                if n_ln2 in norm_authors:
-                    break
-                if "date written" in n_ln2 or n_ln2.startswith("abstract"):
-                    break
-
-                # 可选：略过明显是期刊信息的行
-                if n_ln2.startswith("journal of ") or "pages posted" in n_ln2:
-                    j += 1
-                    continue
-
-                aff_lines.append(ln2)
-                j += 1
-
-            aff = " ".join(aff_lines).strip()
-            if aff:
-                collected_affils.append(aff)
-            i = j
-        else:
-            i += 1
-
-    if not collected_affils:
-        return None
-
-    # 去重 + 保序
-    seen = set()
-    uniq = []
-    for a in collected_affils:
-        if a not in seen:
-            seen.add(a)
-            uniq.append(a)
-
-    return "; ".join(uniq)
-
-
 # ===== 主流程（异步） =====
 
-async def main_async():
-    df = pd.read_csv(INPUT_CSV, encoding="utf-8-sig")
-    print(f"读取到 {len(df)} 行数据")
-
-    # 找出需要修补的行索引
-    bad_indices: list[int] = []
-    for idx, row in df.iterrows():
-        affil = row.get(COL_AFFIL, "")
-        if is_bad_affiliation(affil):
-            bad_indices.append(idx)
-
-    print(f"共发现 {len(bad_indices)} 行 affiliations 需要修补。")
-
-    if not bad_indices:
-        print("没有需要修补的行，结束。")
-        return
-
-    fixed_count = 0
-    error_count = 0
-
-    async with async_playwright() as p:
-        # 你可以改成 p.firefox / p.webkit
-        browser = await p.chromium.launch(headless=False, slow_mo=200)
-        context = await browser.new_context()
-        page = await context.new_page()
+class Pacer:
+    """
+    所有 worker 共享的节流器：
+    保证相邻两次请求的开始时间至少间隔 random.uniform(*PACE_RANGE) 秒，
+    并发只用来重叠页面加载时间，对 SSRN 的总请求速率不变。
+    """
 
-        # 先让你在这个浏览器里登录一次 SSRN
-        print("正在打开 SSRN 首页，请在弹出的浏览器中手动登录（如有需要）...")
-        await page.goto("https://www.ssrn.com/index.cfm/en/", wait_until="domcontentloaded")
-        input("登录完成后，在终端按 Enter 继续...")
+    def __init__(self, pace_range: tuple[float, float]) -> None:
+        self.pace_range = pace_range
+        self._lock = asyncio.Lock()
+        self._next_at = 0.0
+
+    async def wait(self) -> None:
+        async with self._lock:
+            delay = self._next_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_at = time.monotonic() + random.uniform(*self.pace_range)
+
+
+async def fetch_detail_html(page, url: str) -> str:
+    """打开详情页，等作者块出现（超时也照样取 HTML，交给解析器判断）。"""
+    await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+    try:
+        await page.wait_for_selector(DETAIL_SELECTOR, state="attached", timeout=DETAIL_WAIT_MS)
+    except PlaywrightTimeoutError:
+        print(f"  !! {DETAIL_WAIT_MS} ms 内未等到作者块：{url}")
+    return await page.content()
+
+
+async def fix_worker(
+    wid: int,
+    context,
+    queue: "asyncio.Queue[int]",
+    pacer: Pacer,
+    df: pd.DataFrame,
+    cache: FixCache,
+    stats: dict,
+) -> None:
+    """
+    从队列里取行号，逐个打开详情页解析 affiliations。
+    每页结果（含 HTML）立刻写进 cache；df 在最后统一合并。
+    """
+    page = await context.new_page()
+    try:
+        while True:
+            try:
+                idx = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
 
-        for idx in bad_indices:
             human_row = idx + 2  # Excel 中的数据行号（第1行为表头）
             abstract_id = str(df.at[idx, COL_ABSTRACT_ID])
-            authors_str = df.at[idx, COL_AUTHORS]
-            authors = split_authors(authors_str)
+            authors = split_authors(df.at[idx, COL_AUTHORS])
+            tag = f"[w{wid}] 第 {human_row} 行 (abstract_id={abstract_id})"
 
             if not authors:
-                print(f"\n=== 第 {human_row} 行 abstract_id={abstract_id}：authors 为空，跳过 ===")
+                print(f"{tag}：authors 为空，跳过")
                 continue
 
-            old_affil = df.at[idx, COL_AFFIL]
-            print(f"\n=== 修补第 {human_row} 行 (abstract_id={abstract_id}) ===")
-            print(f"  原 affiliations: {old_affil!r}")
-
             url = BASE_URL.format(abstract_id)
             try:
-                print(f"  -> 打开页面 {url}")
-                await page.goto(url, wait_until="domcontentloaded", timeout=60000)
-
-                # 稍微等一等，防止还在异步加载
-                await page.wait_for_timeout(2000)
-
-                html = await page.content()
+                await pacer.wait()
+                html = await fetch_detail_html(page, url)
 
                 new_affil = parse_affiliations_from_html(html, authors)
                 if not new_affil:
-                    print("  !! 未能从页面解析出机构信息")
-                    error_count += 1
+                    print(f"{tag} !! 未能从页面解析出机构信息")
+                    cache.put(abstract_id, STATUS_NO_AFFIL, html=html)
+                    stats["error"] += 1
                 else:
-                    print(f"  新 affiliations: {new_affil!r}")
-                    df.at[idx, COL_AFFIL] = new_affil
-                    fixed_count += 1
+                    print(f"{tag} {df.at[idx, COL_AFFIL]!r} -> {new_affil!r}")
+                    cache.put(abstract_id, STATUS_OK, affiliations=new_affil, html=html)
+                    stats["fixed"] += 1
+            except Exception as e:
+                print(f"{tag} !! 出错: {e}")
+                cache.put(abstract_id, STATUS_ERROR, error=str(e))
+                stats["error"] += 1
+    finally:
+        try:
+            await page.close()
+        except Exception:
+            pass
 
-                # 对 SSRN 温柔一点，随机 sleep
-                sleep_s = 2 + random.random() * 3
-                print(f"  休息 {sleep_s:.1f} 秒...")
-                await page.wait_for_timeout(int(sleep_s * 1000))
 
-            except Exception as e:
-                print(f"  !! 处理 abstract_id={abstract_id} 时出错: {e}")
-                error_count += 1
+def find_bad_indices(df: pd.DataFrame) -> list[int]:
+    return [idx for idx, affil in df[COL_AFFIL].items() if is_bad_affiliation(affil)]
+
+
+def merge_cached_results(df: pd.DataFrame, indices: list[int], cache: FixCache) -> int:
+    """把 cache 里已成功的结果写回 df，返回合并的行数。"""
+    resolved = cache.resolved()
+    merged = 0
+    for idx in indices:
+        new_affil = resolved.get(str(df.at[idx, COL_ABSTRACT_ID]))
+        if new_affil:
+            df.at[idx, COL_AFFIL] = new_affil
+            merged += 1
+    return merged
+
+
+def reparse_cached_html(df: pd.DataFrame, cache: FixCache) -> dict:
+    """
+    离线模式：用当前的 parse_affiliations_from_html 重新解析 cache 里保存的 HTML。
+    已经是 ok 的行，新解析器解析不出机构时保持原样（记为 reparse_failed），
+    免得解析器改坏了把之前的好结果覆盖掉。
+    """
+    authors_by_id = {
+        str(aid): split_authors(authors)
+        for aid, authors in zip(df[COL_ABSTRACT_ID], df[COL_AUTHORS])
+    }
+    stored = cache.stored()
+    stats = {"changed": 0, "unchanged": 0, "reparse_failed": 0}
+    for aid, html in cache.iter_html():
+        authors = authors_by_id.get(aid)
+        if not authors:
+            continue
+        status, old_affil = stored.get(aid, (None, None))
+        new_affil = parse_affiliations_from_html(html, authors)
+        if new_affil:
+            if status == STATUS_OK and old_affil == new_affil:
+                stats["unchanged"] += 1
+            else:
+                cache.put(aid, STATUS_OK, affiliations=new_affil)
+                stats["changed"] += 1
+        elif status == STATUS_OK:
+            stats["reparse_failed"] += 1
+        elif status != STATUS_NO_AFFIL:
+            cache.put(aid, STATUS_NO_AFFIL)
+    return stats
+
+
+async def fetch_missing(df: pd.DataFrame, indices: list[int], cache: FixCache) -> dict:
+    """并发抓取 indices 对应的详情页，结果写进 cache。"""
+    stats = {"fixed": 0, "error": 0}
+    queue: "asyncio.Queue[int]" = asyncio.Queue()
+    for idx in indices:
+        queue.put_nowait(idx)
+
+    has_cookies = os.path.exists(COOKIE_FILE)
+
+    async with async_playwright() as p:
+        # 没有已保存的登录态时必须弹出浏览器让你手动登录
+        browser = await p.chromium.launch(headless=HEADLESS and has_cookies)
+        context = await browser.new_context(
+            storage_state=COOKIE_FILE if has_cookies else None,
+            user_agent=random.choice(USER_AGENTS),
+        )
+
+        if has_cookies:
+            print(f"使用爬虫保存的登录态: {COOKIE_FILE}")
+        else:
+            page = await context.new_page()
+            print("未找到 COOKIE_FILE，正在打开 SSRN 首页，请在弹出的浏览器中手动登录...")
+            await page.goto("https://www.ssrn.com/index.cfm/en/", wait_until="domcontentloaded")
+            input("登录完成后，在终端按 Enter 继续...")
+            await context.storage_state(path=COOKIE_FILE)
+            await page.close()
+
+        pacer = Pacer(PACE_RANGE)
+        n_workers = max(1, min(CONCURRENCY, len(indices)))
+        print(f"启动 {n_workers} 个并发页面，请求间隔 {PACE_RANGE[0]}~{PACE_RANGE[1]} 秒")
+        try:
+            await asyncio.gather(*(
+                fix_worker(i + 1, context, queue, pacer, df, cache, stats)
+                for i in range(n_workers)
+            ))
+            await context.storage_state(path=COOKIE_FILE)
+        finally:
+            await browser.close()
+
+    return stats
+
+
+async def main_async(
+    reparse: bool = False,
+    input_csv: str = INPUT_CSV,
+    output_csv: str = OUTPUT_CSV,
+):
+    cache_db = cache_db_for(output_csv)
+    df = read_table(input_csv)
+    print(f"读取到 {len(df)} 行数据")
 
-        await browser.close()
+    # 找出需要修补的行索引
+    bad_indices = find_bad_indices(df)
+    print(f"共发现 {len(bad_indices)} 行 affiliations 需要修补。")
 
-    print(f"\n修补完成：成功修补 {fixed_count} 行，出错 {error_count} 行。")
-    df.to_csv(OUTPUT_CSV, index=False, encoding="utf-8-sig")
-    print(f"结果已保存到 {OUTPUT_CSV}")
+    if not bad_indices:
+        print("没有需要修补的行，原样写出。")
+        write_table(df, output_csv)
+        return
+
+    with FixCache(cache_db) as cache:
+        print(f"结果缓存: {cache_db} {cache.counts()}")
+
+        if reparse:
+            stats = reparse_cached_html(df, cache)
+            print(f"离线重新解析完成：{stats['changed']} 个 abstract_id 的机构有变化，"
+                  f"{stats['unchanged']} 个不变。")
+            if stats["reparse_failed"]:
+                print(f"⚠️ {stats['reparse_failed']} 个原本成功的 abstract_id 这次解析不出机构，保留原结果。")
+        else:
+            # 已成功的直接复用；失败的 / 没抓过的重新抓
+            resolved = cache.resolved()
+            todo = [
+                idx for idx in bad_indices
+                if str(df.at[idx, COL_ABSTRACT_ID]) not in resolved
+            ]
+            print(f"缓存命中 {len(bad_indices) - len(todo)} 行，需要抓取 {len(todo)} 行。")
+
+            if todo:
+                t0 = time.perf_counter()
+                stats = await fetch_missing(df, todo, cache)
+                elapsed = time.perf_counter() - t0
+                print(f"\n抓取完成：成功 {stats['fixed']} 行，出错 {stats['error']} 行，用时 {elapsed:.0f} 秒。")
+
+        merged = merge_cached_results(df, bad_indices, cache)
+
+    print(f"\n修补完成：{len(bad_indices)} 行中成功修补 {merged} 行。")
+    write_table(df, output_csv)
+    print(f"结果已保存到 {output_csv}")
 
 
 def main():
-    asyncio.run(main_async())
+    ap = argparse.ArgumentParser(description="修补 affiliations 为空 / 以 and 或逗号开头的行")
+    ap.add_argument("--reparse", action="store_true",
+                    help="不联网，只用缓存里的 HTML 重新解析后合并输出")
+    ap.add_argument("--input", default=INPUT_CSV)
+    ap.add_argument("--output", default=OUTPUT_CSV)
+    args = ap.parse_args()
+    asyncio.run(main_async(reparse=args.reparse, input_csv=args.input, output_csv=args.output))
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,236 @@
+"""
+本地 HTML 解析的公共框架：
+
+  - 统一的读取 / 解码（utf-8 → charset_normalizer → latin-1）
+  - 解析器注册表：各来源（SSRN 目录页、Wiley TOC、SSRN 详情页 ...）
+    用 register_parser 注册 detect + extract，按 priority 依次探测
+  - 去重 / 写 CSV（或 Parquet，见 backgroundcheck.table_io）/ 汇总输出
+
+单目录脚本（just_affiliation_txt.py / readWiley.py）用 run_dir；
+整棵 data/ 一次遍历见 parse_all_sources.py。
+"""
+from __future__ import annotations
+import csv
+import re
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from bs4 import BeautifulSoup
+
+import _paths  # noqa: F401  把 src/ 加进 sys.path
+
+# Optional encoding detection (if installed)
+try:
+    from charset_normalizer import from_bytes as detect_from_bytes
+except Exception:
+    detect_from_bytes = None
+
+DELIM = ';'  # 多作者分隔（英文分号）
+
+
+def normalize_space(s: str) -> str:
+    return re.sub(r"\s+", " ", s or "").strip()
+
+
+def nfc(text: str) -> str:
+    return unicodedata.normalize('NFC', text)
+
+
+def decode_html_bytes(raw: bytes) -> str:
+    """Robustly decode HTML bytes with fallback decoding."""
+    try:
+        txt = raw.decode('utf-8')
+    except UnicodeDecodeError:
+        if detect_from_bytes is not None:
+            best = detect_from_bytes(raw).best()
+            txt = str(best) if best is not None else raw.decode('latin-1', errors='replace')
+        else:
+            txt = raw.decode('latin-1', errors='replace')
+    return nfc(txt)
+
+
+def read_html_text(path: Path) -> str:
+    return decode_html_bytes(path.read_bytes())
+
+
+def make_soup(html: str) -> BeautifulSoup:
+    try:
+        return BeautifulSoup(html, 'lxml')
+    except Exception:
+        return BeautifulSoup(html, 'html.parser')
+
+
+# ===== 解析器注册表 =====
+
+@dataclass(frozen=True)
+class HtmlParser:
+    name: str                                          # 例如 "ssrn_list"
+    detect: Callable[[str], bool]                      # 原始 HTML 文本 -> 是否属于该来源
+    extract: Callable[[BeautifulSoup, str], List[dict]]  # (soup, source_file) -> 记录列表
+    fieldnames: List[str]                              # 输出 CSV 列
+    key_field: str                                     # 去重键
+    priority: int = 100                                # 越小越先探测
+
+
+_REGISTRY: Dict[str, HtmlParser] = {}
+
+
+def register_parser(
+    name: str,
+    *,
+    detect: Callable[[str], bool],
+    fieldnames: List[str],
+    key_field: str,
+    priority: int = 100,
+):
+    """装饰器：把 extract(soup, source_file) 注册为名为 name 的解析器。"""
+    def deco(extract: Callable[[BeautifulSoup, str], List[dict]]):
+        _REGISTRY[name] = HtmlParser(
+            name=name,
+            detect=detect,
+            extract=extract,
+            fieldnames=list(fieldnames),
+            key_field=key_field,
+            priority=priority,
+        )
+        return extract
+    return deco
+
+
+def get_parser(name: str) -> HtmlParser:
+    try:
+        return _REGISTRY[name]
+    except KeyError:
+        raise KeyError(f"未注册的解析器: {name}（已注册: {sorted(_REGISTRY)}）") from None
+
+
+def registered_parsers() -> List[HtmlParser]:
+    return sorted(_REGISTRY.values(), key=lambda p: (p.priority, p.name))
+
+
+def detect_parser(html: str) -> Optional[HtmlParser]:
+    for parser in registered_parsers():
+        if parser.detect(html):
+            return parser
+    return None
+
+
+def parse_html(html: str, source_file: str, parser: Optional[HtmlParser] = None) -> Tuple[Optional[str], List[dict]]:
+    """
+    解析一页 HTML。parser 为 None 时按注册表自动探测。
+    返回 (解析器名 or None, 记录列表)。
+    """
+    if parser is None:
+        parser = detect_parser(html)
+        if parser is None:
+            return None, []
+    return parser.name, parser.extract(make_soup(html), source_file)
+
+
+# ===== 遍历 / 去重 / 输出 =====
+
+def iter_html_files(root: Path) -> List[Path]:
+    return sorted(root.rglob('*.html'))
+
+
+def result_csv_for(input_dir: Path, fmt: str = "csv") -> Path:
+    """<父目录>/result/<目录名>.csv（与单目录脚本的输出位置一致）；fmt="parquet" 时为 .parquet"""
+    result_dir = input_dir.parent / 'result'
+    result_dir.mkdir(parents=True, exist_ok=True)
+    suffix = ".parquet" if fmt == "parquet" else ".csv"
+    return result_dir / f"{input_dir.name}{suffix}"
+
+
+def dedup_rows(rows: List[dict], key_field: str) -> List[dict]:
+    """按 key_field 去重（保序；空键不参与去重）。"""
+    seen: Set[str] = set()
+    out: List[dict] = []
+    for r in rows:
+        key = (r.get(key_field) or '').strip()
+        if key and key in seen:
+            continue
+        if key:
+            seen.add(key)
+        out.append(r)
+    return out
+
+
+def write_rows_csv(rows: List[dict], out_csv: Path, fieldnames: List[str]) -> None:
+    with out_csv.open('w', newline='', encoding='utf-8-sig') as f:
+        w = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+        w.writeheader()
+        for r in rows:
+            # 统一 NFC & 去除多余空白
+            cleaned = {}
+            for k, v in r.items():
+                if isinstance(v, str):
+                    cleaned[k] = nfc(normalize_space(v))
+                else:
+                    cleaned[k] = v
+            w.writerow(cleaned)
+
+
+def write_rows(rows: List[dict], out_path: Path, fieldnames: List[str]) -> None:
+    """按后缀写出：.csv 走 csv 模块；.parquet 走 backgroundcheck.table_io。"""
+    from backgroundcheck.table_io import is_parquet, write_table
+
+    if not is_parquet(out_path):
+        write_rows_csv(rows, out_path, fieldnames)
+        return
+
+    import pandas as pd
+
+    cleaned = [
+        {k: (nfc(normalize_space(r.get(k))) if isinstance(r.get(k), str) else r.get(k)) for k in fieldnames}
+        for r in rows
+    ]
+    write_table(pd.DataFrame(cleaned, columns=fieldnames), out_path)
+
+
+def print_summary(total_rows: int, dedup_count: int, key_field: str) -> None:
+    print("\n===== 统计汇总 =====")
+    print(f"📄 原始解析记录总数：{total_rows}")
+    print(f"🧹 按 {key_field} 去重后输出记录数：{dedup_count}")
+    if total_rows > 0:
+        dup_num = total_rows - dedup_count
+        rate = dup_num / total_rows * 100
+        print(f"🔁 重复条数：{dup_num}（约 {rate:.2f}%）")
+
+
+def run_dir(input_dir: str, parser_name: str, fmt: str = "csv") -> Path:
+    """单目录模式：用指定解析器解析目录下所有 .html，去重后写 result/<目录名>.csv（或 .parquet）。"""
+    parser = get_parser(parser_name)
+    root = Path(input_dir).resolve()
+    if not root.is_dir():
+        raise SystemExit(f"Not a directory: {root}")
+
+    out_csv = result_csv_for(root, fmt)
+
+    files = iter_html_files(root)
+    total_files = len(files)
+    if total_files == 0:
+        print("⚠️ 未在该目录下找到任何 .html 文件。")
+        return out_csv
+
+    print(f"🔎 共发现 {total_files} 个 HTML 文件，将开始解析……")
+    last_dir: Optional[Path] = None
+    rows: List[dict] = []
+
+    for idx, p in enumerate(files, start=1):
+        if p.parent != last_dir:
+            last_dir = p.parent
+            if last_dir != root:
+                print(f"📂 正在扫描子目录：{last_dir}")
+        rel = p.relative_to(root)
+        print(f"[{idx}/{total_files}] 解析：{rel}")
+        try:
+            _, file_rows = parse_html(read_html_text(p), p.name, parser)
+            rows.extend(file_rows)
+        except Exception as e:
+            print(f"❌ 解析失败（跳过）{rel}: {e}")
+
+    dedup = dedup_rows(rows, parser.key_field)
+    write_rows(dedup, out_csv, parser.fieldnames)
+    print_summary(len(rows), len(dedup), parser.key_field)
+    return out_csv
@@ -0,0 +1,130 @@
+"""
+一次遍历整个 data/ 目录，按注册表自动识别每个 HTML 的来源并解析，
+每个文件只读一次；解析在进程池里并行。
+
+输出：对每个“期刊目录”写 <父目录>/result/<目录名>.csv。期刊目录是直接含有 list_*.html
+的目录（与 pipeline.py 的自动发现相同），它下面各级子目录里的文件都归到它，
+所以与对它单独运行 just_affiliation_txt.py / readWiley.py（run_dir，递归）的结果一致；
+不在任何期刊目录下的文件按所在目录归组（_challenge 之类以下划线开头的子目录归到上一级）。
+若同一目录里混有多种来源，则写 <目录名>_<来源>.csv。
+
+Usage: python parse_all_sources.py [data_dir] [--workers N] [--format csv|parquet]
+"""
+from __future__ import annotations
+import argparse
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from html_parsers import (
+    decode_html_bytes, parse_html, get_parser, iter_html_files,
+    result_csv_for, dedup_rows, write_rows, print_summary,
+)
+# 导入即注册解析器（子进程以 spawn 方式启动时同样会执行这里）
+import just_affiliation_txt  # noqa: F401
+import readWiley  # noqa: F401
+import ssrn_detail  # noqa: F401
+
+DEFAULT_DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+
+
+def find_journal_roots(files: List[Path]) -> Set[Path]:
+    """直接含有 list_*.html 的目录（以下划线开头的除外）。"""
+    return {p.parent for p in files if p.name.startswith('list_') and not p.parent.name.startswith('_')}
+
+
+def journal_dir_of(path: Path, root: Path, journal_roots: Set[Path]) -> Path:
+    """
+    文件所属的期刊目录：最近的一个含 list_*.html 的上级目录；
+    都没有时为所在目录（跳过 _challenge 等以下划线开头的目录）。
+    """
+    for d in path.parents:
+        if d in journal_roots:
+            return d
+        if d == root:
+            break
+    d = path.parent
+    while d != root and d.name.startswith('_'):
+        d = d.parent
+    return d
+
+
+def _parse_file(path_str: str) -> Tuple[str, Optional[str], List[dict], str]:
+    """子进程：读一次文件 → 探测来源 → 解析。返回 (路径, 解析器名, 记录, 错误信息)"""
+    p = Path(path_str)
+    try:
+        html = decode_html_bytes(p.read_bytes())
+        name, rows = parse_html(html, p.name)
+        return path_str, name, rows, ""
+    except Exception as e:
+        return path_str, None, [], str(e)
+
+
+def main(data_dir: str, workers: Optional[int] = None, fmt: str = "csv") -> List[Path]:
+    root = Path(data_dir).resolve()
+    if not root.is_dir():
+        raise SystemExit(f"Not a directory: {root}")
+
+    files = [p for p in iter_html_files(root) if 'result' not in p.relative_to(root).parts]
+    total_files = len(files)
+    if total_files == 0:
+        print("⚠️ 未在该目录下找到任何 .html 文件。")
+        return []
+
+    journal_roots = find_journal_roots(files)
+    workers = workers or os.cpu_count() or 1
+    print(f"🔎 共发现 {total_files} 个 HTML 文件，{workers} 个进程并行解析……")
+    t0 = time.perf_counter()
+
+    # (期刊目录, 解析器名) -> 记录
+    groups: Dict[Tuple[Path, str], List[dict]] = defaultdict(list)
+    unknown = failed = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        results = ex.map(_parse_file, [str(p) for p in files], chunksize=16)
+        for idx, (path_str, name, rows, err) in enumerate(results, start=1):
+            p = Path(path_str)
+            rel = p.relative_to(root)
+            if err:
+                failed += 1
+                print(f"❌ 解析失败（跳过）{rel}: {err}")
+                continue
+            if name is None:
+                unknown += 1
+                print(f"[{idx}/{total_files}] 未识别来源（跳过）：{rel}")
+                continue
+            print(f"[{idx}/{total_files}] {name}: {rel}（{len(rows)} 条）")
+            groups[(journal_dir_of(p, root, journal_roots), name)].extend(rows)
+
+    sources_per_dir: Dict[Path, int] = defaultdict(int)
+    for jdir, _ in groups:
+        sources_per_dir[jdir] += 1
+
+    outputs: List[Path] = []
+    for (jdir, name), rows in sorted(groups.items(), key=lambda kv: (str(kv[0][0]), kv[0][1])):
+        parser = get_parser(name)
+        out_csv = result_csv_for(jdir, fmt)
+        if sources_per_dir[jdir] > 1:
+            out_csv = out_csv.with_name(f"{jdir.name}_{name}{out_csv.suffix}")
+
+        dedup = dedup_rows(rows, parser.key_field)
+        write_rows(dedup, out_csv, parser.fieldnames)
+        print(f"\n📂 {jdir.relative_to(root) if jdir != root else jdir.name} [{name}] → {out_csv}")
+        print_summary(len(rows), len(dedup), parser.key_field)
+        outputs.append(out_csv)
+
+    print(f"\n⏱️ 用时 {time.perf_counter() - t0:.1f}s；未识别 {unknown} 个，失败 {failed} 个文件。")
+    return outputs
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description="一次遍历 data/，按来源自动解析所有 HTML")
+    ap.add_argument("data_dir", nargs="?", default=str(DEFAULT_DATA_DIR))
+    ap.add_argument("--workers", type=int, default=None, help="进程数（默认 CPU 核数）")
+    ap.add_argument("--format", choices=["csv", "parquet"], default="csv", help="输出格式")
+    args = ap.parse_args()
+    outs = main(args.data_dir, args.workers, args.format)
+    print(f"\n✅ Done. 共写出 {len(outs)} 个结果表。")
@@ -0,0 +1,240 @@
+"""
+SSRN 论文详情页（papers.cfm?abstract_id=...）的解析。
+
+详情页的作者块结构：
+    <div class="authors ...">
+        <h2><a href="...AbsByAuth.cfm?per_id=...">Author Name</a></h2>
+        <p>Affiliation line 1</p>
+        <p>Affiliation line 2</p>
+        <h2>...</h2>
+        ...
+    </div>
+
+parse_affiliations_from_html 先用 lxml 按这个结构直接取（不建整棵 BeautifulSoup），
+取不到时才退回到整页文本逐行扫描的老办法。
+基准见 bench_detail_parse.py。
+"""
+from __future__ import annotations
+import re
+from typing import Iterable, List, Optional, Tuple
+import lxml.html
+from lxml import etree
+from bs4 import BeautifulSoup
+
+from html_parsers import DELIM, normalize_space, register_parser
+
+ABSTRACT_ID_RE = re.compile(r"abstract_id=(\d+)")
+WS_RE = re.compile(r"\s+")
+
+AUTHOR_BLOCK_SELECTOR = "div.authors"
+AUTHOR_BLOCK_XPATH = '//div[contains(concat(" ", normalize-space(@class), " "), " authors ")]'
+
+SSRN_DETAIL_FIELDS = ['abstract_id', 'title', 'authors', 'affiliations', 'source_file']
+
+
+def normalize(s: str) -> str:
+    s = s or ""
+    s = WS_RE.sub(" ", s.strip())
+    return s.lower()
+
+
+def _is_skipped_affil_line(n_line: str) -> bool:
+    # 可选：略过明显是期刊信息的行
+    return n_line.startswith("journal of ") or "pages posted" in n_line
+
+
+def _dedup_join(affils: List[str]) -> Optional[str]:
+    if not affils:
+        return None
+    # 去重 + 保序
+    return "; ".join(dict.fromkeys(affils))
+
+
+# ===== 结构化（选择器）提取 =====
+
+def _group_author_lines(items: Iterable[Tuple[str, str]]) -> List[Tuple[str, List[str]]]:
+    """
+    items: 作者块内按文档顺序的 (标签名, 文本)。
+    h2 开始一个新作者，其后的 p 都算这个作者的机构行。
+    """
+    out: List[Tuple[str, List[str]]] = []
+    for tag, text in items:
+        text = normalize_space(text)
+        if not text:
+            continue
+        if tag == "h2":
+            out.append((text, []))
+        elif out:
+            out[-1][1].append(text)
+    return out
+
+
+def extract_author_blocks(soup: BeautifulSoup) -> List[Tuple[str, List[str]]]:
+    """从已建好的 soup 里取 [(作者名, [机构行, ...]), ...]。"""
+    for block in soup.select(AUTHOR_BLOCK_SELECTOR):
+        out = _group_author_lines(
+            (el.name, el.get_text(" ", strip=True)) for el in block.find_all(["h2", "p"])
+        )
+        if out:
+            return out  # 页面上可能还有别的 .authors，只取第一个有内容的
+    return []
+
+
+def extract_author_blocks_lxml(html: str) -> List[Tuple[str, List[str]]]:
+    """同 extract_author_blocks，但直接用 lxml 解析原始 HTML（快一个数量级）。"""
+    root = lxml.html.fromstring(html)
+    for block in root.xpath(AUTHOR_BLOCK_XPATH):
+        out = _group_author_lines(
+            (el.tag, " ".join(el.itertext())) for el in block.iter("h2", "p")
+        )
+        if out:
+            return out
+    return []
+
+
+def _affils_from_blocks(
+    blocks: List[Tuple[str, List[str]]], norm_authors: List[str]
+) -> Optional[str]:
+    author_set = set(norm_authors)
+    affils: List[str] = []
+    matched = False
+    for name, lines in blocks:
+        if normalize(name) not in author_set:
+            continue
+        matched = True
+        kept = [ln for ln in lines if not _is_skipped_affil_line(normalize(ln))]
+        aff = " ".join(kept).strip()
+        if aff:
+            affils.append(aff)
+    if not matched:
+        return None
+    return _dedup_join(affils)
+
+
+# ===== 退路：整页文本逐行扫描 =====
+
+def _affils_from_text_lines(soup: BeautifulSoup, norm_authors: List[str]) -> Optional[str]:
+    """从整页文本里，根据作者行去找机构行（每行只 normalize 一次）。"""
+    text = soup.get_text("\n", strip=True)
+    lines = [ln.strip() for ln in text.splitlines()]
+    lines = [ln for ln in lines if ln]
+    if not lines:
+        return None
+
+    norm_lines = [normalize(ln) for ln in lines]
+    author_set = set(norm_authors)
+    first_author_norm = norm_authors[0]
+
+    # 找到第一个作者出现的位置
+    start_idx = None
+    for i, n_ln in enumerate(norm_lines):
+        if n_ln == first_author_norm:
+            start_idx = i
+            break
+    if start_idx is None:
+        # 放宽一点：包含完整名字也算
+        for i, n_ln in enumerate(norm_lines):
+            if first_author_norm in n_ln:
+                start_idx = i
+                break
+    if start_idx is None:
+        print("    !! 在页面中找不到第一个作者名")
+        return None
+
+    collected_affils: List[str] = []
+    n = len(lines)
+    i = start_idx
+    while i < n:
+        if norm_lines[i] not in author_set:
+            i += 1
+            continue
+
+        j = i + 1
+        aff_lines = []
+        while j < n:
+            n_ln2 = norm_lines[j]
+            if n_ln2 in author_set:
+                break
+            if "date written" in n_ln2 or n_ln2.startswith("abstract"):
+                break
+            if not _is_skipped_affil_line(n_ln2):
+                aff_lines.append(lines[j])
+            j += 1
+
+        aff = " ".join(aff_lines).strip()
+        if aff:
+            collected_affils.append(aff)
+        i = j
+
+    return _dedup_join(collected_affils)
+
+
+def parse_affiliations_from_html(html: str, authors: List[str]) -> Optional[str]:
+    """详情页 HTML + 作者列表 -> "机构1; 机构2"（找不到返回 None）。"""
+    if not html or not authors:
+        return None
+    norm_authors = [normalize(a) for a in authors]
+
+    try:
+        blocks = extract_author_blocks_lxml(html)
+    except (ValueError, etree.ParserError):
+        blocks = []
+    if blocks:
+        found = _affils_from_blocks(blocks, norm_authors)
+        if found:
+            return found
+
+    # 退路：建整棵 soup，逐行扫描
+    return _affils_from_text_lines(BeautifulSoup(html, "lxml"), norm_authors)
+
+
+# ===== 注册到 html_parsers：data/ 下保存的详情页 =====
+
+def is_ssrn_detail_html(html: str) -> bool:
+    return 'class="abstract-text' in html and 'class="authors' in html
+
+
+def _detail_abstract_id(soup: BeautifulSoup, source_file: str) -> str:
+    for sel, attr in (
+        ('meta[name="citation_abstract_html_url"]', 'content'),
+        ('link[rel="canonical"]', 'href'),
+        ('meta[property="og:url"]', 'content'),
+    ):
+        tag = soup.select_one(sel)
+        if tag and tag.get(attr):
+            m = ABSTRACT_ID_RE.search(tag[attr])
+            if m:
+                return m.group(1)
+    m = re.match(r"(\d+)", source_file)
+    return m.group(1) if m else ''
+
+
+@register_parser(
+    "ssrn_detail",
+    detect=is_ssrn_detail_html,
+    fieldnames=SSRN_DETAIL_FIELDS,
+    key_field="abstract_id",
+    priority=10,
+)
+def parse_ssrn_detail_soup(soup: BeautifulSoup, source_file: str) -> List[dict]:
+    blocks = extract_author_blocks(soup)
+    if not blocks:
+        return []
+
+    title_tag = soup.select_one('meta[name="citation_title"]')
+    if title_tag and title_tag.get('content'):
+        title = normalize_space(title_tag['content'])
+    else:
+        h1 = soup.select_one('h1')
+        title = normalize_space(h1.get_text(" ")) if h1 else ''
+
+    authors = [name for name, _ in blocks]
+    affils = _affils_from_blocks(blocks, [normalize(a) for a in authors]) or ''
+
+    return [{
+        'abstract_id': _detail_abstract_id(soup, source_file),
+        'title': title,
+        'authors': DELIM.join(authors),
+        'affiliations': affils,
+        'source_file': source_file,
+    }]